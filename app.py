@@ -1,20 +1,54 @@
-from flask import Flask, render_template, send_from_directory, jsonify, request
+from flask import Flask, Response, g, render_template, send_from_directory, jsonify, request
 import logging as log
 import time
 import json
 import os
+import queue
+import asyncio
+import threading
 log.basicConfig(level=log.INFO)
 
-from src.Bluetooth.BluetoothMockSimulator import BluetoothMockSimulator
-from src.Bluetooth.BluetoothSimulatorESP32 import BluetoothSimulatorESP32
+from src.Bluetooth.OBDClientBackends import backend_names, create_client
+from src.OBD.VehicleRegistry import VehicleRegistry
+from src.Commons.AsyncLogging import DEFAULT_RATE as DEFAULT_LOG_RATE, AsyncLogging
+from src.Commons.Metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY as METRICS
+from src.OBD.PIDDecoder import PIDDecoderRegistry
+from src.OBD.ELM327Capture import ELM327Replay
+from src.OBD.PIDScheduler import PIDScheduler
+from src.OBD.SnapshotBus import BUS_ENV, SnapshotBus
+from src.OBD.TelemetryRingBuffer import DEFAULT_HISTORY_SIZE
+from src.OBD.TelemetryWire import (COLUMNS_BINARY, DATA_MEDIA_TYPES, EVENT_STREAM, JSON, KEEPALIVE, NDJSON, SAMPLE_BINARY,
+                                   encode_columns, encode_obd_response, negotiate)
+from src.Trip.TripRecorder import TRIPS_DIR, is_valid_trip_id, list_trips, read_trip, read_trip_columns
+from src.Trip.TripStatistics import TripStatistics
 
 import argparse
 
-obd_client = None
+# Vehicles served by this process (client, poller and stream per device ID) and the
+# acquisition loop their pollers run on
+vehicle_registry = VehicleRegistry()
+vehicle_registry.register_metrics()
+acquisition_loop = None
+# With several ASGI workers: the bus the acquisition process publishes to and every worker reads
+snapshot_bus = None
 
-# Global variables for distance tracking
-last_request_time = None
-total_distance = 0.0
+HTTP_REQUEST_SECONDS = METRICS.histogram('http_request_seconds', 'HTTP handler latency (streams: time to the response headers)',
+                                         ('route', 'method', 'status'))
+
+METRICS.callback('log_records_dropped', 'Log records dropped because the logging queue was full', AsyncLogging.dropped,
+                 metric_type='counter')
+METRICS.callback('log_records_suppressed', 'Log records suppressed by the per call site rate limit', AsyncLogging.suppressed,
+                 metric_type='counter')
+
+STREAM_KEEPALIVE_SECONDS = 15
+
+# Media types of the telemetry routes, the default first (negotiated from the Accept header)
+STREAM_MEDIA_TYPES = (EVENT_STREAM, SAMPLE_BINARY)
+HISTORY_MEDIA_TYPES = (JSON, COLUMNS_BINARY)
+TRIP_MEDIA_TYPES = (NDJSON, JSON, COLUMNS_BINARY)
+
+# History kept per simulated fleet vehicle (30 minutes at 2 Hz), so large fleets fit in memory
+FLEET_HISTORY_SIZE = 3600
 
 # Configuration management
 CONFIG_PATH = 'config/fatigue_triggers.json'
@@ -62,28 +96,57 @@ def save_config(config):
 # Load initial configuration
 current_config = load_config()
 
-def calculate_distance_increment(speed_kmh, elapsed_seconds):
-    """Calculate distance increment based on speed and elapsed time"""
-    # Distance = speed (km/h) * time (h)
-    # Convert seconds to hours: seconds / 3600
-    return (speed_kmh * elapsed_seconds) / 3600
-
 # Parse arguments
 parser = argparse.ArgumentParser(description='OBD-II Simulator')
-parser.add_argument('--obd', choices=['mock', 'esp32'], default='mock', help='Select the OBD-II type (mock or esp32)')
+parser.add_argument('--obd', choices=backend_names(), default='mock', help='Select the OBD-II type (mock or esp32)')
+parser.add_argument('--vehicle', action='append', default=[], metavar='ID=TYPE[@ADDRESS]',
+                    help='Register a vehicle (repeatable), e.g. truck1=esp32@AA:BB:CC:DD:EE:FF. Defaults to a single vehicle of --obd type')
 parser.add_argument('--port', type=int, default=5000, help='Port to run the server on')
 parser.add_argument('--debug', action='store_true', help='Enable debug mode')
 parser.add_argument('--host', default='127.0.0.1', help='Host to run the server on')
+parser.add_argument('--sample-rate', type=float, default=2.0, help='OBD sampling rate in Hz')
+parser.add_argument('--idle-rate', type=float, default=0.2,
+                    help='Keep-alive sampling rate in Hz while no dashboard, stream or logger is attached (0 to always sample at full rate)')
+parser.add_argument('--lease', type=float, default=10.0, help='Seconds a client polling /data keeps full-rate sampling alive')
+parser.add_argument('--history-size', type=int, default=DEFAULT_HISTORY_SIZE,
+                    help='Samples of history kept in memory per vehicle for /history (0 disables it)')
+parser.add_argument('--trips-dir', default=TRIPS_DIR, help="Directory trips are logged to, at the full sample rate ('' disables trip logging)")
+parser.add_argument('--capture', metavar='DIR', help='Record the raw ELM327 traffic of every esp32 vehicle to DIR/<id>-<time>.jsonl')
+parser.add_argument('--replay', metavar='CAPTURE', help='Serve a single vehicle replayed from a capture file (same as --vehicle default=replay@CAPTURE)')
+parser.add_argument('--replay-speed', type=float, default=1.0, help='Replay speed factor (0 replays as fast as possible)')
+parser.add_argument('--pid-schedule', nargs='?', const='config/pid_schedule.json', default=None, metavar='PATH',
+                    help='Poll each PID at its own rate and priority from a JSON schedule (defaults to config/pid_schedule.json) instead of --sample-rate')
+parser.add_argument('--fleet', type=int, default=0, metavar='N',
+                    help='Add N simulated vehicles (fleet0000...) for load testing. They keep at most 30 minutes of history and no trip logs')
+parser.add_argument('--fleet-seed', type=int, default=0, help='Seed of the simulated fleet drive cycles')
+parser.add_argument('--server', choices=['dev', 'asgi'], default='dev', help='Serve with the Flask dev server or the Hypercorn ASGI server')
+parser.add_argument('--workers', type=int, default=1,
+                    help='Number of ASGI worker processes; with more than one, a separate process owns the adapters and shares their samples')
+parser.add_argument('--keep-alive', type=float, default=5.0, help='ASGI keep-alive timeout in seconds')
+parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], help='Minimum log level')
+parser.add_argument('--log-format', choices=['text', 'json'], default='text', help='Plain text or JSON lines logs')
+parser.add_argument('--log-rate', type=float, default=DEFAULT_LOG_RATE,
+                    help='Log records per second allowed per call site once a burst is spent (0 for no limit)')
+parser.add_argument('--log-sync', action='store_true', help='Write logs from the calling thread instead of a background thread')
 args = parser.parse_args()
 
+AsyncLogging.setup(args.log_level, args.log_format, asynchronous=not args.log_sync, rate=args.log_rate)
+
 app = Flask(__name__, 
     static_folder='static',  # explicitly set static folder
     template_folder='templates'  # explicitly set template folder
 )
 
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
 # Enable CORS for debugging
 @app.after_request
 def after_request(response):
+    if 'request_started' in g:
+        route = request.url_rule.rule if request.url_rule else '<unmatched>'
+        HTTP_REQUEST_SECONDS.labels(route, request.method, response.status_code).observe(time.perf_counter() - g.request_started)
     # Allow access from any origin when debugging
     if args.debug:
         response.headers.add('Access-Control-Allow-Origin', '*')
@@ -96,6 +159,11 @@ def after_request(response):
 def serve_source_map(filename):
     return send_from_directory('static/js', f'{filename}.map')
 
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(METRICS.render(), content_type=METRICS_CONTENT_TYPE)
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -164,6 +232,9 @@ def update_config():
         # Save configuration
         if save_config(updated_config):
             current_config = updated_config
+            apply_trip_thresholds()
+            if snapshot_bus is not None:
+                snapshot_bus.announce_config()
             return jsonify({'status': 'ok', 'config': current_config})
         else:
             return jsonify({'error': 'Failed to save configuration'}), 500
@@ -172,82 +243,621 @@ def update_config():
         log.error(f"Error updating config: {e}")
         return jsonify({'error': str(e)}), 500
 
+def trigger_thresholds():
+    """Speed, distance, time and fatigue thresholds of the worried triggers, None without a config"""
+    if not current_config:
+        return None
+    return (current_config['speed_threshold'], current_config['distance_threshold'],
+            current_config['time_threshold'], current_config['fatigue_threshold'])
+
+def lookup_vehicle(vehicle_id=None):
+    """Vehicle by ID, or the default vehicle served by the /api/obd routes"""
+    if vehicle_id is None:
+        return vehicle_registry.default()
+    return vehicle_registry.get(vehicle_id)
+
+def error_payload(message, status):
+    return json.dumps({'error': message}).encode(), status, JSON
+
+def vehicle_obd_payload(vehicle, accept=None):
+    """Encoded body, status and media type of a vehicle's data route, served from its latest snapshot"""
+    if vehicle == None:
+        return error_payload('Client not initialized', 500)
+
+    # Never touches the radio link, but keeps the poller at full rate for a lease window
+    vehicle.poller.touch()
+    snapshot = vehicle.poller.snapshot
+    if snapshot is None:
+        return error_payload('No data available yet', 503)
+
+    media_type = negotiate(accept, DATA_MEDIA_TYPES)
+    return encode_obd_response(snapshot, media_type, trigger_thresholds()), 200, media_type
+
+def vehicle_data_response(vehicle):
+    payload, status, media_type = vehicle_obd_payload(vehicle, request.headers.get('Accept'))
+    return Response(payload, status=status, content_type=media_type, headers={'Vary': 'Accept'})
+
 @app.route('/api/obd/data')
-async def obd_data():
-    global obd_client, last_request_time, total_distance, current_config
-    
-    if obd_client == None:
+def obd_data():
+    return vehicle_data_response(lookup_vehicle())
+
+def encode_stream_event(snapshot):
+    """Encode a snapshot as a Server-Sent Events frame"""
+    payload = encode_obd_response(snapshot, JSON, trigger_thresholds())
+    return b"id: %d\ndata: %s\n\n" % (snapshot.sequence, payload)
+
+def encode_binary_stream_event(snapshot):
+    """Encode a snapshot as a binary stream record"""
+    return encode_obd_response(snapshot, SAMPLE_BINARY, trigger_thresholds())
+
+def stream_channel(vehicle, media_type):
+    """Broadcaster, event encoder and keep-alive payload of a vehicle's stream in one of STREAM_MEDIA_TYPES"""
+    if media_type == SAMPLE_BINARY:
+        return vehicle.binary_broadcaster, encode_binary_stream_event, KEEPALIVE
+    return vehicle.broadcaster, encode_stream_event, b": keep-alive\n\n"
+
+def stream_publisher(vehicle):
+    """Poller listener: encode each new sample once per stream format and fan it out to every subscriber"""
+    def publish_stream_event(snapshot):
+        if vehicle.broadcaster.subscriber_count > 0:
+            vehicle.broadcaster.publish(encode_stream_event(snapshot))
+        if vehicle.binary_broadcaster.subscriber_count > 0:
+            vehicle.binary_broadcaster.publish(encode_binary_stream_event(snapshot))
+    return publish_stream_event
+
+def vehicle_stream(vehicle):
+    """Push every new sample of a vehicle to the client as Server-Sent Events (or binary records)"""
+    if vehicle == None:
         return jsonify({'error': 'Client not initialized'}), 500
-    
-    current_time = time.time()
-    data = await obd_client.request_all_settings()
-    ret_dict = data.to_dict()
-    
-    # Calculate distance increment if we have a previous request
-    if last_request_time is not None:
-        elapsed_seconds = current_time - last_request_time
-        distance_increment = calculate_distance_increment(ret_dict['speed'], elapsed_seconds)
-        total_distance += distance_increment
-        log.debug(f"Added distance: {distance_increment:.2f} km (speed: {ret_dict['speed']} km/h, time: {elapsed_seconds:.2f}s)")
-    
-    last_request_time = current_time
-    
-    # Add accumulated distance and fatigue data to response
-    ret_dict['accumulated_distance'] = round(total_distance, 1)
-    ret_dict['fatigue_level'] = None  # TODO: Implement camera client (0=Not tired, 1=Lightly tired, 2=Heavily tired)
-    
-    # Add worried triggers status
-    if current_config:
-        ret_dict['worried_triggers'] = {
-            'speed_exceeded': ret_dict['speed'] > current_config['speed_threshold'],
-            'distance_exceeded': total_distance > current_config['distance_threshold'],
-            'time_exceeded': ret_dict['runtime'] > current_config['time_threshold'],
-            'fatigue_exceeded': ret_dict['fatigue_level'] is not None and ret_dict['fatigue_level'] >= current_config['fatigue_threshold']
-        }
-    
-    return jsonify(ret_dict)
+
+    media_type = negotiate(request.headers.get('Accept'), STREAM_MEDIA_TYPES)
+    broadcaster, encode_event, keepalive = stream_channel(vehicle, media_type)
+    subscriber = broadcaster.subscribe()
+    vehicle.poller.acquire()
+
+    def generate():
+        try:
+            snapshot = vehicle.poller.snapshot
+            if snapshot is not None:
+                yield encode_event(snapshot)
+            while True:
+                try:
+                    payload = subscriber.get(timeout=STREAM_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield keepalive
+                    continue
+                if payload is None:
+                    # Dropped for falling behind; the browser reconnects on its own
+                    break
+                yield payload
+        finally:
+            broadcaster.unsubscribe(subscriber)
+            vehicle.poller.release()
+
+    return Response(generate(), mimetype=media_type, headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+        'Vary': 'Accept'
+    })
+
+@app.route('/api/obd/stream')
+def obd_stream():
+    return vehicle_stream(lookup_vehicle())
+
+def vehicle_reset_distance(vehicle):
+    """Reset the accumulated distance of a vehicle"""
+    if vehicle is not None:
+        # Distance is owned by the acquisition loop, so reset it there
+        acquisition_loop.call_soon_threadsafe(vehicle.poller.reset_distance)
+    return jsonify({'status': 'ok', 'distance': 0.0})
 
 @app.route('/api/reset_distance', methods=['POST'])
 def reset_distance():
     """Reset the accumulated distance"""
-    global last_request_time, total_distance
-    last_request_time = None
-    total_distance = 0.0
-    return jsonify({'status': 'ok', 'distance': total_distance})
-
-async def main():
-    global obd_client, last_request_time, total_distance
-    if obd_client == None:
-        log.info(f"Starting server in {args.obd} mode on {args.host}:{args.port}")
-        if args.obd == 'mock':
-            obd_client = BluetoothMockSimulator()
-        elif args.obd == 'esp32':
-            obd_client = BluetoothSimulatorESP32()
-            
-        if not obd_client:
-            log.error("Failed to create client")
-            exit(1)
-        
-        if not await obd_client.find_device():
-            log.error("Failed to find device")
-            exit(1)
-        
-        if not await obd_client.connect():
-            log.error("Failed to connect to device")
-            exit(1)
-        
-        if not await obd_client.init_communication():
-            log.error("Failed to initialize communication")
-            exit(1)
-            
-    # Reset distance tracking
-    last_request_time = None
-    total_distance = 0.0
+    return vehicle_reset_distance(lookup_vehicle())
+
+@app.route('/api/vehicles')
+def list_vehicles():
+    """List the vehicles served by this gateway"""
+    return jsonify([vehicle.to_dict() for vehicle in vehicle_registry])
+
+@app.route('/api/vehicles/<vehicle_id>/data')
+def vehicle_data(vehicle_id):
+    vehicle = lookup_vehicle(vehicle_id)
+    if vehicle is None:
+        return jsonify({'error': f"Unknown vehicle '{vehicle_id}'"}), 404
+    return vehicle_data_response(vehicle)
+
+@app.route('/api/vehicles/<vehicle_id>/stream')
+def vehicle_data_stream(vehicle_id):
+    vehicle = lookup_vehicle(vehicle_id)
+    if vehicle is None:
+        return jsonify({'error': f"Unknown vehicle '{vehicle_id}'"}), 404
+    return vehicle_stream(vehicle)
+
+@app.route('/api/vehicles/<vehicle_id>/reset_distance', methods=['POST'])
+def vehicle_data_reset_distance(vehicle_id):
+    vehicle = lookup_vehicle(vehicle_id)
+    if vehicle is None:
+        return jsonify({'error': f"Unknown vehicle '{vehicle_id}'"}), 404
+    return vehicle_reset_distance(vehicle)
+
+HISTORY_MAX_POINTS = 2000
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+def parse_duration(value):
+    """Parse a duration such as 90, 90s, 15m, 2h or 1d into seconds"""
+    value = value.strip().lower()
+    unit = DURATION_UNITS.get(value[-1:]) if value else None
+    seconds = float(value[:-1]) * unit if unit else float(value)
+    if not 0 < seconds < float('inf'):
+        raise ValueError(f"Invalid duration: {value}")
+    return seconds
+
+def vehicle_history(vehicle):
+    """Downsampled history of a vehicle: min/max/mean per time bucket, as JSON or binary column arrays"""
+    if vehicle == None:
+        return jsonify({'error': 'Client not initialized'}), 500
+    if vehicle.history is None:
+        return jsonify({'error': 'History is disabled'}), 404
+
+    try:
+        window = parse_duration(request.args.get('window', '5m'))
+        points = int(request.args.get('points', 300))
+        if points <= 0:
+            raise ValueError(f"points must be positive: {points}")
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    vehicle.poller.touch()
+    if negotiate(request.headers.get('Accept'), HISTORY_MEDIA_TYPES) == COLUMNS_BINARY:
+        columns = vehicle.history.downsample_columns(window, min(points, HISTORY_MAX_POINTS))
+        return Response(encode_columns(columns), content_type=COLUMNS_BINARY,
+                        headers={'X-History-Window': str(window), 'Vary': 'Accept'})
+    body = vehicle.history.downsample(window, min(points, HISTORY_MAX_POINTS))
+    body['window'] = window
+    return jsonify(body)
+
+@app.route('/api/obd/history')
+def obd_history():
+    return vehicle_history(lookup_vehicle())
+
+@app.route('/api/vehicles/<vehicle_id>/history')
+def vehicle_data_history(vehicle_id):
+    vehicle = lookup_vehicle(vehicle_id)
+    if vehicle is None:
+        return jsonify({'error': f"Unknown vehicle '{vehicle_id}'"}), 404
+    return vehicle_history(vehicle)
+
+def vehicle_trips(vehicle):
+    """Trips logged for a vehicle, including the one being recorded"""
+    if vehicle == None:
+        return jsonify({'error': 'Client not initialized'}), 500
+    return jsonify({
+        'current': vehicle.trip_id,
+        'trips': list_trips(vehicle.vehicle_id, args.trips_dir) if args.trips_dir else []
+    })
+
+def vehicle_trip(vehicle, trip_id):
+    """
+    A logged trip: streamed as JSON lines, one sample per line, or in bulk as column
+    arrays (a JSON object of lists, or binary columns)
+    """
+    if vehicle == None:
+        return jsonify({'error': 'Client not initialized'}), 500
+    if not args.trips_dir or not is_valid_trip_id(trip_id) or trip_id not in list_trips(vehicle.vehicle_id, args.trips_dir):
+        return jsonify({'error': f"Unknown trip '{trip_id}'"}), 404
+
+    trip_dir = os.path.join(args.trips_dir, vehicle.vehicle_id, trip_id)
+    media_type = negotiate(request.headers.get('Accept'), TRIP_MEDIA_TYPES)
+    if media_type == COLUMNS_BINARY:
+        return Response(encode_columns(read_trip_columns(trip_dir)), content_type=COLUMNS_BINARY, headers={'Vary': 'Accept'})
+    if media_type == JSON:
+        response = jsonify({name: column.tolist() for name, column in read_trip_columns(trip_dir).items()})
+        response.headers['Vary'] = 'Accept'
+        return response
+
+    def generate():
+        for record in read_trip(trip_dir):
+            yield json.dumps(record._asdict(), separators=(',', ':')) + '\n'
+
+    return Response(generate(), mimetype=NDJSON, headers={'Vary': 'Accept'})
+
+@app.route('/api/obd/trips')
+def obd_trips():
+    return vehicle_trips(lookup_vehicle())
+
+@app.route('/api/obd/trips/<trip_id>')
+def obd_trip(trip_id):
+    return vehicle_trip(lookup_vehicle(), trip_id)
+
+@app.route('/api/vehicles/<vehicle_id>/trips')
+def vehicle_data_trips(vehicle_id):
+    vehicle = lookup_vehicle(vehicle_id)
+    if vehicle is None:
+        return jsonify({'error': f"Unknown vehicle '{vehicle_id}'"}), 404
+    return vehicle_trips(vehicle)
+
+@app.route('/api/vehicles/<vehicle_id>/trips/<trip_id>')
+def vehicle_data_trip(vehicle_id, trip_id):
+    vehicle = lookup_vehicle(vehicle_id)
+    if vehicle is None:
+        return jsonify({'error': f"Unknown vehicle '{vehicle_id}'"}), 404
+    return vehicle_trip(vehicle, trip_id)
+
+def apply_trip_thresholds():
+    """Track time above the configured speed threshold in every vehicle's trip statistics"""
+    if snapshot_bus is not None and not snapshot_bus.owner:
+        # Mirrored statistics are the acquisition process's, it applies the thresholds
+        return
+    if current_config and acquisition_loop is not None:
+        # Trip statistics are written by the acquisition loop only, so update them there
+        acquisition_loop.call_soon_threadsafe(set_trip_speed_threshold, current_config['speed_threshold'])
+
+def set_trip_speed_threshold(speed_threshold):
+    for vehicle in vehicle_registry:
+        vehicle.trip_stats.speed_threshold = speed_threshold
+
+def vehicle_trip_stats(vehicle):
+    """Running statistics of a vehicle's current trip"""
+    if vehicle == None:
+        return jsonify({'error': 'Client not initialized'}), 500
+    body = vehicle.trip_stats.to_dict()
+    body['trip'] = vehicle.trip_id
+    return jsonify(body)
+
+@app.route('/api/trip/stats')
+def trip_stats():
+    return vehicle_trip_stats(lookup_vehicle())
+
+@app.route('/api/vehicles/<vehicle_id>/trip/stats')
+def vehicle_data_trip_stats(vehicle_id):
+    vehicle = lookup_vehicle(vehicle_id)
+    if vehicle is None:
+        return jsonify({'error': f"Unknown vehicle '{vehicle_id}'"}), 404
+    return vehicle_trip_stats(vehicle)
+
+@app.route('/api/fleet/trip/stats')
+def fleet_trip_stats():
+    """Current trips of every vehicle, merged"""
+    vehicles = list(vehicle_registry)
+    body = TripStatistics.merge(vehicle.trip_stats for vehicle in vehicles).to_dict()
+    body['vehicles'] = len(vehicles)
+    return jsonify(body)
+
+def vehicle_schedule(vehicle):
+    """Requested vs. achieved per-PID rates of a vehicle's scheduler"""
+    if vehicle == None:
+        return jsonify({'error': 'Client not initialized'}), 500
+    if vehicle.poller.scheduler is None:
+        return jsonify({'error': 'PID scheduling is disabled', 'sample_rate': vehicle.poller.sample_rate}), 404
+    return jsonify(vehicle.poller.scheduler.report())
+
+@app.route('/api/obd/schedule')
+def obd_schedule():
+    return vehicle_schedule(lookup_vehicle())
+
+@app.route('/api/vehicles/<vehicle_id>/schedule')
+def vehicle_data_schedule(vehicle_id):
+    vehicle = lookup_vehicle(vehicle_id)
+    if vehicle is None:
+        return jsonify({'error': f"Unknown vehicle '{vehicle_id}'"}), 404
+    return vehicle_schedule(vehicle)
+
+def parse_vehicle_spec(spec):
+    """Parse an ID=TYPE[@ADDRESS] vehicle specification"""
+    vehicle_id, _, client_spec = spec.partition('=')
+    client_type, _, address = client_spec.partition('@')
+    if not vehicle_id or client_type not in backend_names() or (client_type == 'replay' and not address):
+        raise ValueError(f"Invalid vehicle '{spec}'. Expected ID=TYPE[@ADDRESS] with TYPE in {backend_names()}")
+    return vehicle_id, client_type, address or None
+
+def register_vehicles():
+    """Create a client and poller for every vehicle requested on the command line"""
+    specs = args.vehicle or ([] if args.fleet else [f"default=replay@{args.replay}" if args.replay else f"default={args.obd}"])
+    for spec in specs:
+        vehicle_id, client_type, address = parse_vehicle_spec(spec)
+        client = create_client(client_type)
+        if address:
+            client.target_address = address
+        if client_type == 'replay':
+            client.replay = ELM327Replay.from_file(address, speed=args.replay_speed)
+        if args.capture and hasattr(client, 'capture_path'):
+            os.makedirs(args.capture, exist_ok=True)
+            client.capture_path = os.path.join(args.capture, f"{vehicle_id}-{time.strftime('%Y%m%d-%H%M%S')}.jsonl")
+        vehicle = vehicle_registry.add(vehicle_id, client, sample_rate=args.sample_rate, client_type=client_type,
+                                       idle_rate=args.idle_rate or None, lease_seconds=args.lease,
+                                       history_size=args.history_size, trips_dir=args.trips_dir)
+        if client_type == 'replay':
+            # Integrate distance on the capture's timeline, whatever the replay speed
+            vehicle.poller.clock = client.replay.clock
+        if args.pid_schedule:
+            vehicle.poller.scheduler = PIDScheduler.from_file(client, args.pid_schedule)
+        vehicle.poller.add_listener(stream_publisher(vehicle))
+
+    if args.fleet > 0:
+        register_fleet(args.fleet, args.fleet_seed)
+
+def register_fleet(size, seed):
+    """Register `size` vehicles driven by one vectorized fleet simulation"""
+    from src.Bluetooth.BluetoothFleetSimulator import BluetoothFleetSimulator
+    from src.OBD.FleetSimulator import FleetSimulator
+
+    fleet = FleetSimulator(size, seed=seed)
+    for index in range(size):
+        client = BluetoothFleetSimulator(fleet, index)
+        vehicle = vehicle_registry.add(f"fleet{index:04d}", client, sample_rate=args.sample_rate, client_type='fleet',
+                                       idle_rate=args.idle_rate or None, lease_seconds=args.lease,
+                                       history_size=min(args.history_size, FLEET_HISTORY_SIZE))
+        if args.pid_schedule:
+            vehicle.poller.scheduler = PIDScheduler.from_file(client, args.pid_schedule)
+        vehicle.poller.add_listener(stream_publisher(vehicle))
+    log.info(f"Registered a simulated fleet of {size} vehicles (seed {seed})")
+
+def reload_config():
+    """Pick up thresholds another worker saved"""
+    global current_config
+    current_config = load_config()
+    apply_trip_thresholds()
+
+async def init_client():
+    """Create and connect every OBD client concurrently, then start their pollers"""
+    global acquisition_loop
+    acquisition_loop = asyncio.get_running_loop()
+    if len(vehicle_registry) == 0 and os.environ.get(BUS_ENV):
+        return mirror_snapshot_bus(os.environ[BUS_ENV])
+    if len(vehicle_registry) == 0:
+        # Build the PID decoders once, before the first sample
+        PIDDecoderRegistry.default()
+        try:
+            register_vehicles()
+        except (ValueError, ImportError) as e:
+            log.error(f"Failed to create client: {e}")
+            return False
+        types = {}
+        for vehicle in vehicle_registry:
+            types[vehicle.client_type] = types.get(vehicle.client_type, 0) + 1
+        summary = ", ".join(f"{count} {client_type}" for client_type, count in types.items())
+        log.info(f"Starting server on {args.host}:{args.port} with {len(vehicle_registry)} vehicle(s): {summary}")
+        apply_trip_thresholds()
+
+    results = await vehicle_registry.connect_all()
+    failed = [vehicle_id for vehicle_id, connected in results.items() if not connected]
+    if failed:
+        # Not fatal: the registry keeps retrying them with backoff
+        log.error(f"Failed to initialize vehicles, retrying in the background: {failed}")
+
+    vehicle_registry.start_all()
+    return True
+
+async def shutdown_client():
+    """Stop every poller, end open streams and close every OBD client"""
+    if snapshot_bus is not None:
+        await snapshot_bus.stop()
+    await vehicle_registry.stop_all()
+
+def mirror_snapshot_bus(name):
+    """ASGI worker: serve the vehicles of the acquisition process from its snapshot bus"""
+    global snapshot_bus
+    try:
+        snapshot_bus = SnapshotBus.attach(name)
+    except (FileNotFoundError, ValueError) as e:
+        log.error(f"Failed to attach to snapshot bus '{name}': {e}")
+        return False
+    vehicles = snapshot_bus.mirror(vehicle_registry)
+    for vehicle in vehicles:
+        vehicle.poller.add_listener(stream_publisher(vehicle))
+    snapshot_bus.follow(vehicles, on_config_change=reload_config)
+    log.info(f"Worker {os.getpid()} serving {len(vehicles)} vehicles from snapshot bus '{name}'")
+    return True
+
+async def publish_snapshot_bus():
+    """Acquisition process: share every vehicle's samples, status and history with the ASGI workers"""
+    global snapshot_bus
+    snapshot_bus = SnapshotBus.create(vehicle_registry)
+    snapshot_bus.serve(vehicle_registry, on_config_change=reload_config)
+    return snapshot_bus.name
+
+# ASGI serving mode: the OBD client, the poller and the telemetry routes share one
+# event loop; every other route is the regular Flask app behind WsgiToAsgi
+wsgi_asgi_app = None
+
+def cors_headers():
+    if not args.debug:
+        return []
+    return [
+        (b'access-control-allow-origin', b'*'),
+        (b'access-control-allow-headers', b'Content-Type,Authorization'),
+        (b'access-control-allow-methods', b'GET,PUT,POST,DELETE,OPTIONS')
+    ]
+
+def asgi_route_label(path, name):
+    """Route label of a native ASGI handler, named like the Flask rule it replaces"""
+    return f'/api/vehicles/<vehicle_id>/{name}' if path.startswith('/api/vehicles/') else f'/api/obd/{name}'
+
+def asgi_header(scope, name):
+    """Value of a request header (name in lowercase bytes), None if absent"""
+    for key, value in scope.get('headers', ()):
+        if key == name:
+            return value.decode('latin-1')
+    return None
+
+async def asgi_obd_data(scope, receive, send, vehicle):
+    started = time.perf_counter()
+    payload, status, media_type = vehicle_obd_payload(vehicle, asgi_header(scope, b'accept'))
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', media_type.encode()), (b'content-length', str(len(payload)).encode()),
+                    (b'vary', b'Accept')] + cors_headers()
+    })
+    await send({'type': 'http.response.body', 'body': payload})
+    HTTP_REQUEST_SECONDS.labels(asgi_route_label(scope.get('path', ''), 'data'), 'GET', status).observe(time.perf_counter() - started)
+
+async def asgi_obd_stream(scope, receive, send, vehicle):
+    if vehicle == None:
+        await asgi_obd_data(scope, receive, send, vehicle)
+        return
+
+    started = time.perf_counter()
+    media_type = negotiate(asgi_header(scope, b'accept'), STREAM_MEDIA_TYPES)
+    broadcaster, encode_event, keepalive = stream_channel(vehicle, media_type)
+    subscriber = broadcaster.subscribe_async()
+    vehicle.poller.acquire()
+
+    async def wait_for_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+        subscriber.close()
+
+    watcher = asyncio.ensure_future(wait_for_disconnect())
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', media_type.encode()),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+                (b'vary', b'Accept')
+            ] + cors_headers()
+        })
+        HTTP_REQUEST_SECONDS.labels(asgi_route_label(scope.get('path', ''), 'stream'), 'GET', 200).observe(time.perf_counter() - started)
+        snapshot = vehicle.poller.snapshot
+        if snapshot is not None:
+            await send({'type': 'http.response.body', 'body': encode_event(snapshot), 'more_body': True})
+        while True:
+            try:
+                payload = await subscriber.get(timeout=STREAM_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                payload = keepalive
+            if payload is None:
+                break
+            await send({'type': 'http.response.body', 'body': payload, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+    finally:
+        watcher.cancel()
+        broadcaster.unsubscribe(subscriber)
+        vehicle.poller.release()
+
+asgi_routes = {
+    'data': asgi_obd_data,
+    'stream': asgi_obd_stream
+}
+
+def resolve_asgi_route(path):
+    """Map /api/obd/<route> and /api/vehicles/<id>/<route> to a native handler and its vehicle"""
+    parts = path.strip('/').split('/')
+    if len(parts) == 3 and parts[:2] == ['api', 'obd'] and parts[2] in asgi_routes:
+        return asgi_routes[parts[2]], lookup_vehicle()
+    if len(parts) == 4 and parts[:2] == ['api', 'vehicles'] and parts[3] in asgi_routes:
+        vehicle = lookup_vehicle(parts[2])
+        if vehicle is not None:
+            return asgi_routes[parts[3]], vehicle
+    return None, None
+
+async def asgi_lifespan(scope, receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            try:
+                started = await init_client()
+            except Exception as e:
+                log.error(f"Error starting OBD client: {e}")
+                started = False
+            if started:
+                await send({'type': 'lifespan.startup.complete'})
+            else:
+                await send({'type': 'lifespan.startup.failed', 'message': 'Failed to initialize OBD client'})
+        elif message['type'] == 'lifespan.shutdown':
+            await shutdown_client()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def asgi_app(scope, receive, send):
+    """ASGI entry point"""
+    global wsgi_asgi_app
+    if scope['type'] == 'lifespan':
+        await asgi_lifespan(scope, receive, send)
+        return
+
+    if scope['type'] == 'http' and scope.get('method') == 'GET':
+        route, vehicle = resolve_asgi_route(scope.get('path', ''))
+        if route is not None:
+            await route(scope, receive, send, vehicle)
+            return
+
+    if wsgi_asgi_app is None:
+        from asgiref.wsgi import WsgiToAsgi
+        wsgi_asgi_app = WsgiToAsgi(app)
+    await wsgi_asgi_app(scope, receive, send)
+
+def build_hypercorn_config():
+    from hypercorn.config import Config
+
+    config = Config()
+    config.bind = [f"{args.host}:{args.port}"]
+    config.keep_alive_timeout = args.keep_alive
+    config.debug = args.debug
+    config.accesslog = '-' if args.debug else None
+    config.workers = args.workers
+    if config.workers > 1:
+        # Workers are separate processes importing this module; none of them opens an adapter
+        config.application_path = 'app:asgi_app'
+    return config
+
+async def serve_asgi():
+    """Run Hypercorn on the current loop; the OBD client starts and stops through lifespan"""
+    from hypercorn.asyncio import serve
+
+    global acquisition_loop
+    acquisition_loop = asyncio.get_running_loop()
+    await serve(asgi_app, build_hypercorn_config())
+
+def start_acquisition_loop():
+    """Run an event loop in a daemon thread that owns the OBD client and poller"""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name='obd-acquisition', daemon=True).start()
+    return loop
+
+def serve_asgi_workers():
+    """
+    Own the adapters in this process and serve HTTP from `--workers` Hypercorn worker
+    processes, which read the samples from a shared-memory snapshot bus
+    """
+    from hypercorn.run import run
+
+    loop = start_acquisition_loop()
+    if not asyncio.run_coroutine_threadsafe(init_client(), loop).result():
+        exit(1)
+    name = asyncio.run_coroutine_threadsafe(publish_snapshot_bus(), loop).result()
+    os.environ[BUS_ENV] = name
+    log.info(f"Serving {len(vehicle_registry)} vehicles to {args.workers} ASGI workers through snapshot bus '{name}'")
+    try:
+        run(build_hypercorn_config())
+    finally:
+        asyncio.run_coroutine_threadsafe(shutdown_client(), loop).result()
+        snapshot_bus.close()
+
+def main():
+    if args.server == 'asgi':
+        # CAMERA CLIENT INITIALIZATION
+        if args.workers > 1:
+            serve_asgi_workers()
+        else:
+            asyncio.run(serve_asgi())
+        return
+
+    loop = start_acquisition_loop()
+    if not asyncio.run_coroutine_threadsafe(init_client(), loop).result():
+        exit(1)
             
     # CAMERA CLIENT INITIALIZATION
     
-    app.run(host=args.host, port=args.port, debug=args.debug, use_reloader=args.debug)
+    try:
+        app.run(host=args.host, port=args.port, debug=args.debug, use_reloader=args.debug)
+    finally:
+        asyncio.run_coroutine_threadsafe(shutdown_client(), loop).result()
 
 if __name__ == '__main__':
-    import asyncio
-    asyncio.run(main())
\ No newline at end of file
+    main()
@@ -0,0 +1,63 @@
+"""
+Simulated fleet load: cost of one vectorized fleet step, and aggregate acquisition
+throughput of the vehicle registry serving N fleet vehicles (no link delays, so this
+measures the server side only).
+
+    python benchmarks/bench_fleet.py --vehicles 100 1000 5000 --sample-rate 2
+"""
+import argparse
+import asyncio
+import logging as log
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.Bluetooth.BluetoothFleetSimulator import BluetoothFleetSimulator
+from src.OBD.FleetSimulator import FleetSimulator
+from src.OBD.VehicleRegistry import VehicleRegistry
+
+
+def measure_step(vehicles: int, steps: int = 200) -> float:
+    fleet = FleetSimulator(vehicles)
+    start = time.perf_counter()
+    for _ in range(steps):
+        fleet.step(fleet.tick)
+    return (time.perf_counter() - start) / steps
+
+
+async def measure_registry(vehicles: int, sample_rate: float, duration: float) -> float:
+    fleet = FleetSimulator(vehicles)
+    registry = VehicleRegistry()
+    for index in range(vehicles):
+        registry.add(f"fleet{index:04d}", BluetoothFleetSimulator(fleet, index), sample_rate=sample_rate,
+                     client_type="fleet", history_size=600)
+    await registry.connect_all()
+
+    registry.start_all()
+    start = time.perf_counter()
+    await asyncio.sleep(duration)
+    elapsed = time.perf_counter() - start
+    samples = sum(vehicle.poller.snapshot.sequence for vehicle in registry if vehicle.poller.snapshot)
+    await registry.stop_all()
+    return samples / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulated fleet benchmark')
+    parser.add_argument('--vehicles', type=int, nargs='+', default=[100, 1000, 5000])
+    parser.add_argument('--sample-rate', type=float, default=2.0, help='Requested rate per vehicle (Hz)')
+    parser.add_argument('--duration', type=float, default=3.0, help='Measurement time per run (s)')
+    args = parser.parse_args()
+
+    log.getLogger().setLevel(log.WARNING)
+    print(f"{'vehicles':>8} {'step (ms)':>10} {'samples/s':>12} {'of target':>10}")
+    for vehicles in args.vehicles:
+        step = measure_step(vehicles)
+        rate = asyncio.run(measure_registry(vehicles, args.sample_rate, args.duration))
+        print(f"{vehicles:>8} {step * 1e3:>10.3f} {rate:>12.1f} {rate / (vehicles * args.sample_rate):>9.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Aggregate acquisition throughput of the vehicle registry with N mock vehicles.
+
+Every vehicle gets its own BluetoothMockSimulator with a simulated link round trip,
+and its own poller task. If adapters are polled concurrently, aggregate samples/sec
+grows linearly with N until the event loop saturates.
+
+    python benchmarks/bench_multi_vehicle.py --vehicles 1 2 4 8 16 32 64
+"""
+import argparse
+import asyncio
+import logging as log
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.Bluetooth.BluetoothMockSimulator import BluetoothMockSimulator
+from src.OBD.VehicleRegistry import VehicleRegistry
+
+
+class LinkLatencyMock(BluetoothMockSimulator):
+    """Mock client that pays a fixed round trip per request, like a real adapter"""
+    def __init__(self, latency: float):
+        super().__init__()
+        self.latency = latency
+
+    async def find_device(self) -> bool:
+        return True
+
+    async def connect(self) -> bool:
+        self.connected = True
+        return True
+
+    async def init_communication(self) -> bool:
+        self.initialized = True
+        return True
+
+    async def request_all_settings(self):
+        await asyncio.sleep(self.latency)
+        return await super().request_all_settings()
+
+    async def close(self) -> None:
+        self.connected = False
+
+
+async def measure(vehicles: int, latency: float, sample_rate: float, duration: float) -> float:
+    registry = VehicleRegistry()
+    for i in range(vehicles):
+        registry.add(f"mock{i}", LinkLatencyMock(latency), sample_rate=sample_rate, client_type="mock")
+    await registry.connect_all()
+
+    registry.start_all()
+    start = time.perf_counter()
+    await asyncio.sleep(duration)
+    elapsed = time.perf_counter() - start
+    samples = sum(vehicle.poller.snapshot.sequence for vehicle in registry if vehicle.poller.snapshot)
+    await registry.stop_all()
+    return samples / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Multi-vehicle acquisition benchmark')
+    parser.add_argument('--vehicles', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument('--latency', type=float, default=0.02, help='Simulated round trip per request (s)')
+    parser.add_argument('--sample-rate', type=float, default=1000.0, help='Requested rate per vehicle (Hz)')
+    parser.add_argument('--duration', type=float, default=2.0, help='Measurement time per run (s)')
+    args = parser.parse_args()
+
+    log.getLogger().setLevel(log.WARNING)
+    print(f"{'vehicles':>8} {'samples/s':>12} {'per vehicle':>12} {'scaling':>8}")
+    baseline = None
+    for vehicles in args.vehicles:
+        rate = asyncio.run(measure(vehicles, args.latency, args.sample_rate, args.duration))
+        baseline = baseline or rate / vehicles
+        print(f"{vehicles:>8} {rate:>12.1f} {rate / vehicles:>12.1f} {rate / baseline:>8.2f}x")
+
+
+if __name__ == '__main__':
+    main()
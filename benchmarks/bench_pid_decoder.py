@@ -0,0 +1,72 @@
+"""
+Table-driven PID decoding vs the string-splitting parsers it replaced.
+
+    python benchmarks/bench_pid_decoder.py --iterations 200000
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.OBD.PIDDecoder import PIDDecoderRegistry
+from src.OBD.PIDRequests import decode_pid_response
+
+
+# Parsers as they were in BluetoothSimulatorESP32 (one response per PID, logging removed)
+def legacy_rpm(response):
+    if response and response.startswith("41 0C"):
+        data = response.split()
+        if len(data) >= 4:
+            return ((int(data[2], 16) * 256) + int(data[3], 16)) // 4
+    return None
+
+
+def legacy_speed(response):
+    if response and response.startswith("41 0D"):
+        return int(response.split()[2], 16)
+    return None
+
+
+def legacy_runtime(response):
+    if response and response.startswith("41 1F"):
+        data = response.split()
+        if len(data) >= 4:
+            return (int(data[2], 16) * 256) + int(data[3], 16)
+    return None
+
+
+RPM, SPEED, RUNTIME = "41 0C 1A F8", "41 0D 32", "41 1F 00 8C"
+MULTI = "41 0C 1A F8 0D 32 1F 00 8C"
+MULTI_BYTES = bytes.fromhex(MULTI.replace(" ", ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='PID decoder micro-benchmark')
+    parser.add_argument('--iterations', type=int, default=200000)
+    args = parser.parse_args()
+
+    build = timeit.timeit(PIDDecoderRegistry.load, number=10) / 10
+    registry = PIDDecoderRegistry.default()
+    rpm = registry.get("01", "0C").decode
+    frame = registry.frame_decoder("01", ("0C", "0D", "1F"))
+
+    cases = {
+        "legacy: 3 responses, split + int(x, 16)": lambda: (legacy_rpm(RPM), legacy_speed(SPEED), legacy_runtime(RUNTIME)),
+        "table: 3 responses, decode_pid_response": lambda: (decode_pid_response(RPM, "010C"), decode_pid_response(SPEED, "010D"), decode_pid_response(RUNTIME, "011F")),
+        "table: 1 multi-PID response text": lambda: decode_pid_response(MULTI, "010C0D1F"),
+        "table: 1 multi-PID frame, generic walk": lambda: registry.decode_message(MULTI_BYTES),
+        "table: 1 multi-PID frame, compiled layout": lambda: frame(MULTI_BYTES),
+        "legacy: single RPM response": lambda: legacy_rpm(RPM),
+        "table: single RPM data bytes": lambda: rpm(b"\x1a\xf8"),
+    }
+
+    print(f"registry build: {build * 1e3:.2f} ms (once at startup)")
+    for name, case in cases.items():
+        elapsed = timeit.timeit(case, number=args.iterations)
+        print(f"{name:<45} {elapsed / args.iterations * 1e9:>8.0f} ns/op")
+
+
+if __name__ == '__main__':
+    main()
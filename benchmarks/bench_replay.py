@@ -0,0 +1,58 @@
+"""
+Framing, decoding and distance integration profiled on a recorded drive, without
+a car or an adapter. The distance is deterministic at any replay speed.
+
+    python benchmarks/bench_replay.py --capture .res/captures/sample_drive.jsonl --samples 600
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.OBD.ELM327Capture import ELM327Replay
+from src.OBD.ELM327Connection import ELM327Connection
+from src.OBD.OBDDataStructure import OBDDataStructure
+from src.OBD.OBDPoller import OBDPoller
+from src.OBD.PIDRequests import decode_pid_response
+
+DEFAULT_CAPTURE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".res", "captures", "sample_drive.jsonl")
+
+
+class ReplayClient(object):
+    """The ESP32 client's multi-PID sampling path, over a replayed link"""
+    def __init__(self, replay: ELM327Replay):
+        self.elm = ELM327Connection(replay.write)
+        replay.attach(self.elm)
+
+    async def request_all_settings(self):
+        values = decode_pid_response(await self.elm.send_command("010C0D1F"), "010C0D1F")
+        return OBDDataStructure(int(values["0C"]), values["0D"], values["1F"])
+
+
+async def run(capture: str, samples: int, speed: float):
+    replay = ELM327Replay.from_file(capture, speed=speed)
+    poller = OBDPoller(ReplayClient(replay), clock=replay.clock)
+
+    start = time.perf_counter()
+    for _ in range(samples):
+        await poller.sample_once()
+    elapsed = time.perf_counter() - start
+
+    print(f"{samples} samples in {elapsed * 1e3:.1f} ms at speed {speed or 'max'}: "
+          f"{elapsed / samples * 1e6:.1f} us/sample, distance {poller.total_distance:.4f} km")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replayed ELM327 pipeline benchmark')
+    parser.add_argument('--capture', default=DEFAULT_CAPTURE)
+    parser.add_argument('--samples', type=int, default=600)
+    parser.add_argument('--speed', type=float, default=0, help='Replay speed factor (0: as fast as possible)')
+    args = parser.parse_args()
+    asyncio.run(run(args.capture, args.samples, args.speed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Cost of logging a sample on the acquisition loop, against the 20 ms period of 50 Hz sampling.
+
+    python benchmarks/bench_trip_recorder.py --samples 100000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.OBD.OBDDataStructure import OBDDataStructure
+from src.OBD.OBDPoller import OBDSnapshot
+from src.Trip.TripRecorder import TripRecorder, read_trip
+
+PERIOD_50HZ = 1 / 50
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Trip recorder benchmark')
+    parser.add_argument('--samples', type=int, default=100000)
+    args = parser.parse_args()
+
+    snapshots = [OBDSnapshot(OBDDataStructure(800 + i % 4000, i % 130, i), time.time() + i / 50, i / 1000, i) for i in range(args.samples)]
+    with tempfile.TemporaryDirectory() as tmp:
+        recorder = TripRecorder(os.path.join(tmp, "trip"))
+        recorder.start()
+
+        start = time.perf_counter()
+        for snapshot in snapshots:
+            recorder.record(snapshot)
+        on_loop = (time.perf_counter() - start) / args.samples
+
+        start = time.perf_counter()
+        recorder.close(timeout=60)
+        drain = time.perf_counter() - start
+
+        start = time.perf_counter()
+        count = sum(1 for _ in read_trip(recorder.trip_dir))
+        read = time.perf_counter() - start
+        size = sum(os.path.getsize(os.path.join(recorder.trip_dir, name)) for name in os.listdir(recorder.trip_dir))
+
+    print(f"record() on the loop: {on_loop * 1e6:.2f} us/sample ({on_loop / PERIOD_50HZ:.4%} of a 50 Hz period)")
+    print(f"writer drain after close: {drain * 1e3:.1f} ms for {args.samples} samples")
+    print(f"read back: {count} samples in {read * 1e3:.1f} ms, {size / count:.1f} bytes/sample on disk")
+
+
+if __name__ == '__main__':
+    main()
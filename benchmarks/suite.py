@@ -0,0 +1,328 @@
+"""
+End-to-end benchmark suite: PID decoding, JSON encoding, acquisition samples/sec
+(mock clients and a replayed capture) and /api/obd/data latency under concurrent
+clients against a real server process. Runs offline, without adapters.
+
+Results are compared with the baselines recorded on this machine with --update-baselines
+(benchmarks/baselines.json, not committed: absolute timings only compare on the machine
+and load they were measured on); a metric more than --tolerance worse than its baseline
+is a regression and makes the suite exit with status 1. Without baselines the suite only
+reports.
+
+    python benchmarks/suite.py                       # run everything, compare
+    python benchmarks/suite.py --only decode json    # some benchmarks (decode json metrics serializable mock replay http http_workers)
+    python benchmarks/suite.py --update-baselines    # record new baselines
+"""
+import argparse
+import asyncio
+import json
+import logging as log
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from typing import Callable, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.Commons.Metrics import MetricsRegistry
+from src.OBD.VehicleCapabilities import VehicleCapabilities
+from src.OBD.ELM327Capture import ELM327Replay
+from src.OBD.ELM327Connection import ELM327Connection
+from src.OBD.OBDDataStructure import OBDDataStructure
+from src.OBD.OBDPoller import OBDPoller, OBDSnapshot
+from src.OBD.PIDRequests import decode_pid_response
+from src.OBD.TelemetryWire import JSON, SAMPLE_BINARY, encode_obd_response
+from src.Settings import Device, Settings
+from src.Trip.TripStateStore import TripState
+
+BASELINES_PATH = os.path.join(ROOT, "benchmarks", "baselines.json")
+SAMPLE_CAPTURE = os.path.join(ROOT, ".res", "captures", "sample_drive.jsonl")
+DEFAULT_TOLERANCE = 0.3
+
+MULTI_PID_RESPONSE = "41 0C 1A F8 0D 32 1F 00 8C"
+# Speed, distance, time and fatigue thresholds of the default config
+TRIGGER_THRESHOLDS = (120, 200, 7200, 2)
+
+
+def lower_is_better(metric: str) -> bool:
+    """Metric names end in their unit: latencies and costs (_ms, _us) should go down, rates (_per_s) up"""
+    return not metric.endswith("_per_s")
+
+
+def per_call_us(function: Callable[[], object], number: int) -> float:
+    return min(timeit.repeat(function, number=number, repeat=3)) / number * 1e6
+
+
+def bench_decode(quick: bool) -> Dict[str, float]:
+    number = 20000 if quick else 200000
+    return {
+        "decode_multi_pid_us": per_call_us(lambda: decode_pid_response(MULTI_PID_RESPONSE, "010C0D1F"), number)
+    }
+
+
+def bench_json(quick: bool) -> Dict[str, float]:
+    """/api/obd/data body as JSON, and as the binary sample record, as encoded for each new sample"""
+    number = 20000 if quick else 200000
+    snapshot = OBDSnapshot(OBDDataStructure(1726, 50, 140), 1729252800.123456, 12.3, 1)
+    # Past the per-sample cache, which would otherwise answer every call after the first
+    encode = encode_obd_response.__wrapped__
+    return {
+        "json_obd_data_us": per_call_us(lambda: encode(snapshot, JSON, TRIGGER_THRESHOLDS), number),
+        "binary_obd_sample_us": per_call_us(lambda: encode(snapshot, SAMPLE_BINARY, TRIGGER_THRESHOLDS), number)
+    }
+
+
+def bench_metrics(quick: bool) -> Dict[str, float]:
+    """Instrumentation cost on the hot paths (labelled child lookup included)"""
+    number = 50000 if quick else 500000
+    metrics = MetricsRegistry()
+    counter = metrics.counter("bench_events", "Events", ("command",))
+    histogram = metrics.histogram("bench_seconds", "Latency", ("command",))
+    return {
+        "metrics_counter_inc_us": per_call_us(lambda: counter.labels("010C0D1F").inc(), number),
+        "metrics_histogram_observe_us": per_call_us(lambda: histogram.labels("010C0D1F").observe(0.042), number)
+    }
+
+
+def bench_serializable(quick: bool) -> Dict[str, float]:
+    """Serializable records through their cached codecs"""
+    number = 10000 if quick else 100000
+    settings = Settings(Device("OBD-II Simulator", "AA:BB:CC:DD:EE:FF"))
+    state = TripState("20241018-120000", 1729252800.0, 1729256400.0, 42.5, 1200, 600, 7)
+    capabilities = VehicleCapabilities("1FDEMULATOR000001", ["04", "05", "0B", "0C", "0D", "0F", "10", "11", "1F", "2F", "33", "42", "46", "5C"], 1729252800.0)
+    state_json = state.serialize(compact=True)
+    return {
+        "serializable_settings_encode_us": per_call_us(settings.serialize, number),
+        "serializable_trip_state_compact_us": per_call_us(lambda: state.serialize(compact=True), number),
+        "serializable_trip_state_decode_us": per_call_us(lambda: TripState.deserialize(state_json), number),
+        "serializable_capabilities_compact_us": per_call_us(lambda: capabilities.serialize(compact=True), number)
+    }
+
+
+async def _poll_as_fast_as_possible(poller: OBDPoller, seconds: float) -> int:
+    deadline = time.perf_counter() + seconds
+    samples = 0
+    while time.perf_counter() < deadline:
+        if await poller.sample_once() is not None:
+            samples += 1
+    return samples
+
+
+def bench_mock_samples(quick: bool) -> Dict[str, float]:
+    from src.Bluetooth.BluetoothMockSimulator import BluetoothMockSimulator
+
+    async def run() -> float:
+        client = BluetoothMockSimulator()
+        client.connected = client.initialized = True
+        seconds = 0.5 if quick else 2.0
+        return await _poll_as_fast_as_possible(OBDPoller(client), seconds) / seconds
+
+    return {"mock_samples_per_s": asyncio.run(run())}
+
+
+class _ReplayClient(object):
+    """The ESP32 client's multi-PID sampling path, over a replayed link"""
+    def __init__(self, replay: ELM327Replay):
+        self.elm = ELM327Connection(replay.write)
+        replay.attach(self.elm)
+
+    async def request_all_settings(self) -> OBDDataStructure:
+        values = decode_pid_response(await self.elm.send_command("010C0D1F"), "010C0D1F")
+        return OBDDataStructure(int(values["0C"]), values["0D"], values["1F"])
+
+
+def bench_replay_samples(quick: bool) -> Dict[str, float]:
+    async def run() -> float:
+        replay = ELM327Replay.from_file(SAMPLE_CAPTURE, speed=0)
+        seconds = 0.5 if quick else 2.0
+        return await _poll_as_fast_as_possible(OBDPoller(_ReplayClient(replay), clock=replay.clock), seconds) / seconds
+
+    return {"replay_samples_per_s": asyncio.run(run())}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _get(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, path: str) -> int:
+    """One keep-alive GET; returns the status code"""
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    length = 0
+    for line in head.split(b"\r\n"):
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":", 1)[1])
+    await reader.readexactly(length)
+    return status
+
+
+async def _wait_for_server(port: int, process: subprocess.Popen, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and process.poll() is None:
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            try:
+                if await _get(reader, writer, "/api/obd/data") == 200:
+                    return True
+            finally:
+                writer.close()
+        except (OSError, asyncio.IncompleteReadError):
+            pass
+        await asyncio.sleep(0.2)
+    return False
+
+
+async def _load(port: int, clients: int, seconds: float) -> List[float]:
+    latencies: List[float] = []
+    deadline = time.perf_counter() + seconds
+
+    async def client() -> None:
+        while time.perf_counter() < deadline:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            try:
+                while time.perf_counter() < deadline:
+                    start = time.perf_counter()
+                    await _get(reader, writer, "/api/obd/data")
+                    latencies.append(time.perf_counter() - start)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                # The server caps requests per keep-alive connection; open a new one
+                pass
+            finally:
+                writer.close()
+
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return latencies
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def bench_http(quick: bool, concurrency: List[int] = (1, 32), workers: int = 1, prefix: str = "http") -> Dict[str, float]:
+    """/api/obd/data served by app.py (ASGI, mock vehicle) in a separate process"""
+    port = _free_port()
+    command = [sys.executable, os.path.join(ROOT, "app.py"), "--server", "asgi", "--port", str(port),
+               "--obd", "mock", "--trips-dir", "", "--history-size", "0", "--idle-rate", "0", "--workers", str(workers)]
+    # The server logs every sample: a file, unlike a pipe, never fills up and blocks it
+    server_log = tempfile.TemporaryFile()
+    process = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=server_log)
+    try:
+        if not asyncio.run(_wait_for_server(port, process, timeout=30.0)):
+            server_log.seek(0)
+            error = server_log.read().decode(errors="replace").strip().splitlines()
+            raise RuntimeError(f"server didn't start{f': {error[-1]}' if error else ''}")
+        results: Dict[str, float] = {}
+        seconds = 1.0 if quick else 5.0
+        for clients in concurrency:
+            latencies = asyncio.run(_load(port, clients, seconds))
+            results[f"{prefix}_c{clients}_p50_ms"] = percentile(latencies, 0.50) * 1e3
+            results[f"{prefix}_c{clients}_p99_ms"] = percentile(latencies, 0.99) * 1e3
+            results[f"{prefix}_c{clients}_requests_per_s"] = len(latencies) / seconds
+        return results
+    finally:
+        process.terminate()
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        server_log.close()
+
+
+def bench_http_workers(quick: bool) -> Dict[str, float]:
+    """bench_http with one ASGI worker per core (at least 2) reading the snapshot bus"""
+    return bench_http(quick, concurrency=[32], workers=max(2, os.cpu_count() or 1), prefix="http_workers")
+
+
+BENCHMARKS: Dict[str, Callable[[bool], Dict[str, float]]] = {
+    "decode": bench_decode,
+    "json": bench_json,
+    "metrics": bench_metrics,
+    "serializable": bench_serializable,
+    "mock": bench_mock_samples,
+    "replay": bench_replay_samples,
+    "http": bench_http,
+    "http_workers": bench_http_workers,
+}
+
+
+def load_baselines(path: str) -> Dict[str, float]:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file).get("metrics", {})
+
+
+def save_baselines(path: str, metrics: Dict[str, float]) -> None:
+    baselines = {"machine": f"{platform.machine()} {platform.processor() or platform.system()}, Python {platform.python_version()}",
+                 "recorded": time.strftime("%Y-%m-%d"),
+                 "metrics": {name: round(value, 3) for name, value in sorted(metrics.items())}}
+    with open(path, "w") as file:
+        json.dump(baselines, file, indent=4)
+        file.write("\n")
+
+
+def compare(metrics: Dict[str, float], baselines: Dict[str, float], tolerance: float) -> List[str]:
+    """Names of the metrics that are more than `tolerance` worse than their baseline"""
+    regressions = []
+    for name, value in metrics.items():
+        baseline = baselines.get(name)
+        if not baseline:
+            continue
+        change = (value - baseline) / baseline
+        if (change if lower_is_better(name) else -change) > tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Offline end-to-end benchmark suite')
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help='Benchmarks to run (default: all)')
+    parser.add_argument('--quick', action='store_true', help='Shorter runs, noisier numbers')
+    parser.add_argument('--baselines', default=BASELINES_PATH)
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='Allowed relative slowdown before failing')
+    parser.add_argument('--update-baselines', action='store_true', help='Store these results as the new baselines')
+    args = parser.parse_args()
+
+    # Client modules configure INFO logging when imported
+    log.disable(log.INFO)
+    baselines = load_baselines(args.baselines)
+    metrics: Dict[str, float] = {}
+    failed: List[str] = []
+    print(f"{'metric':<36} {'value':>12} {'baseline':>12} {'change':>8}")
+    for name in args.only or list(BENCHMARKS):
+        try:
+            results = BENCHMARKS[name](args.quick)
+        except Exception as e:
+            print(f"{name:<36} failed: {e}")
+            failed.append(name)
+            continue
+        metrics.update(results)
+        for metric, value in results.items():
+            baseline = baselines.get(metric)
+            change = f"{(value - baseline) / baseline:+.0%}" if baseline else ""
+            print(f"{metric:<36} {value:>12.3f} {baseline if baseline is not None else '-':>12} {change:>8}")
+
+    if args.update_baselines:
+        save_baselines(args.baselines, {**baselines, **metrics})
+        print(f"Baselines written to {args.baselines}")
+        return 1 if failed else 0
+
+    regressions = compare(metrics, baselines, args.tolerance)
+    for metric in regressions:
+        print(f"REGRESSION: {metric} is {metrics[metric]:.3f} against a baseline of {baselines[metric]} "
+              f"(tolerance {args.tolerance:.0%})")
+    return 1 if regressions or failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,81 @@
+import logging as log
+from typing import Any, Dict, List, Optional
+from src.OBD.FleetSimulator import FleetSimulator
+from src.OBD.OBDDataStructure import OBDDataStructure
+from src.Bluetooth.iBluetoothOBDClient import iBluetoothOBDClient
+
+
+class BluetoothFleetSimulator(iBluetoothOBDClient):
+    """One vehicle of a FleetSimulator, answering instantly (no simulated link delays)."""
+
+    def __init__(self, fleet: FleetSimulator, index: int):
+        super().__init__()
+        if not 0 <= index < fleet.size:
+            raise ValueError(f"Vehicle index {index} is outside a fleet of {fleet.size}")
+        self.fleet = fleet
+        self.index = index
+        self.target_name = f"Fleet vehicle {index}"
+        self.target_address = f"fleet:{fleet.seed}/{index}"
+        self.connected = False
+
+    async def find_device(self) -> bool:
+        return True
+
+    async def connect(self) -> bool:
+        self.connected = True
+        return True
+
+    async def init_communication(self) -> bool:
+        return self.connected
+
+    def _values(self) -> Dict[str, int]:
+        rpm, speed, runtime = self.fleet.values(self.index)
+        return {"0C": rpm, "0D": speed, "1F": runtime}
+
+    async def send_command(self, command: str) -> Optional[str]:
+        """Service 01 requests for RPM, speed and runtime, encoded like an ELM327 would"""
+        if not self.connected:
+            return None
+        if command == "ATALL":
+            values = self._values()
+            return f"RPM:{values['0C']},SPEED:{values['0D']},RUNTIME:{values['1F']}"
+        if not command.startswith("01") or len(command) < 4:
+            return None
+
+        values = self._values()
+        encoded = {
+            "0C": f"{(values['0C'] * 4) >> 8:02X} {(values['0C'] * 4) & 0xFF:02X}",
+            "0D": f"{min(values['0D'], 255):02X}",
+            "1F": f"{(values['1F'] >> 8) & 0xFF:02X} {values['1F'] & 0xFF:02X}"
+        }
+        parts = ["41"]
+        for pid in (command[i:i + 2] for i in range(2, len(command), 2)):
+            if pid in encoded:
+                parts += [pid, encoded[pid]]
+        return " ".join(parts) if len(parts) > 1 else "NO DATA"
+
+    async def request_pids(self, pids: List[str]) -> Dict[str, Any]:
+        """Reads the simulated values directly, skipping the encode/decode round trip"""
+        if not self.connected:
+            return {}
+        values = self._values()
+        return {pid: values[pid] for pid in pids if pid in values}
+
+    async def request_engine_rpm(self) -> Optional[int]:
+        return (await self.request_pids(["0C"])).get("0C")
+
+    async def request_vehicle_speed(self) -> Optional[int]:
+        return (await self.request_pids(["0D"])).get("0D")
+
+    async def request_engine_run_time(self) -> Optional[int]:
+        return (await self.request_pids(["1F"])).get("1F")
+
+    async def request_all_settings(self) -> Optional[OBDDataStructure]:
+        if not self.connected:
+            return None
+        rpm, speed, runtime = self.fleet.values(self.index)
+        log.debug("Fleet %d: RPM: %s, Speed: %s(km/h), Runtime: %s(s)", self.index, rpm, speed, runtime)
+        return OBDDataStructure(rpm, speed, runtime)
+
+    async def close(self) -> None:
+        self.connected = False
@@ -74,15 +74,18 @@ class BluetoothMockSimulator(iBluetoothOBDClient):
         await asyncio.sleep(0.1)  # Simulate command delay
         
         # Simulate responses based on command
-        if command == "010C":  # RPM
-            rpm, _, _ = self._get_mock_values()
-            return f"41 0C {rpm // 4:04X}"
-        elif command == "010D":  # Speed
-            _, speed, _ = self._get_mock_values()
-            return f"41 0D {speed:02X}"
-        elif command == "011F":  # Runtime
-            _, _, runtime = self._get_mock_values()
-            return f"41 1F {runtime:04X}"
+        if command.startswith("01") and len(command) >= 4:  # Service 01, one or more PIDs
+            rpm, speed, runtime = self._get_mock_values()
+            encoded = {
+                "0C": f"{(rpm * 4) >> 8:02X} {(rpm * 4) & 0xFF:02X}",       # RPM
+                "0D": f"{speed:02X}",                                         # Speed
+                "1F": f"{(runtime >> 8) & 0xFF:02X} {runtime & 0xFF:02X}"    # Runtime
+            }
+            parts = ["41"]
+            for pid in (command[i:i + 2] for i in range(2, len(command), 2)):
+                if pid in encoded:
+                    parts += [pid, encoded[pid]]
+            return " ".join(parts) if len(parts) > 1 else "NO DATA"
         elif command == "ATALL":  # All settings
             rpm, speed, runtime = self._get_mock_values()
             return f"RPM:{rpm},SPEED:{speed},RUNTIME:{runtime}"
@@ -94,7 +97,7 @@ class BluetoothMockSimulator(iBluetoothOBDClient):
         if not self.connected or not self.initialized:
             return None
         rpm, _, _ = self._get_mock_values()
-        log.info(f"Mock: RPM = {rpm}")
+        log.debug("Mock: RPM = %s", rpm)
         return rpm
 
     async def request_vehicle_speed(self) -> Optional[int]:
@@ -102,7 +105,7 @@ class BluetoothMockSimulator(iBluetoothOBDClient):
         if not self.connected or not self.initialized:
             return None
         _, speed, _ = self._get_mock_values()
-        log.info(f"Mock: Speed = {speed} km/h")
+        log.debug("Mock: Speed = %s km/h", speed)
         return speed
 
     async def request_engine_run_time(self) -> Optional[int]:
@@ -110,7 +113,7 @@ class BluetoothMockSimulator(iBluetoothOBDClient):
         if not self.connected or not self.initialized:
             return None
         _, _, runtime = self._get_mock_values()
-        log.info(f"Mock: Runtime = {runtime} seconds")
+        log.debug("Mock: Runtime = %s seconds", runtime)
         return runtime
 
     async def request_all_settings(self) -> Optional[OBDDataStructure]:
@@ -119,8 +122,7 @@ class BluetoothMockSimulator(iBluetoothOBDClient):
             return None
             
         rpm, speed, runtime = self._get_mock_values()
-        log.info(f"Mock: All settings - RPM: {rpm}, "
-                f"Speed: {speed}(km/h), Runtime: {runtime}(s)")
+        log.debug("Mock: All settings - RPM: %s, Speed: %s(km/h), Runtime: %s(s)", rpm, speed, runtime)
         return OBDDataStructure(rpm, speed, runtime)
 
     async def close(self) -> None:
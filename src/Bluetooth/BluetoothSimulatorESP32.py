@@ -1,160 +1,272 @@
-import bluetooth
 import asyncio
-from bluetooth import *
 import logging as log
-from typing import Optional, Dict
-import time
+import os
+from typing import Any, Optional, Dict, List
 from src.OBD.OBDDataStructure import OBDDataStructure
+from src.OBD.ELM327Connection import CONNECTIONS_LOST, ELM327Connection, ELM327Error
+from src.OBD.ELM327Capture import ELM327Capture, ELM327Replay
+from src.OBD.ELM327Transport import ELM327Transport, transport_from_address
+from src.OBD.PIDRequests import build_pid_commands, decode_pid_response
+from src.OBD.VehicleCapabilities import VehicleCapabilities, CAPABILITIES_DIR
 from src.Bluetooth.iBluetoothOBDClient import iBluetoothOBDClient
+from src.Settings import Settings
 
 log.basicConfig(level=log.INFO)
 
+SETTINGS_PATH = "config/settings.json"
+
 class BluetoothSimulatorESP32(iBluetoothOBDClient):
     def __init__(self):
         super().__init__()
-        self.sock = None
         self.target_name = "OBD-II Simulator"
         self.target_address = None
         self.port = 1
+        self.command_timeout = 2.0
+        self.reset_timeout = 5.0
+        self.elm: Optional[ELM327Connection] = None
+        # Link to the adapter, picked from the address (RFCOMM, TCP or serial)
+        self.transport: Optional[ELM327Transport] = None
+        # Adapter capabilities, probed in init_communication
+        self.supports_atall = False
+        self.max_pipeline_depth = 4
+        # ECU capabilities, discovered once per VIN (None: unknown, nothing is filtered)
+        self.capabilities: Optional[VehicleCapabilities] = None
+        self.capabilities_dir: Optional[str] = CAPABILITIES_DIR
+        # Raw traffic capture file, and a capture to replay instead of the adapter
+        self.capture_path: Optional[str] = None
+        self.capture: Optional[ELM327Capture] = None
+        self.replay: Optional[ELM327Replay] = None
+        # Where the adapter address found by discovery is kept between runs
+        self.settings_path: Optional[str] = SETTINGS_PATH
+        self._address_from_cache = False
 
     async def find_device(self) -> bool:
-        print(f"Searching for {self.target_name}...")
+        """Uses the address cached in the settings file, or searches for the adapter by name"""
+        cached = self._cached_address()
+        if cached:
+            log.info(f"Using cached address {cached} for {self.target_name}")
+            self.target_address = cached
+            self._address_from_cache = True
+            return True
+        return await self._discover()
+
+    async def _discover(self) -> bool:
+        log.info(f"Searching for {self.target_name}...")
         try:
+            from bluetooth import discover_devices
             # Using asyncio.to_thread to make the blocking bluetooth call non-blocking
             nearby_devices = await asyncio.to_thread(
                 discover_devices, lookup_names=True, duration=8
             )
-            print(f"Found {len(nearby_devices)} devices")
+            log.info(f"Found {len(nearby_devices)} devices")
             
             for addr, name in nearby_devices:
-                print(f"Found device: {name} at {addr}")
+                log.debug("Found device: %s at %s", name, addr)
                 if name == self.target_name:
                     self.target_address = addr
+                    self._address_from_cache = False
+                    self._cache_address(addr)
                     return True
             return False
         except Exception as e:
             log.error(f"Error searching for devices: {e}")
             return False
 
+    def _load_settings(self) -> Optional[Settings]:
+        if not self.settings_path or not os.path.exists(Settings.path_to_python(self.settings_path)):
+            return None
+        return Settings.from_file(self.settings_path)
+
+    def _cached_address(self) -> Optional[str]:
+        """The settings' device address, unless it was saved for an adapter of another name"""
+        settings = self._load_settings()
+        if settings is None or not settings.device.address:
+            return None
+        if settings.device.name and settings.device.name != self.target_name:
+            return None
+        return settings.device.address
+
+    def _cache_address(self, address: str) -> None:
+        if not self.settings_path:
+            return
+        settings = self._load_settings() or Settings()
+        settings.device.name = self.target_name
+        settings.device.address = address
+        try:
+            settings.to_file(self.settings_path)
+        except OSError as e:
+            log.error(f"Couldn't save the device address to '{self.settings_path}': {e}")
+
     async def connect(self) -> bool:
-        if not self.target_address:
+        if self.replay is None and not self.target_address:
             if not await self.find_device():
                 log.error(f"Could not find {self.target_name} device")
                 return False
 
-        log.info(f"Connecting to {self.target_name} at {self.target_address}...")
+        if await self._open_link():
+            return True
+        if self.replay is None and self._address_from_cache:
+            # The adapter was replaced or re-paired: search for it again, once
+            log.warning(f"Cached address {self.target_address} is unreachable, searching for {self.target_name}")
+            self._address_from_cache = False
+            self.target_address = None
+            if await self._discover():
+                return await self._open_link()
+        return False
+
+    async def _open_link(self) -> bool:
         try:
-            self.sock = BluetoothSocket(RFCOMM)
-            await asyncio.to_thread(
-                self.sock.connect, (self.target_address, self.port)
-            )
-            self.sock.settimeout(1.0)  # Set timeout for operations
+            self.transport = self.replay or transport_from_address(self.target_address, self.port)
+        except ValueError as e:
+            log.error(f"Failed to connect: {e}")
+            return False
+
+        if self.replay is not None:
+            log.info(f"Replaying ELM327 capture at {f'{self.replay.speed}x' if self.replay.speed else 'full'} speed")
+        else:
+            log.info(f"Connecting to {self.target_name} at {self.transport}...")
+        try:
+            self.elm = ELM327Connection(self.transport.write, default_timeout=self.command_timeout, capture=self._open_capture())
+            await self.transport.open(self.elm.data_received, self._connection_lost)
             log.info("Connected successfully!")
             return True
         except Exception as e:
             log.error(f"Failed to connect: {e}")
+            self.elm = None
+            self.transport = None
             return False
-    
+
+    def _open_capture(self) -> Optional[ELM327Capture]:
+        if not self.capture_path:
+            return None
+        try:
+            self.capture = ELM327Capture(self.capture_path)
+            log.info(f"Capturing ELM327 traffic to '{self.capture_path}'")
+        except OSError as e:
+            log.error(f"Couldn't open capture file '{self.capture_path}': {e}")
+            self.capture = None
+        return self.capture
+
     async def init_communication(self) -> bool:
         log.info("Initializing communication...")
         
         try:
             # Reset device and disable echo
-            commands = ["ATZ", "ATE0"]
-            for cmd in commands:
-                if not await self.send_command(cmd):
+            commands = [("ATZ", self.reset_timeout), ("ATE0", None)]
+            for cmd, timeout in commands:
+                if not await self.send_command(cmd, timeout=timeout):
                     log.error(f"Failed to execute {cmd}")
                     return False
+
+            await self._probe_adapter()
+            self.capabilities = await VehicleCapabilities.discover(self.send_command, self.capabilities_dir)
             return True
         
         except Exception as e:
             log.error(f"Error initializing communication: {e}")
             return False
 
-    async def send_command(self, command: str) -> Optional[str]:
-        if not self.sock:
+    async def _probe_adapter(self) -> None:
+        """Detects the custom ATALL command and adapters that can queue commands"""
+        response = await self.send_command("ATALL")
+        self.supports_atall = bool(response) and response.startswith("RPM:")
+
+        # STN11xx/STN22xx based adapters buffer commands, so they can be pipelined
+        response = await self.send_command("STI")
+        if response and response.startswith("STN"):
+            self.elm.set_pipeline_depth(self.max_pipeline_depth)
+
+        log.info(f"Adapter capabilities - ATALL: {self.supports_atall}, pipeline depth: {self.elm.pipeline_depth}")
+
+    def _connection_lost(self, exc: Optional[Exception]) -> None:
+        log.error(f"Connection to {self.target_name} lost{f': {exc}' if exc else ''}")
+        CONNECTIONS_LOST.inc()
+        if self.elm:
+            self.elm.connection_lost(exc)
+        if self.on_connection_lost is not None:
+            self.on_connection_lost()
+
+    async def send_command(self, command: str, timeout: Optional[float] = None) -> Optional[str]:
+        if not self.elm:
             log.error("Not connected to device")
             return None
 
         try:
-            # Send command with carriage return
-            await asyncio.to_thread(
-                self.sock.send, (command + "\r").encode()
-            )
-            await asyncio.sleep(0.1)  # Give device time to respond
-            
-            # Read response with timeout handling
-            response = ""
-            start_time = time.time()
-            timeout = 2.0  # 2 second timeout
-            
-            while (time.time() - start_time) < timeout:
-                try:
-                    data = await asyncio.to_thread(
-                        self.sock.recv, 1024
-                    )
-                    if data:
-                        response += data.decode().strip()
-                        if "\r" in response or "\n" in response:
-                            break
-                except bluetooth.btcommon.BluetoothError as e:
-                    if "timed out" not in str(e):
-                        raise
-                    break
-            
-            return response.strip() if response.strip() else None
-            
-        except Exception as e:
+            # Resolves as soon as the adapter prints its '>' prompt
+            response = await self.elm.send_command(command, timeout=timeout)
+            return response if response else None
+        except asyncio.TimeoutError:
+            log.error(f"Timed out waiting for response to '{command}'")
+            return None
+        except (ELM327Error, OSError) as e:
             log.error(f"Error sending command '{command}': {e}")
             return None
+
+    async def send_commands(self, commands: List[str], timeout: Optional[float] = None) -> List[Optional[str]]:
+        """Sends several commands, pipelined when the adapter allows it"""
+        if not self.elm:
+            log.error("Not connected to device")
+            return [None] * len(commands)
+
+        try:
+            return await self.elm.send_commands(commands, timeout=timeout)
+        except (ELM327Error, OSError) as e:
+            log.error(f"Error sending commands {commands}: {e}")
+            return [None] * len(commands)
+
+    async def request_pids(self, pids: List[str]) -> Dict[str, Any]:
+        """
+        Fetches service 01 PIDs in the fewest frames (up to 6 PIDs per request)
+
+        Returns:
+            Dict[str, Any]: Decoded value per PID that answered
+        """
+        if self.capabilities is not None:
+            # Unsupported PIDs would only cost a timeout
+            pids = self.capabilities.filter(pids)
+            if not pids:
+                return {}
+        commands = build_pid_commands(pids)
+        results: Dict[str, Any] = {}
+        for command, response in zip(commands, await self.send_commands(commands)):
+            results.update(decode_pid_response(response, command))
+        return results
             
     async def request_engine_rpm(self) -> Optional[int]:
-        response = await self.send_command("010C")
-        if response and response.startswith("41 0C"):
-            try:
-                data = response.split()
-                if len(data) >= 4:
-                    rpm = ((int(data[2], 16) * 256) + int(data[3], 16)) // 4
-                    log.info(f"Engine RPM: {rpm}")
-                    return rpm
-            except (ValueError, IndexError) as e:
-                log.error(f"Error parsing RPM data: {e}")
+        values = await self.request_pids(["0C"])
+        if "0C" in values:
+            rpm = int(values["0C"])
+            log.debug("Engine RPM: %s", rpm)
+            return rpm
         
         log.error("Failed to get RPM data")
         return None
     
     async def request_vehicle_speed(self) -> Optional[int]:
-        response = await self.send_command("010D")
-        if response and response.startswith("41 0D"):
-            try:
-                speed = int(response.split()[2], 16)
-                log.info(f"Vehicle Speed: {speed} km/h")
-                return speed
-            except (ValueError, IndexError) as e:
-                log.error(f"Error parsing speed data: {e}")
+        values = await self.request_pids(["0D"])
+        if "0D" in values:
+            speed = values["0D"]
+            log.debug("Vehicle Speed: %s km/h", speed)
+            return speed
         
         log.error("Failed to get speed data")
         return None
     
     async def request_engine_run_time(self) -> Optional[int]:
-        response = await self.send_command("011F")
-        if response and response.startswith("41 1F"):
-            try:
-                data = response.split()
-                if len(data) >= 4:
-                    run_time = (int(data[2], 16) * 256) + int(data[3], 16)
-                    minutes = run_time // 60
-                    seconds = run_time % 60
-                    log.info(f"Engine Run Time: {minutes} minutes, {seconds} seconds")
-                    return run_time
-            except (ValueError, IndexError) as e:
-                log.error(f"Error parsing run time data: {e}")
+        values = await self.request_pids(["1F"])
+        if "1F" in values:
+            run_time = values["1F"]
+            log.debug("Engine Run Time: %s minutes, %s seconds", run_time // 60, run_time % 60)
+            return run_time
             
         log.error("Failed to get engine run time data")
         return None
 
     async def request_all_settings(self) -> Optional[OBDDataStructure]:
-        """Request all vehicle settings at once using the ATALL command."""
+        """Request all vehicle settings at once, with ATALL or a multi-PID request."""
+        if not self.supports_atall:
+            return await self._request_all_settings_multi_pid()
+
         response = await self.send_command("ATALL")
         if not response:
             log.error("Failed to get all settings")
@@ -169,7 +281,7 @@ class BluetoothSimulatorESP32(iBluetoothOBDClient):
                 speed = int(values[1].split(":")[1]) if values[1] else None
                 runtime = int(values[2].split(":")[1]) if values[2] else None
 
-                log.info(f"All settings - RPM: {rpm}, Speed: {speed}(km/h), Runtime: {runtime}(s)")
+                log.debug("All settings - RPM: %s, Speed: %s(km/h), Runtime: %s(s)", rpm, speed, runtime)
                 
                 return OBDDataStructure(rpm, speed, runtime)
                 
@@ -178,12 +290,33 @@ class BluetoothSimulatorESP32(iBluetoothOBDClient):
         
         return None
 
+    async def _request_all_settings_multi_pid(self) -> Optional[OBDDataStructure]:
+        """Standard single-frame request for RPM, speed and runtime ("010C0D1F")"""
+        values = await self.request_pids(["0C", "0D", "1F"])
+        if not values:
+            log.error("Failed to get all settings")
+            return None
+
+        rpm = int(values["0C"]) if "0C" in values else None
+        speed = values.get("0D")
+        runtime = values.get("1F")
+
+        log.debug("All settings - RPM: %s, Speed: %s(km/h), Runtime: %s(s)", rpm, speed, runtime)
+        return OBDDataStructure(rpm, speed, runtime)
+
     async def close(self) -> None:
-        if self.sock:
+        if self.elm:
+            self.elm.connection_lost(None)
+            self.elm = None
+        if self.transport:
             try:
-                await asyncio.to_thread(self.sock.close)
+                await self.transport.close()
             except Exception as e:
                 log.error(f"Error closing connection: {e}")
+            self.transport = None
+        if self.capture:
+            self.capture.close()
+            self.capture = None
 
 if __name__ == "__main__":
     # Example usage
@@ -0,0 +1,50 @@
+import importlib
+import logging as log
+from typing import Dict, List, Type, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from src.Bluetooth.iBluetoothOBDClient import iBluetoothOBDClient
+
+# Client class per --obd/--vehicle type, as "module:class". Modules are only imported
+# when a vehicle of that type is created, so mock-only hosts never load PyBluez
+OBD_CLIENT_BACKENDS: Dict[str, str] = {
+    'mock': 'src.Bluetooth.BluetoothMockSimulator:BluetoothMockSimulator',
+    'esp32': 'src.Bluetooth.BluetoothSimulatorESP32:BluetoothSimulatorESP32',
+    # ESP32 client answered from a capture file (the ADDRESS) instead of the adapter
+    'replay': 'src.Bluetooth.BluetoothSimulatorESP32:BluetoothSimulatorESP32'
+}
+
+_loaded: Dict[str, Type["iBluetoothOBDClient"]] = {}
+
+
+def backend_names() -> List[str]:
+    return list(OBD_CLIENT_BACKENDS.keys())
+
+
+def load_backend(name: str) -> Type["iBluetoothOBDClient"]:
+    """
+    Imports the client class of a backend on first use
+
+    Raises:
+        ValueError: If there is no backend of that name
+        ImportError: If the backend's dependencies are missing
+    """
+    cls = _loaded.get(name)
+    if cls is not None:
+        return cls
+    if name not in OBD_CLIENT_BACKENDS:
+        raise ValueError(f"Unknown OBD client type '{name}'. Expected one of {backend_names()}")
+
+    module_name, _, class_name = OBD_CLIENT_BACKENDS[name].partition(':')
+    try:
+        module = importlib.import_module(module_name)
+    except ImportError as e:
+        raise ImportError(f"OBD client type '{name}' needs a missing dependency: {e}") from e
+    cls = _loaded[name] = getattr(module, class_name)
+    log.debug(f"Loaded OBD client backend '{name}' ({module_name})")
+    return cls
+
+
+def create_client(name: str) -> "iBluetoothOBDClient":
+    """New, unconnected client of a backend"""
+    return load_backend(name)()
@@ -1,7 +1,7 @@
 from abc import ABC, abstractmethod
-from bluetooth import *
-from typing import Optional
+from typing import Any, Callable, Dict, List, Optional
 from src.OBD.OBDDataStructure import OBDDataStructure
+from src.OBD.PIDRequests import build_pid_commands, decode_pid_response
 
 
 class iBluetoothOBDClient(ABC):
@@ -10,6 +10,8 @@ class iBluetoothOBDClient(ABC):
         self.target_name = None
         self.target_address = None
         self.port = None
+        # Called when the link drops on its own (not on close), so the owner can reconnect
+        self.on_connection_lost: Optional[Callable[[], None]] = None
         
     @abstractmethod
     def find_device(self) -> bool:
@@ -31,6 +33,13 @@ class iBluetoothOBDClient(ABC):
         """Send a command to the device and return the response."""
         pass
 
+    async def request_pids(self, pids: List[str]) -> Dict[str, Any]:
+        """Request several service 01 PIDs in the fewest frames, decoded by PID."""
+        results: Dict[str, Any] = {}
+        for command in build_pid_commands(pids):
+            results.update(decode_pid_response(await self.send_command(command), command))
+        return results
+
     @abstractmethod
     def request_engine_rpm(self) -> Optional[int]:
         """Request current engine RPM."""
@@ -0,0 +1,167 @@
+import atexit
+import json
+import logging as log
+import queue
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Callable, Dict, Optional, TextIO, Tuple
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+# Records waiting for the logging thread; beyond this they are dropped, never waited for
+DEFAULT_QUEUE_SIZE = 10000
+# Per call site: messages per second once the burst is spent
+DEFAULT_RATE = 5.0
+DEFAULT_BURST = 20
+
+
+class RateLimitFilter(log.Filter):
+    """
+    Token bucket per call site (file and line): a site may log `burst` records at once and
+    `rate` per second after that. Suppressed records are counted, and the next record of
+    the site reports how many it stands for, so floods are thinned but never invisible.
+    Records at `exempt_level` or above always pass.
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST, exempt_level: int = log.CRITICAL,
+                 clock: Callable[[], float] = time.monotonic):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.exempt_level = exempt_level
+        self.clock = clock
+        self.suppressed = 0
+        # (path, line) -> [tokens, last refill, suppressed since the last record let through]
+        self._sites: Dict[Tuple[str, int], list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: log.LogRecord) -> bool:
+        if record.levelno >= self.exempt_level:
+            return True
+        now = self.clock()
+        key = (record.pathname, record.lineno)
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None:
+                site = self._sites[key] = [float(self.burst), now, 0]
+            tokens = min(float(self.burst), site[0] + (now - site[1]) * self.rate)
+            site[1] = now
+            if tokens < 1.0:
+                site[0] = tokens
+                site[2] += 1
+                self.suppressed += 1
+                return False
+            site[0] = tokens - 1.0
+            suppressed, site[2] = site[2], 0
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class TextFormatter(log.Formatter):
+    def format(self, record: log.LogRecord) -> str:
+        text = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        return f"{text} (+{suppressed} similar suppressed)" if suppressed else text
+
+
+class JSONLinesFormatter(log.Formatter):
+    """One JSON object per record: time, level, logger, message, call site and exception"""
+
+    def format(self, record: log.LogRecord) -> str:
+        entry = {
+            "time": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "module": record.module,
+            "line": record.lineno,
+            "thread": record.threadName
+        }
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            entry["suppressed"] = suppressed
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, separators=(",", ":"), default=str)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Hands records to the logging thread as they are: message arguments are only merged
+    (and records formatted) over there. Pass values that won't change afterwards, as
+    usual with %-style arguments. A full queue drops the record instead of blocking.
+    """
+
+    def __init__(self, records: queue.Queue):
+        super().__init__(records)
+        self.dropped = 0
+
+    def prepare(self, record: log.LogRecord) -> log.LogRecord:
+        return record
+
+    def enqueue(self, record: log.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class AsyncLogging(object):
+    """The root logger's queue, its background listener and its filters, once set up"""
+
+    handler: Optional[NonBlockingQueueHandler] = None
+    listener: Optional[QueueListener] = None
+    rate_limit: Optional[RateLimitFilter] = None
+
+    @classmethod
+    def setup(cls, level: str = "INFO", fmt: str = "text", asynchronous: bool = True, rate: float = DEFAULT_RATE,
+              burst: int = DEFAULT_BURST, stream: Optional[TextIO] = None, queue_size: int = DEFAULT_QUEUE_SIZE) -> None:
+        """
+        Replaces the root logger's handlers
+
+        Args:
+            level (str, optional): Minimum level. Defaults to 'INFO'.
+            fmt (str, optional): 'text' or 'json' (JSON lines). Defaults to 'text'.
+            asynchronous (bool, optional): Write from a background thread through a bounded queue. Defaults to True.
+            rate (float, optional): Records per second per call site after a burst, 0 for no limit.
+            burst (int, optional): Records a call site may log at once.
+            stream (TextIO, optional): Output. Defaults to stderr.
+        """
+        cls.shutdown()
+        output = log.StreamHandler(stream if stream is not None else sys.stderr)
+        output.setFormatter(JSONLinesFormatter() if fmt == "json" else TextFormatter(TEXT_FORMAT))
+
+        handler: log.Handler = output
+        if asynchronous:
+            cls.handler = handler = NonBlockingQueueHandler(queue.Queue(queue_size))
+            cls.listener = QueueListener(cls.handler.queue, output)
+            cls.listener.start()
+        cls.rate_limit = RateLimitFilter(rate, burst) if rate > 0 else None
+        if cls.rate_limit is not None:
+            handler.addFilter(cls.rate_limit)
+
+        root = log.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(handler)
+        root.setLevel(level.upper())
+
+    @classmethod
+    def shutdown(cls) -> None:
+        """Writes out the queued records and stops the logging thread"""
+        if cls.listener is not None:
+            cls.listener.stop()
+            cls.listener = None
+
+    @classmethod
+    def dropped(cls) -> int:
+        return cls.handler.dropped if cls.handler is not None else 0
+
+    @classmethod
+    def suppressed(cls) -> int:
+        return cls.rate_limit.suppressed if cls.rate_limit is not None else 0
+
+
+atexit.register(AsyncLogging.shutdown)
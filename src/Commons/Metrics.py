@@ -0,0 +1,276 @@
+import math
+import threading
+import weakref
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+# Seconds; spans a fast single-PID round trip up to the ELM327 reset timeout
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+CallbackResult = Union[float, Iterable[Tuple[LabelValues, float]]]
+
+
+class _CellOwner(object):
+    """A thread's hold on its cell; collected with the thread's locals when it exits"""
+    __slots__ = ("cell", "__weakref__")
+
+    def __init__(self, cell: list):
+        self.cell = cell
+
+
+class _Shards(object):
+    """
+    Per-thread value cells. Each thread only ever writes its own cell, so updates are
+    plain list item increments without a lock; readers sum every cell. The lock is
+    only taken the first time a thread writes, and when it exits: the cells of finished
+    threads (e.g. the dev server's one per request) are folded into a retired total.
+    """
+
+    def __init__(self, width: int):
+        self.width = width
+        self._local = threading.local()
+        self._cells: Dict[int, list] = {}
+        self._retired = [0] * width
+        self._lock = threading.Lock()
+
+    def cell(self) -> list:
+        try:
+            return self._local.owner.cell
+        except AttributeError:
+            cell = [0] * self.width
+            owner = _CellOwner(cell)
+            with self._lock:
+                self._cells[id(cell)] = cell
+            weakref.finalize(owner, self._retire, cell)
+            self._local.owner = owner
+            return cell
+
+    def _retire(self, cell: list) -> None:
+        with self._lock:
+            self._cells.pop(id(cell), None)
+            for index, value in enumerate(cell):
+                self._retired[index] += value
+
+    def totals(self) -> list:
+        with self._lock:
+            cells = list(self._cells.values())
+            retired = list(self._retired)
+        return [retired[index] + sum(cell[index] for cell in cells) for index in range(self.width)]
+
+    def __len__(self) -> int:
+        """Live cells"""
+        return len(self._cells)
+
+
+class CounterChild(object):
+    __slots__ = ("_shards",)
+
+    def __init__(self):
+        self._shards = _Shards(1)
+
+    def inc(self, amount: float = 1) -> None:
+        self._shards.cell()[0] += amount
+
+    @property
+    def value(self) -> float:
+        return self._shards.totals()[0]
+
+
+class HistogramChild(object):
+    __slots__ = ("buckets", "_shards")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        # One count per bucket, one for +Inf, then the sum
+        self._shards = _Shards(len(self.buckets) + 2)
+
+    def observe(self, value: float) -> None:
+        cell = self._shards.cell()
+        cell[bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        """Cumulative bucket counts (the last one is +Inf, i.e. the total count) and the sum"""
+        totals = self._shards.totals()
+        cumulative, running = [], 0
+        for count in totals[:-1]:
+            running += count
+            cumulative.append(running)
+        return cumulative, totals[-1]
+
+
+class Metric(ABC):
+    """A metric family: one child per combination of label values"""
+
+    TYPE = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[LabelValues, object] = {}
+        # Children by label values as passed to `labels` (e.g. 200 and "200" both map to one child)
+        self._lookup: Dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def _new_child(self):
+        pass
+
+    def labels(self, *values) -> object:
+        # Hot path: one dict lookup on the values as passed
+        child = self._lookup.get(values)
+        if child is None:
+            key = tuple(str(value) for value in values)
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+                self._lookup[values] = child
+        return child
+
+    def children(self) -> List[Tuple[LabelValues, object]]:
+        with self._lock:
+            return list(self._children.items())
+
+    @abstractmethod
+    def samples(self) -> List[Tuple[str, LabelValues, Tuple[str, ...], float]]:
+        """(suffix, label values, extra label pair, value) of every exported series"""
+        pass
+
+
+class Counter(Metric):
+    TYPE = "counter"
+
+    def _new_child(self) -> CounterChild:
+        return CounterChild()
+
+    def inc(self, amount: float = 1) -> None:
+        """Increments the unlabelled counter"""
+        self.labels().inc(amount)
+
+    def samples(self):
+        return [("_total", values, (), child.value) for values, child in self.children()]
+
+
+class Histogram(Metric):
+    TYPE = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> HistogramChild:
+        return HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        """Observes a value of the unlabelled histogram"""
+        self.labels().observe(value)
+
+    def samples(self):
+        result = []
+        for values, child in self.children():
+            cumulative, total = child.snapshot()
+            for bound, count in zip(self.buckets + (math.inf,), cumulative):
+                result.append(("_bucket", values, ("le", _format_value(bound)), count))
+            result.append(("_count", values, (), cumulative[-1]))
+            result.append(("_sum", values, (), total))
+        return result
+
+
+class CallbackMetric(Metric):
+    """
+    Gauge or counter read at scrape time from state the application keeps anyway
+    (queue lengths, subscriber counts, counters owned by other objects)
+    """
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], CallbackResult],
+                 labelnames: Sequence[str] = (), metric_type: str = "gauge"):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+        self.TYPE = metric_type
+
+    def _new_child(self):
+        raise TypeError(f"{self.name} is read through its callback, it has no children")
+
+    def samples(self):
+        suffix = "_total" if self.TYPE == "counter" else ""
+        result = self.callback()
+        if isinstance(result, (int, float)):
+            return [(suffix, (), (), result)]
+        return [(suffix, tuple(str(value) for value in values), (), value) for values, value in result]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class MetricsRegistry(object):
+    """Metric families exported together in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        """Registers a metric; a metric of the same name and type is returned instead of duplicated"""
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if existing.TYPE != metric.TYPE:
+                    raise ValueError(f"Metric '{metric.name}' is already registered as a {existing.TYPE}")
+                if isinstance(metric, CallbackMetric):
+                    existing.callback = metric.callback
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def unregister(self, name: str) -> None:
+        with self._lock:
+            self._metrics.pop(name, None)
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name: str, documentation: str, callback: Callable[[], CallbackResult],
+                 labelnames: Sequence[str] = (), metric_type: str = "gauge") -> CallbackMetric:
+        return self.register(CallbackMetric(name, documentation, callback, labelnames, metric_type))
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """Every metric in the Prometheus text exposition format (0.0.4)"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines: List[str] = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.TYPE}")
+            for suffix, values, extra, value in metric.samples():
+                pairs = list(zip(metric.labelnames, values)) + ([extra] if extra else [])
+                labels = ",".join(f'{name}="{_escape(label)}"' for name, label in pairs)
+                lines.append(f"{metric.name}{suffix}{{{labels}}} {_format_value(value)}" if labels
+                             else f"{metric.name}{suffix} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry exported at /metrics
+REGISTRY = MetricsRegistry()
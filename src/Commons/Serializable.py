@@ -1,11 +1,167 @@
-from typing import Any, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union, get_args, get_origin, get_type_hints
 import json
 import logging as log
-from dataclasses import field, fields
+from dataclasses import MISSING, field, fields, is_dataclass
 import os
 
 from src.Commons.FileManagement import FileManagement
 
+# Values json handles as they are; decoding still coerces them to the field type (e.g. 5 -> 5.0)
+_PRIMITIVES = (str, int, float, bool)
+_SCALARS = frozenset(_PRIMITIVES + (type(None),))
+_COMPACT_SEPARATORS = (",", ":")
+
+
+class _Codec(object):
+    """
+    Encoder and decoder of one Serializable dataclass, generated from its fields the first
+    time the class is (de)serialized. Each is a single function with one statement per field,
+    so (de)serializing costs no reflection: no fields() walk, no type checks and no
+    __dict__ copy per object.
+    """
+
+    def __init__(self, cls: type):
+        hints = _type_hints(cls)
+        namespace: Dict[str, Any] = {"_cls": cls, "_MISSING": MISSING}
+        encode_items: List[str] = []
+        decode_lines: List[str] = []
+        for index, f in enumerate(fields(cls)):
+            field_type = hints.get(f.name, f.type)
+            if f.name[0] != "_":
+                encoder = _encoder_for(field_type)
+                if encoder is None:
+                    encode_items.append(f"{f.name!r}: obj.{f.name}")
+                else:
+                    namespace[f"_e{index}"] = encoder
+                    encode_items.append(f"{f.name!r}: _e{index}(obj.{f.name})")
+
+            namespace[f"_d{index}"] = _decoder_for(field_type)
+            decode_lines.append(f"    value = data.get({f.name!r})")
+            decode_lines.append(f"    if value is not None:")
+            decode_lines.append(f"        kwargs[{f.name!r}] = _d{index}(value)")
+            missing = _missing_value(f, field_type)
+            if missing is not MISSING:
+                # Fields without a default get an empty value of their type, as they always have
+                namespace[f"_m{index}"] = missing
+                decode_lines.append(f"    else:")
+                decode_lines.append(f"        kwargs[{f.name!r}] = _m{index}()")
+
+        source = (f"def encode(obj):\n    return {{{', '.join(encode_items)}}}\n"
+                  f"def decode(data):\n    kwargs = {{}}\n" + "\n".join(decode_lines) + "\n    return _cls(**kwargs)\n")
+        exec(compile(source, f"<{cls.__name__} codec>", "exec"), namespace)
+        self.encode: Callable[[Any], dict] = namespace["encode"]
+        self.decode: Callable[[dict], Any] = namespace["decode"]
+
+
+_CODECS: Dict[type, _Codec] = {}
+
+
+def _codec(cls: type) -> _Codec:
+    codec = _CODECS.get(cls)
+    if codec is None:
+        codec = _CODECS[cls] = _Codec(cls)
+    return codec
+
+
+def _type_hints(cls: type) -> Dict[str, Any]:
+    """Field types with string annotations resolved; the raw annotations if they can't be"""
+    try:
+        return get_type_hints(cls)
+    except Exception:
+        return {}
+
+
+def _optional_inner(field_type: Any) -> Optional[Any]:
+    """X for Optional[X] (and X | None), otherwise None"""
+    if get_origin(field_type) is Union or type(field_type).__name__ == "UnionType":
+        args = [arg for arg in get_args(field_type) if arg is not type(None)]
+        if len(args) == 1 and len(get_args(field_type)) == 2:
+            return args[0]
+    return None
+
+
+def _is_serializable(field_type: Any) -> bool:
+    return isinstance(field_type, type) and issubclass(field_type, Serializable) and is_dataclass(field_type)
+
+
+def _encoder_for(field_type: Any) -> Optional[Callable[[Any], Any]]:
+    """Converts a field value to JSON types; None when the value already is one"""
+    if field_type in _PRIMITIVES:
+        return None
+    inner = _optional_inner(field_type)
+    if inner is not None:
+        encoder = _encoder_for(inner)
+        return None if encoder is None else (lambda value: None if value is None else encoder(value))
+    if _is_serializable(field_type):
+        return lambda value: _codec(type(value)).encode(value)
+    origin, args = get_origin(field_type), get_args(field_type)
+    if _homogeneous(origin, args):
+        item = _encoder_for(args[0])
+        return list if item is None else (lambda value: [item(entry) for entry in value])
+    if origin is dict and len(args) == 2:
+        item = _encoder_for(args[1])
+        return dict if item is None else (lambda value: {key: item(entry) for key, entry in value.items()})
+    return _encode_any
+
+
+def _encode_any(value: Any) -> Any:
+    """Untyped (Any, bare list...) values: nested objects are found at run time"""
+    if type(value) in _SCALARS:
+        return value
+    if isinstance(value, Serializable) and is_dataclass(value):
+        return _codec(type(value)).encode(value)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [entry if type(entry) in _SCALARS else _encode_any(entry) for entry in value]
+    if isinstance(value, dict):
+        return {key: _encode_any(entry) for key, entry in value.items()}
+    if isinstance(value, Serializable):
+        return value.exclude_private()
+    return value
+
+
+def _homogeneous(origin: Any, args: Tuple[Any, ...]) -> bool:
+    """List[X], Set[X], FrozenSet[X] and Tuple[X, ...]"""
+    if origin in (list, set, frozenset):
+        return len(args) == 1
+    return origin is tuple and len(args) == 2 and args[1] is Ellipsis
+
+
+def _decoder_for(field_type: Any) -> Callable[[Any], Any]:
+    """Builds a field value from its JSON value (never called with None)"""
+    if field_type in _PRIMITIVES:
+        return field_type
+    inner = _optional_inner(field_type)
+    if inner is not None:
+        return _decoder_for(inner)
+    if _is_serializable(field_type):
+        # Resolved on first use, so classes can nest themselves
+        return lambda value: _codec(field_type).decode(value)
+    origin, args = get_origin(field_type), get_args(field_type)
+    if _homogeneous(origin, args):
+        item = _decoder_for(args[0])
+        return lambda value: origin(item(entry) for entry in value)
+    if origin is dict and len(args) == 2:
+        item = _decoder_for(args[1])
+        return lambda value: {key: item(entry) for key, entry in value.items()}
+    if origin is not None:
+        return origin
+    if not isinstance(field_type, type):
+        # Any, type variables...
+        return lambda value: value
+    return field_type
+
+
+def _missing_value(f, field_type: Any) -> Any:
+    """Factory for a field absent from the JSON; MISSING lets the dataclass default apply"""
+    if f.default is not MISSING or f.default_factory is not MISSING:
+        return MISSING
+    if _optional_inner(field_type) is not None:
+        return lambda: None
+    origin = get_origin(field_type)
+    if origin is not None:
+        return origin
+    return field_type if isinstance(field_type, type) else (lambda: None)
+
 class Serializable(FileManagement):
     """
     Abstract class for classes that have to be serializable. Includes methods for working with
@@ -30,7 +186,8 @@ class Serializable(FileManagement):
     @classmethod    # FIXME: should be private but have to fix class parity in InspectionLibEfi first
     def from_dict(cls, self: Any) -> Optional[object]:
         """
-        Helper class for deserializing JSONs
+        Helper class for deserializing JSONs. Nested Serializable dataclasses, lists, dicts
+        and Optional fields are rebuilt by the class' cached decoder
 
         Args:
             self (Any): Any type object, used to help deserialization
@@ -38,19 +195,16 @@ class Serializable(FileManagement):
         Returns:
             object: Object of current class with info from json string
         """
-        
-        field_types = {f.name: f.type for f in fields(cls)}
-        kwargs = {}
-        for field_name, field_type in field_types.items():
-            value = self.get(field_name)
-            if value is not None:
-                if type(value) is dict:
-                    kwargs[field_name] = field_type.from_dict(value)
-                else:
-                    kwargs[field_name] = field_type(value)
-            else:
-                kwargs[field_name] = field_type()
-        return cls(**kwargs)
+        return _codec(cls).decode(self)
+
+    def to_dict(self) -> dict:
+        """
+        Public fields as JSON types, through the class' cached encoder
+
+        Returns:
+            dict: Object as a dictionary, ready for json.dumps
+        """
+        return _codec(type(self)).encode(self)
         
     @classmethod
     def deserialize(cls, json_string: str) -> object:
@@ -67,14 +221,19 @@ class Serializable(FileManagement):
         _obj: type(cls) = cls.from_dict(json.loads(json_string)) # type: ignore
         return _obj
 
-    def serialize(self) -> str:
+    def serialize(self, compact: bool = False) -> str:
         """
         Serializes object in a JSON format (excluding private parameters)
 
+        Args:
+            compact (bool, optional): One line without spaces (much faster) instead of indented
+
         Returns:
             str: Serialized object
         """
-        return json.dumps(self, default=lambda o: o.exclude_private(), sort_keys=False, indent=4)
+        if compact:
+            return json.dumps(self.to_dict(), separators=_COMPACT_SEPARATORS)
+        return json.dumps(self.to_dict(), sort_keys=False, indent=4)
 
     @classmethod
     def from_file(cls, json_file_path: str):
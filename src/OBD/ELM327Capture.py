@@ -0,0 +1,189 @@
+import asyncio
+import json
+import logging as log
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+from src.OBD.ELM327Transport import DataCallback, ELM327Transport, LostCallback
+
+if TYPE_CHECKING:
+    from src.OBD.ELM327Connection import ELM327Connection
+
+CAPTURE_FORMAT = "elm327-capture"
+CAPTURE_VERSION = 1
+
+# Answer of an ELM327 to a command it doesn't know
+UNKNOWN_COMMAND_RESPONSE = b"?\r\r>"
+
+
+class ELM327Capture(object):
+    """
+    Records the raw traffic of an ELM327 link as JSON lines: a header with the wall
+    clock start time, then one {"t", "dir", "data"} line per write ("tx") or read
+    ("rx"), `t` being seconds since the start and `data` the bytes as latin-1 text.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.started = time.time()
+        self._start = time.monotonic()
+        # Line buffered, so a crash keeps everything up to the last event
+        self._file = open(path, "w", encoding="latin-1", buffering=1)
+        self._file.write(json.dumps({"format": CAPTURE_FORMAT, "version": CAPTURE_VERSION, "started": self.started}) + "\n")
+
+    def _log(self, direction: str, data: bytes) -> None:
+        if self._file is None:
+            return
+        entry = {"t": round(time.monotonic() - self._start, 6), "dir": direction, "data": data.decode("latin-1")}
+        self._file.write(json.dumps(entry) + "\n")
+
+    def tx(self, data: bytes) -> None:
+        self._log("tx", data)
+
+    def rx(self, data: bytes) -> None:
+        self._log("rx", data)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+@dataclass
+class ELM327Exchange:
+    """One command and the chunks of its response, timed relative to the command"""
+    command: str
+    sent_at: float
+    chunks: List[Tuple[float, bytes]] = field(default_factory=list)
+
+    @property
+    def latency(self) -> float:
+        return self.chunks[-1][0] if self.chunks else 0.0
+
+
+def load_capture(path: str) -> Tuple[float, List[ELM327Exchange]]:
+    """
+    Reads a capture and pairs every response frame (up to the '>' prompt) with its
+    command, in FIFO order like the adapter answers them
+
+    Returns:
+        Tuple[float, List[ELM327Exchange]]: Wall clock start time and the exchanges in send order
+    """
+    exchanges: List[ELM327Exchange] = []
+    waiting: Deque[ELM327Exchange] = deque()
+    started = 0.0
+    with open(path, encoding="latin-1") as file:
+        for number, line in enumerate(file):
+            entry = json.loads(line)
+            if number == 0:
+                if entry.get("format") != CAPTURE_FORMAT:
+                    raise ValueError(f"'{path}' is not an ELM327 capture")
+                started = entry["started"]
+                continue
+            data = entry["data"].encode("latin-1")
+            if entry["dir"] == "tx":
+                exchange = ELM327Exchange(data.decode("ascii", errors="ignore").strip(), entry["t"])
+                exchanges.append(exchange)
+                waiting.append(exchange)
+                continue
+            # A chunk may close one response and start the next one
+            while data and waiting:
+                exchange = waiting[0]
+                index = data.find(b">")
+                chunk = data if index < 0 else data[:index + 1]
+                exchange.chunks.append((entry["t"] - exchange.sent_at, chunk))
+                data = data[len(chunk):]
+                if index >= 0:
+                    waiting.popleft()
+    return started, exchanges
+
+
+class ELM327Replay(ELM327Transport):
+    """
+    Transport answering an ELM327Connection from a capture instead of an adapter.
+    Each command gets the next captured response to the same command (cycling when
+    they run out), delivered in the captured chunks after the captured latency
+    divided by `speed` (0: as fast as possible).
+
+    `clock` follows the capture's wall clock time of the exchange being replayed, so
+    time-based logic (distance integration) computes the same values at any speed.
+    """
+
+    def __init__(self, exchanges: List[ELM327Exchange], started: float = 0.0, speed: float = 1.0):
+        if speed < 0:
+            raise ValueError("speed must be 0 (as fast as possible) or greater")
+        self.speed = speed
+        self.started = started
+        self.replayed = 0
+        self.unknown = 0
+        self._exchanges: Dict[str, List[ELM327Exchange]] = {}
+        self._next: Dict[str, int] = {}
+        self._cycles: Dict[str, int] = {}
+        for exchange in exchanges:
+            self._exchanges.setdefault(exchange.command, []).append(exchange)
+        # Every pass over the capture moves the clock on by its length
+        self.duration = max((exchange.sent_at + exchange.latency for exchange in exchanges), default=0.0)
+        self._time = started
+        self._on_data: Optional[Callable[[bytes], None]] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @classmethod
+    def from_file(cls, path: str, speed: float = 1.0) -> "ELM327Replay":
+        started, exchanges = load_capture(path)
+        log.info(f"Loaded {len(exchanges)} ELM327 exchanges from '{path}'")
+        return cls(exchanges, started, speed)
+
+    async def open(self, on_data: DataCallback, on_lost: LostCallback) -> None:
+        self._on_data = on_data
+        self._loop = asyncio.get_running_loop()
+
+    def attach(self, elm: "ELM327Connection") -> None:
+        """Feeds responses to `elm`; call from the event loop it runs on"""
+        self._on_data = elm.data_received
+        self._loop = asyncio.get_running_loop()
+
+    async def close(self) -> None:
+        self._on_data = None
+
+    def clock(self) -> float:
+        """Capture wall clock time of the latest replayed command"""
+        return self._time
+
+    def _next_exchange(self, command: str) -> Optional[ELM327Exchange]:
+        candidates = self._exchanges.get(command)
+        if not candidates:
+            return None
+        index = self._next.get(command, 0)
+        if index + 1 < len(candidates):
+            self._next[command] = index + 1
+        else:
+            self._next[command] = 0
+            self._cycles[command] = self._cycles.get(command, 0) + 1
+        return candidates[index]
+
+    def write(self, data: bytes) -> None:
+        """ELM327Connection write callback"""
+        if self._on_data is None:
+            raise OSError("Replay transport is not attached")
+        command = data.decode("ascii", errors="ignore").strip()
+        cycle = self._cycles.get(command, 0)
+        exchange = self._next_exchange(command)
+        if exchange is None:
+            self.unknown += 1
+            log.debug("No captured response to '%s'", command)
+            self._loop.call_soon(self._deliver, UNKNOWN_COMMAND_RESPONSE)
+            return
+
+        self.replayed += 1
+        self._time = max(self._time, self.started + cycle * self.duration + exchange.sent_at)
+        for delay, chunk in exchange.chunks:
+            if self.speed:
+                self._loop.call_later(delay / self.speed, self._deliver, chunk)
+            else:
+                self._loop.call_soon(self._deliver, chunk)
+
+    def _deliver(self, chunk: bytes) -> None:
+        if self._on_data is not None:
+            self._on_data(chunk)
@@ -0,0 +1,196 @@
+import asyncio
+import logging as log
+import time
+from collections import deque
+from typing import Callable, Deque, List, Optional, TYPE_CHECKING
+
+from src.Commons.Metrics import REGISTRY
+
+if TYPE_CHECKING:
+    from src.OBD.ELM327Capture import ELM327Capture
+
+
+COMMAND_SECONDS = REGISTRY.histogram("obd_command_seconds", "ELM327 command round trip time (write to prompt)", ("command",))
+COMMAND_TIMEOUTS = REGISTRY.counter("obd_command_timeouts", "ELM327 commands that got no response in time", ("command",))
+CONNECTIONS_LOST = REGISTRY.counter("obd_connections_lost", "Adapter links that dropped while in use")
+
+
+class ELM327Error(Exception):
+    """Raised when the link to the adapter is lost while a command is pending"""
+    pass
+
+
+class _PendingCommand(object):
+    __slots__ = ("command", "future", "sent_at")
+
+    def __init__(self, command: str, future: Optional[asyncio.Future]):
+        self.command = command
+        self.future = future
+        self.sent_at = time.monotonic()
+
+    @property
+    def abandoned(self) -> bool:
+        """The caller stopped waiting; the frame still has to be consumed when it arrives"""
+        return self.future is None
+
+
+class ELM327Connection(object):
+    """
+    Event-driven ELM327 command/response framing. Bytes from the link are pushed in
+    through `data_received`; every time the adapter prints its '>' prompt the oldest
+    pending command is resolved with the text that came before it. There are no
+    sleeps and no polling reads: latency is bounded by the adapter only.
+
+    With `pipeline_depth` > 1 up to that many commands are written back to back
+    without waiting for the previous prompt; responses are matched in FIFO order.
+    Only enable it for adapters that queue commands (a stock ELM327 aborts the
+    running command when a new byte arrives).
+    """
+
+    PROMPT = b">"
+    NOISE_LINES = ("SEARCHING...", "BUS INIT: ...", "BUS INIT: OK")
+
+    def __init__(self, write: Callable[[bytes], None], default_timeout: float = 2.0, pipeline_depth: int = 1,
+                 capture: Optional["ELM327Capture"] = None):
+        """
+        Args:
+            write (Callable[[bytes], None]): Non-blocking function writing bytes to the link
+            default_timeout (float): Per-command deadline in seconds
+            pipeline_depth (int): Max commands in flight
+            capture (ELM327Capture, optional): Records every byte written and read
+        """
+        self._write = write
+        self.capture = capture
+        self.default_timeout = default_timeout
+        self._buffer = bytearray()
+        self._pending: Deque[_PendingCommand] = deque()
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.pipeline_depth = 1
+        self.set_pipeline_depth(pipeline_depth)
+        self.closed = False
+
+    def set_pipeline_depth(self, depth: int) -> None:
+        """Changes the number of commands allowed in flight. Call while idle"""
+        if depth < 1:
+            raise ValueError("pipeline depth must be at least 1")
+        self.pipeline_depth = depth
+        self._slots = None
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    @classmethod
+    def parse_frame(cls, frame: bytes) -> str:
+        """
+        Cleans up a raw response frame (without prompt)
+
+        Returns:
+            str: Response lines joined by '\\n', without adapter noise
+        """
+        text = frame.decode("ascii", errors="ignore")
+        lines: List[str] = []
+        for line in text.replace("\r", "\n").split("\n"):
+            line = line.strip()
+            if line and line not in cls.NOISE_LINES:
+                lines.append(line)
+        return "\n".join(lines)
+
+    def data_received(self, data: bytes) -> None:
+        """Feeds bytes read from the link; resolves one pending command per prompt"""
+        if self.capture is not None:
+            self.capture.rx(data)
+        self._buffer += data
+        while True:
+            index = self._buffer.find(self.PROMPT)
+            if index < 0:
+                return
+            frame = bytes(self._buffer[:index])
+            del self._buffer[:index + 1]
+            self._resolve(frame)
+
+    def _resolve(self, frame: bytes) -> None:
+        if not self._pending:
+            log.debug("Discarding unsolicited ELM327 frame: %r", frame)
+            return
+        pending = self._pending.popleft()
+        if pending.abandoned:
+            log.debug("Discarding late response to '%s'", pending.command)
+            return
+        if not pending.future.done():
+            COMMAND_SECONDS.labels(pending.command).observe(time.monotonic() - pending.sent_at)
+            pending.future.set_result(self.parse_frame(frame))
+
+    def connection_lost(self, exc: Optional[Exception] = None) -> None:
+        """Fails every pending command"""
+        self.closed = True
+        error = ELM327Error(f"Connection lost{f' ({exc})' if exc else ''}")
+        while self._pending:
+            pending = self._pending.popleft()
+            if not pending.abandoned and not pending.future.done():
+                pending.future.set_exception(error)
+        self._buffer.clear()
+
+    def _drop_stale(self, max_age: float) -> None:
+        """Forget abandoned commands the adapter never answered, so they can't steal a later frame"""
+        now = time.monotonic()
+        while self._pending and self._pending[0].abandoned and now - self._pending[0].sent_at > max_age:
+            self._pending.popleft()
+        if not self._pending:
+            self._buffer.clear()
+
+    async def send_command(self, command: str, timeout: Optional[float] = None) -> str:
+        """
+        Sends a command and waits for its response
+
+        Args:
+            command (str): ELM327/OBD command without terminator
+            timeout (float, optional): Deadline in seconds. Defaults to `default_timeout`
+
+        Raises:
+            asyncio.TimeoutError: If the prompt did not arrive in time
+            ELM327Error: If the link was lost
+
+        Returns:
+            str: Response text
+        """
+        if self.closed:
+            raise ELM327Error("Connection closed")
+        timeout = self.default_timeout if timeout is None else timeout
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.pipeline_depth)
+
+        async with self._slots:
+            self._drop_stale(timeout)
+            pending = _PendingCommand(command, asyncio.get_running_loop().create_future())
+            self._pending.append(pending)
+            data = (command + "\r").encode()
+            if self.capture is not None:
+                self.capture.tx(data)
+            self._write(data)
+            try:
+                return await asyncio.wait_for(asyncio.shield(pending.future), timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    COMMAND_TIMEOUTS.labels(command).inc()
+                # Keep the slot so a late frame is consumed instead of answering the next command
+                pending.future.cancel()
+                pending.future = None
+                pending.sent_at = time.monotonic()
+                raise
+
+    async def send_commands(self, commands: List[str], timeout: Optional[float] = None) -> List[Optional[str]]:
+        """
+        Sends several commands, pipelined up to `pipeline_depth`
+
+        Returns:
+            List[Optional[str]]: Response per command, None for the ones that timed out
+        """
+        results = await asyncio.gather(
+            *(self.send_command(command, timeout) for command in commands),
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, ELM327Error):
+                raise result
+        return [None if isinstance(result, BaseException) else result for result in results]
@@ -0,0 +1,322 @@
+import argparse
+import asyncio
+import logging as log
+import math
+import os
+import random
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+# Raw data bytes of every emulated service 01 PID
+def _u8(value: float) -> List[int]:
+    return [max(0, min(255, int(round(value))))]
+
+
+def _u16(value: float) -> List[int]:
+    value = max(0, min(0xFFFF, int(round(value))))
+    return [value >> 8, value & 0xFF]
+
+
+@dataclass
+class EmulatedVehicleState:
+    speed: float
+    rpm: float
+    runtime: float
+    load: float
+    throttle: float
+    coolant: float
+    intake: float
+    maf: float
+    fuel_level: float
+    voltage: float
+
+
+class EmulatedVehicle(object):
+    """Deterministic drive cycle: speed oscillates between 5 and 115 km/h, engine values follow it"""
+
+    ENCODERS: Dict[str, Callable[[EmulatedVehicleState], List[int]]] = {
+        "04": lambda s: _u8(s.load * 255 / 100),
+        "05": lambda s: _u8(s.coolant + 40),
+        "0B": lambda s: _u8(30 + s.load * 0.7),
+        "0C": lambda s: _u16(s.rpm * 4),
+        "0D": lambda s: _u8(s.speed),
+        "0F": lambda s: _u8(s.intake + 40),
+        "10": lambda s: _u16(s.maf * 100),
+        "11": lambda s: _u8(s.throttle * 255 / 100),
+        "1F": lambda s: _u16(s.runtime),
+        "2F": lambda s: _u8(s.fuel_level * 255 / 100),
+        "33": lambda s: _u8(101),
+        "42": lambda s: _u16(s.voltage * 1000),
+        "46": lambda s: _u8(21 + 40),
+        "5C": lambda s: _u8(s.coolant + 45),
+    }
+
+    def __init__(self, started: Optional[float] = None):
+        self.started = started if started is not None else time.monotonic()
+
+    def state(self, now: Optional[float] = None) -> EmulatedVehicleState:
+        t = (now if now is not None else time.monotonic()) - self.started
+        speed = 60 + 55 * math.sin(t / 40)
+        rpm = 800 + speed * 22 + 50 * math.sin(t)
+        load = 20 + 0.5 * speed
+        return EmulatedVehicleState(
+            speed=speed,
+            rpm=rpm,
+            runtime=t,
+            load=load,
+            throttle=10 + 0.6 * speed,
+            coolant=min(90, 20 + t / 6),
+            intake=25 + 0.05 * speed,
+            maf=rpm * load / 2000,
+            fuel_level=max(5, 80 - t / 360),
+            voltage=14.1
+        )
+
+    @classmethod
+    def supported_pids(cls) -> List[str]:
+        return sorted(cls.ENCODERS)
+
+
+def supported_bitmask(base_pid: int, pids: List[str]) -> List[int]:
+    """Data bytes of the "PIDs supported" PID `base_pid` (00, 20...)"""
+    numbers = [int(pid, 16) for pid in pids]
+    mask = 0
+    for number in numbers:
+        if base_pid < number <= base_pid + 32:
+            mask |= 1 << (32 - (number - base_pid))
+    if any(number > base_pid + 32 for number in numbers):
+        mask |= 1   # next range is supported
+    return [(mask >> shift) & 0xFF for shift in (24, 16, 8, 0)]
+
+
+class ELM327Emulator(object):
+    """
+    Stand-in for an ELM327 on a CAN car: answers AT commands, every service 01 PID of
+    EmulatedVehicle (single and multi-PID, ISO-TP framed when longer than one frame)
+    and the VIN, after `latency` +- `jitter` seconds per command. Commands are queued
+    and answered in order, like STN adapters do, so clients can pipeline.
+    """
+
+    IDENTITY = "ELM327 v1.5"
+
+    def __init__(self, latency: float = 0.03, jitter: float = 0.0, stn: bool = False, atall: bool = False,
+                 vin: str = "1FDEMULATOR000001", seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.stn = stn
+        self.atall = atall
+        self.vin = vin
+        self.vehicle = EmulatedVehicle()
+        self.commands = 0
+        self._random = random.Random(seed)
+
+    def delay(self) -> float:
+        return max(0.0, self.latency + (self._random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0))
+
+    def respond(self, command: str, spaces: bool = True) -> List[str]:
+        """Response lines to one command (without echo, line ends and prompt)"""
+        self.commands += 1
+        command = command.replace(" ", "").upper()
+        if command.startswith("AT"):
+            return self._at_command(command[2:])
+        if command.startswith("ST"):
+            return ["STN1110 v4.2.0"] if self.stn and command == "STI" else ["?"]
+        if len(command) < 4 or len(command) % 2 or any(c not in "0123456789ABCDEF" for c in command):
+            return ["?"]
+
+        payload = self._service(command[:2], [command[i:i + 2] for i in range(2, len(command), 2)])
+        if payload is None:
+            return ["NO DATA"]
+        return self._frames(payload, spaces)
+
+    def _at_command(self, command: str) -> List[str]:
+        if command in ("Z", "WS"):
+            return ["", self.IDENTITY]
+        if command == "I":
+            return [self.IDENTITY]
+        if command == "RV":
+            return [f"{self.vehicle.state().voltage:.1f}V"]
+        if command == "DP":
+            return ["AUTO, ISO 15765-4 (CAN 11/500)"]
+        if command == "ALL" and self.atall:
+            state = self.vehicle.state()
+            return [f"RPM:{int(state.rpm)},SPEED:{int(state.speed)},RUNTIME:{int(state.runtime)}"]
+        if command == "ALL":
+            return ["?"]
+        return ["OK"]
+
+    def _service(self, mode: str, pids: List[str]) -> Optional[List[int]]:
+        if mode == "01" and 1 <= len(pids) <= 6:
+            state = self.vehicle.state()
+            payload = [0x41]
+            for pid in pids:
+                number = int(pid, 16)
+                if number % 0x20 == 0:
+                    data = supported_bitmask(number, EmulatedVehicle.supported_pids())
+                    if number and not any(data):
+                        continue
+                elif pid in EmulatedVehicle.ENCODERS:
+                    data = EmulatedVehicle.ENCODERS[pid](state)
+                else:
+                    continue
+                payload += [number] + data
+            return payload if len(payload) > 1 else None
+        if mode == "09" and pids == ["02"]:
+            return [0x49, 0x02, 0x01] + list(self.vin.encode("ascii"))
+        return None
+
+    @staticmethod
+    def _frames(payload: List[int], spaces: bool) -> List[str]:
+        separator = " " if spaces else ""
+
+        def hex_bytes(data: List[int]) -> str:
+            return separator.join(f"{byte:02X}" for byte in data)
+
+        if len(payload) <= 7:
+            return [hex_bytes(payload)]
+        # ISO-TP: length, then a 6 byte first frame and 7 byte consecutive frames
+        lines = [f"{len(payload):03X}", f"0: {hex_bytes(payload[:6])}"]
+        for index, start in enumerate(range(6, len(payload), 7), start=1):
+            chunk = payload[start:start + 7]
+            lines.append(f"{index % 16:X}: {hex_bytes(chunk + [0] * (7 - len(chunk)))}")
+        return lines
+
+
+class ELM327EmulatorSession(object):
+    """Settings and command queue of one client connection"""
+
+    def __init__(self, emulator: ELM327Emulator, write: Callable[[bytes], None]):
+        self.emulator = emulator
+        self.write = write
+        self.echo = True
+        self.linefeeds = False
+        self.spaces = True
+        self._buffer = bytearray()
+        self._busy_until = 0.0
+        self._handles: List[asyncio.TimerHandle] = []
+
+    def data_received(self, data: bytes) -> None:
+        self._buffer += data
+        while True:
+            index = self._buffer.find(b"\r")
+            if index < 0:
+                return
+            command = self._buffer[:index].decode("ascii", errors="ignore").strip()
+            del self._buffer[:index + 1]
+            self._schedule(command)
+
+    def _schedule(self, command: str) -> None:
+        loop = asyncio.get_running_loop()
+        # Commands are answered one after the other
+        start = max(loop.time(), self._busy_until)
+        self._busy_until = start + self.emulator.delay()
+        self._handles = [handle for handle in self._handles if not handle.cancelled()]
+        self._handles.append(loop.call_at(self._busy_until, self._answer, command))
+
+    def _answer(self, command: str) -> None:
+        lines = self.emulator.respond(command, self.spaces) if command else [""]
+        self._apply_settings(command.replace(" ", "").upper())
+        end = "\r\n" if self.linefeeds else "\r"
+        text = (command + end if self.echo else "") + end.join(lines) + end + end + ">"
+        try:
+            self.write(text.encode("ascii"))
+        except OSError:
+            self.close()
+
+    def _apply_settings(self, command: str) -> None:
+        settings = {
+            "ATE0": ("echo", False), "ATE1": ("echo", True),
+            "ATL0": ("linefeeds", False), "ATL1": ("linefeeds", True),
+            "ATS0": ("spaces", False), "ATS1": ("spaces", True)
+        }
+        if command in ("ATZ", "ATWS", "ATD"):
+            self.echo, self.linefeeds, self.spaces = True, False, True
+        elif command in settings:
+            name, value = settings[command]
+            setattr(self, name, value)
+
+    def close(self) -> None:
+        for handle in self._handles:
+            handle.cancel()
+        self._handles.clear()
+
+
+class _EmulatorProtocol(asyncio.Protocol):
+    def __init__(self, emulator: ELM327Emulator):
+        self.emulator = emulator
+        self.session: Optional[ELM327EmulatorSession] = None
+
+    def connection_made(self, transport: asyncio.Transport) -> None:
+        self.session = ELM327EmulatorSession(self.emulator, transport.write)
+
+    def data_received(self, data: bytes) -> None:
+        self.session.data_received(data)
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        self.session.close()
+
+
+async def serve_tcp(emulator: ELM327Emulator, host: str = "127.0.0.1", port: int = 35000) -> asyncio.AbstractServer:
+    """Serves the emulator like a Wi-Fi adapter; port 0 picks a free port"""
+    return await asyncio.get_running_loop().create_server(lambda: _EmulatorProtocol(emulator), host, port)
+
+
+def serve_pty(emulator: ELM327Emulator) -> str:
+    """
+    Serves the emulator on a new pseudo terminal, like a USB adapter
+
+    Returns:
+        str: Path of the terminal to open (e.g. /dev/pts/3)
+    """
+    import tty
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    os.set_blocking(master, False)
+    loop = asyncio.get_running_loop()
+
+    def write(data: bytes) -> None:
+        os.write(master, data)
+
+    session = ELM327EmulatorSession(emulator, write)
+
+    def on_readable() -> None:
+        try:
+            data = os.read(master, 4096)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            # Raised while no client has the terminal open
+            return
+        session.data_received(data)
+
+    loop.add_reader(master, on_readable)
+    # Keep our own handle on the slave side so the pty survives clients closing it
+    return os.ttyname(slave)
+
+
+async def main(args: argparse.Namespace) -> None:
+    emulator = ELM327Emulator(args.latency, args.jitter, stn=args.stn, atall=args.atall)
+    if args.pty:
+        print(f"ELM327 emulator on {serve_pty(emulator)}", flush=True)
+    if args.tcp or not args.pty:
+        host, _, port = (args.tcp or "127.0.0.1:35000").rpartition(":")
+        server = await serve_tcp(emulator, host or "127.0.0.1", int(port))
+        for sock in server.sockets:
+            print(f"ELM327 emulator on tcp://{sock.getsockname()[0]}:{sock.getsockname()[1]}", flush=True)
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    log.basicConfig(level=log.INFO)
+    parser = argparse.ArgumentParser(description="ELM327 emulator for local and load testing")
+    parser.add_argument("--tcp", metavar="HOST:PORT", help="Serve over TCP (default 127.0.0.1:35000 when --pty isn't given)")
+    parser.add_argument("--pty", action="store_true", help="Serve on a pseudo terminal")
+    parser.add_argument("--latency", type=float, default=0.03, help="Seconds per command")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Uniform +- jitter added to the latency")
+    parser.add_argument("--stn", action="store_true", help="Identify as an STN adapter (enables pipelining in the client)")
+    parser.add_argument("--atall", action="store_true", help="Answer the ESP32 simulator's custom ATALL command")
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,263 @@
+import asyncio
+import os
+import re
+import socket
+from abc import ABC, abstractmethod
+from typing import Callable, Optional
+from urllib.parse import parse_qs, urlparse
+
+DataCallback = Callable[[bytes], None]
+LostCallback = Callable[[Optional[Exception]], None]
+
+_BLUETOOTH_ADDRESS = re.compile(r"^([0-9A-Fa-f]{2}:){5}[0-9A-Fa-f]{2}$")
+
+# Baud rates termios knows about
+_BAUD_RATES = {
+    9600: "B9600", 19200: "B19200", 38400: "B38400", 57600: "B57600",
+    115200: "B115200", 230400: "B230400", 460800: "B460800"
+}
+
+
+class ELM327Transport(ABC):
+    """
+    Byte link to an ELM327 adapter. Incoming bytes are pushed to `on_data` from the
+    event loop as soon as they arrive, and `write` never blocks, so an ELM327Connection
+    can sit directly on top of any transport.
+    """
+
+    @abstractmethod
+    async def open(self, on_data: DataCallback, on_lost: LostCallback) -> None:
+        """Opens the link; raises OSError if it can't"""
+        pass
+
+    @abstractmethod
+    def write(self, data: bytes) -> None:
+        pass
+
+    @abstractmethod
+    async def close(self) -> None:
+        pass
+
+
+class _CallbackProtocol(asyncio.Protocol):
+    def __init__(self, on_data: DataCallback, on_lost: LostCallback):
+        self.on_data = on_data
+        self.on_lost = on_lost
+        self.closing = False
+
+    def data_received(self, data: bytes) -> None:
+        self.on_data(data)
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        if not self.closing:
+            self.on_lost(exc)
+
+
+class _SocketTransport(ELM327Transport):
+    """asyncio stream transport over a connected socket"""
+
+    def __init__(self):
+        self._transport: Optional[asyncio.Transport] = None
+        self._protocol: Optional[_CallbackProtocol] = None
+
+    async def _start(self, on_data: DataCallback, on_lost: LostCallback, **kwargs) -> None:
+        self._transport, self._protocol = await asyncio.get_running_loop().create_connection(
+            lambda: _CallbackProtocol(on_data, on_lost), **kwargs)
+
+    def write(self, data: bytes) -> None:
+        if self._transport is None or self._transport.is_closing():
+            raise OSError("Transport is closed")
+        self._transport.write(data)
+
+    async def close(self) -> None:
+        if self._transport is not None:
+            self._protocol.closing = True
+            self._transport.close()
+            self._transport = None
+
+
+class TCPTransport(_SocketTransport):
+    """Wi-Fi adapters (usually 192.168.0.10:35000)"""
+
+    def __init__(self, host: str, port: int = 35000, connect_timeout: float = 10.0):
+        super().__init__()
+        self.host = host
+        self.port = port
+        self.connect_timeout = connect_timeout
+
+    async def open(self, on_data: DataCallback, on_lost: LostCallback) -> None:
+        await asyncio.wait_for(self._start(on_data, on_lost, host=self.host, port=self.port), self.connect_timeout)
+
+    def __str__(self) -> str:
+        return f"tcp://{self.host}:{self.port}"
+
+
+class RFCOMMTransport(_SocketTransport):
+    """Bluetooth Classic serial port profile, on the kernel's RFCOMM sockets"""
+
+    def __init__(self, address: str, channel: int = 1, connect_timeout: float = 10.0):
+        super().__init__()
+        self.address = address
+        self.channel = channel
+        self.connect_timeout = connect_timeout
+
+    async def open(self, on_data: DataCallback, on_lost: LostCallback) -> None:
+        sock = await asyncio.wait_for(self._connect(), self.connect_timeout)
+        await self._start(on_data, on_lost, sock=sock)
+
+    async def _connect(self) -> socket.socket:
+        if hasattr(socket, "AF_BLUETOOTH"):
+            sock = socket.socket(socket.AF_BLUETOOTH, socket.SOCK_STREAM, socket.BTPROTO_RFCOMM)
+            sock.setblocking(False)
+            try:
+                await asyncio.get_running_loop().sock_connect(sock, (self.address, self.channel))
+            except Exception:
+                sock.close()
+                raise
+            return sock
+
+        # Python built without Bluetooth support: connect with PyBluez, then hand its descriptor to asyncio
+        try:
+            import bluetooth
+        except ImportError:
+            raise OSError("RFCOMM needs Python built with Bluetooth support or PyBluez")
+        bt_sock = bluetooth.BluetoothSocket(bluetooth.RFCOMM)
+        try:
+            await asyncio.to_thread(bt_sock.connect, (self.address, self.channel))
+            sock = socket.socket(fileno=os.dup(bt_sock.fileno()))
+        finally:
+            bt_sock.close()
+        sock.setblocking(False)
+        return sock
+
+    def __str__(self) -> str:
+        return f"rfcomm://{self.address}/{self.channel}"
+
+
+class SerialTransport(ELM327Transport):
+    """USB serial adapters and pseudo terminals, read by the event loop without threads"""
+
+    def __init__(self, path: str, baudrate: Optional[int] = 38400):
+        self.path = path
+        self.baudrate = baudrate
+        self._fd: Optional[int] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending = bytearray()
+        self._on_data: Optional[DataCallback] = None
+        self._on_lost: Optional[LostCallback] = None
+
+    async def open(self, on_data: DataCallback, on_lost: LostCallback) -> None:
+        self._fd = os.open(self.path, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        try:
+            self._configure(self._fd)
+        except Exception:
+            os.close(self._fd)
+            self._fd = None
+            raise
+        self._on_data = on_data
+        self._on_lost = on_lost
+        self._loop = asyncio.get_running_loop()
+        self._loop.add_reader(self._fd, self._on_readable)
+
+    def _configure(self, fd: int) -> None:
+        """Raw mode at the configured baud rate (no-op for files that aren't terminals)"""
+        import termios
+        import tty
+        if not os.isatty(fd):
+            return
+        tty.setraw(fd)
+        if self.baudrate:
+            if self.baudrate not in _BAUD_RATES:
+                raise OSError(f"Unsupported baud rate {self.baudrate}")
+            speed = getattr(termios, _BAUD_RATES[self.baudrate])
+            attributes = termios.tcgetattr(fd)
+            attributes[4] = attributes[5] = speed
+            termios.tcsetattr(fd, termios.TCSANOW, attributes)
+
+    def _on_readable(self) -> None:
+        try:
+            data = os.read(self._fd, 4096)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            self._lost(e)
+            return
+        if not data:
+            self._lost(None)
+            return
+        self._on_data(data)
+
+    def write(self, data: bytes) -> None:
+        if self._fd is None:
+            raise OSError("Transport is closed")
+        if self._pending:
+            self._pending += data
+            return
+        try:
+            written = os.write(self._fd, data)
+        except BlockingIOError:
+            written = 0
+        if written < len(data):
+            # Kernel buffer full: send the rest when the device can take it
+            self._pending += data[written:]
+            self._loop.add_writer(self._fd, self._on_writable)
+
+    def _on_writable(self) -> None:
+        try:
+            written = os.write(self._fd, self._pending)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self._lost(e)
+            return
+        del self._pending[:written]
+        if not self._pending:
+            self._loop.remove_writer(self._fd)
+
+    def _lost(self, exc: Optional[Exception]) -> None:
+        self._release()
+        if self._on_lost is not None:
+            self._on_lost(exc)
+
+    def _release(self) -> None:
+        if self._fd is None:
+            return
+        self._loop.remove_reader(self._fd)
+        self._loop.remove_writer(self._fd)
+        os.close(self._fd)
+        self._fd = None
+        self._pending.clear()
+
+    async def close(self) -> None:
+        self._release()
+
+    def __str__(self) -> str:
+        return f"serial://{self.path}"
+
+
+def transport_from_address(address: str, channel: int = 1) -> ELM327Transport:
+    """
+    Transport for an adapter address:
+        AA:BB:CC:DD:EE:FF or rfcomm://AA:BB:CC:DD:EE:FF[/channel] -> RFCOMM
+        tcp://host:port -> TCP
+        /dev/ttyUSB0 or serial:///dev/ttyUSB0[?baud=38400] -> serial port or pty
+
+    Raises:
+        ValueError: If the address matches none of them
+    """
+    if _BLUETOOTH_ADDRESS.match(address):
+        return RFCOMMTransport(address, channel)
+    if address.startswith("/dev/"):
+        return SerialTransport(address)
+
+    url = urlparse(address)
+    if url.scheme == "tcp" and url.hostname:
+        return TCPTransport(url.hostname, url.port or 35000)
+    if url.scheme == "serial" and url.path:
+        baud = parse_qs(url.query).get("baud")
+        return SerialTransport(url.path, int(baud[0]) if baud else 38400)
+    if url.scheme == "rfcomm":
+        mac, _, path_channel = address[len("rfcomm://"):].partition("/")
+        if _BLUETOOTH_ADDRESS.match(mac):
+            return RFCOMMTransport(mac, int(path_channel) if path_channel else channel)
+    raise ValueError(f"Unsupported adapter address '{address}'")
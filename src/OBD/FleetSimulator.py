@@ -0,0 +1,102 @@
+import logging as log
+import time
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+# Cruise speeds (km/h) drive phases pick from: town, main roads, motorway
+CRUISE_SPEEDS = np.array([30.0, 50.0, 50.0, 70.0, 90.0, 110.0, 130.0])
+# Share of phases that end in a stop (traffic lights, junctions)
+STOP_PROBABILITY = 0.2
+MEAN_PHASE_SECONDS = 45.0
+MIN_PHASE_SECONDS = 5.0
+# km/h gained or lost per second
+ACCELERATION = 8.0
+DECELERATION = 12.0
+
+# Upshift speeds (km/h) and engine RPM per km/h in each of six gears
+GEAR_UPSHIFT_SPEEDS = np.array([15.0, 30.0, 50.0, 70.0, 90.0])
+GEAR_RPM_PER_KMH = np.array([110.0, 60.0, 40.0, 30.0, 24.0, 20.0])
+IDLE_RPM = 750.0
+MAX_RPM = 6500.0
+
+# Longest stretch integrated step by step when readers were away; the rest is one step
+MAX_CATCH_UP_STEPS = 60
+
+
+class FleetSimulator(object):
+    """
+    Seeded drive cycles for `size` virtual vehicles, advanced together with NumPy.
+    Every vehicle alternates stops and cruise phases at a random target speed,
+    accelerating and braking at realistic rates; RPM follows speed through a six
+    gear box plus a load term while accelerating. The state advances lazily in fixed
+    `tick` steps whenever a reader asks for a newer time, so thousands of clients
+    sampling at the same moment cost one vectorized step.
+
+    The same seed and the same sequence of read times give the same values.
+    """
+
+    def __init__(self, size: int, seed: int = 0, tick: float = 0.5, clock: Callable[[], float] = time.monotonic):
+        if size < 1:
+            raise ValueError("size must be at least 1")
+        self.size = size
+        self.seed = seed
+        self.tick = tick
+        self.clock = clock
+        self.steps = 0
+        self._random = np.random.default_rng(seed)
+
+        self.speed = np.zeros(size)
+        self.rpm = np.full(size, IDLE_RPM)
+        self.runtime = np.zeros(size)
+        self.target_speed = np.zeros(size)
+        # Stagger the first departures, so the fleet doesn't move in lockstep
+        self.phase_left = self._random.uniform(0.0, MEAN_PHASE_SECONDS, size)
+        self.elapsed = 0.0
+        self._last_advance = clock()
+
+    def advance(self, now: Optional[float] = None) -> None:
+        """Integrates the fleet up to `now` (the clock by default) in `tick` steps"""
+        now = self.clock() if now is None else now
+        steps = int((now - self._last_advance) / self.tick)
+        if steps <= 0:
+            return
+        self._last_advance += steps * self.tick
+        if steps > MAX_CATCH_UP_STEPS:
+            log.debug("Fleet simulator skipping %d steps", steps - MAX_CATCH_UP_STEPS)
+            self.step((steps - MAX_CATCH_UP_STEPS) * self.tick)
+            steps = MAX_CATCH_UP_STEPS
+        for _ in range(steps):
+            self.step(self.tick)
+
+    def step(self, dt: float) -> None:
+        """One integration step of `dt` seconds for every vehicle"""
+        self.steps += 1
+        self.elapsed += dt
+        self.runtime += dt
+
+        # New phase: stop, or cruise at a new speed, for a random time
+        self.phase_left -= dt
+        expired = np.flatnonzero(self.phase_left <= 0)
+        if expired.size:
+            cruise = self._random.choice(CRUISE_SPEEDS, expired.size) + self._random.normal(0.0, 5.0, expired.size)
+            stop = self._random.random(expired.size) < STOP_PROBABILITY
+            self.target_speed[expired] = np.where(stop, 0.0, np.maximum(cruise, 10.0))
+            self.phase_left[expired] = MIN_PHASE_SECONDS + self._random.exponential(MEAN_PHASE_SECONDS, expired.size)
+
+        previous = self.speed.copy()
+        change = np.clip(self.target_speed - self.speed, -DECELERATION * dt, ACCELERATION * dt)
+        # Drivers wander around the target while cruising
+        wander = self._random.normal(0.0, 0.8 * np.sqrt(dt), self.size) * (self.target_speed > 0)
+        np.clip(self.speed + change + wander, 0.0, None, out=self.speed)
+
+        gear = np.searchsorted(GEAR_UPSHIFT_SPEEDS, self.speed)
+        acceleration = (self.speed - previous) / dt
+        rpm = self.speed * GEAR_RPM_PER_KMH[gear] + 60.0 * np.clip(acceleration, 0.0, None)
+        noise = self._random.normal(0.0, 15.0, self.size)
+        np.clip(np.maximum(rpm, IDLE_RPM) + noise, IDLE_RPM - 50.0, MAX_RPM, out=self.rpm)
+
+    def values(self, index: int, now: Optional[float] = None) -> Tuple[int, int, int]:
+        """RPM, speed (km/h) and engine runtime (s) of one vehicle"""
+        self.advance(now)
+        return int(self.rpm[index]), int(self.speed[index]), int(self.runtime[index])
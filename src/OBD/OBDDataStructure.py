@@ -1,7 +1,8 @@
-from dataclasses import dataclass
+from typing import NamedTuple
 
-@dataclass
-class OBDDataStructure: 
+
+class OBDDataStructure(NamedTuple):
+    """One sample of the vehicle. A tuple: no per-instance __dict__, cheap to create and hash"""
     rpm: int = -1
     speed: int = -1
     runtime: int = -1
@@ -0,0 +1,245 @@
+import asyncio
+import logging as log
+import threading
+import time
+from typing import Callable, List, NamedTuple, Optional, TYPE_CHECKING
+
+from src.Commons.Metrics import REGISTRY
+from src.OBD.OBDDataStructure import OBDDataStructure
+
+if TYPE_CHECKING:
+    from src.Bluetooth.iBluetoothOBDClient import iBluetoothOBDClient
+    from src.OBD.PIDScheduler import PIDScheduler
+
+
+LOOP_LAG_SECONDS = REGISTRY.histogram("obd_loop_lag_seconds", "How late acquisition loops wake up for their next sample",
+                                      buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+
+
+def calculate_distance_increment(speed_kmh, elapsed_seconds):
+    """Calculate distance increment based on speed and elapsed time"""
+    # Distance = speed (km/h) * time (h)
+    # Convert seconds to hours: seconds / 3600
+    return (speed_kmh * elapsed_seconds) / 3600
+
+
+class OBDSnapshot(NamedTuple):
+    """Immutable view of the latest sample, published atomically by the poller"""
+    data: OBDDataStructure
+    timestamp: float
+    accumulated_distance: float
+    sequence: int
+
+
+class OBDPoller(object):
+    """
+    Background acquisition task that owns an iBluetoothOBDClient, samples it at a
+    fixed rate and publishes the latest OBDSnapshot. Readers (HTTP handlers) only
+    read `snapshot`, so they never touch the radio link.
+
+    With a PIDScheduler, each PID is requested at its own rate instead and a
+    snapshot is published whenever one of them was refreshed.
+
+    With an `idle_rate`, sampling is demand driven: consumers either hold a lease
+    (`acquire`/`release`, e.g. stream subscribers and loggers) or renew a short one
+    on every read (`touch`, e.g. HTTP polling). While nobody holds a lease the poller
+    only samples at the keep-alive rate, and the first consumer to come back wakes
+    it up immediately.
+    """
+
+    def __init__(self, client: "iBluetoothOBDClient", sample_rate: float = 2.0, scheduler: Optional["PIDScheduler"] = None,
+                 idle_rate: Optional[float] = None, lease_seconds: float = 10.0, clock: Callable[[], float] = time.time):
+        if sample_rate <= 0:
+            raise ValueError("sample_rate must be greater than 0")
+        if idle_rate is not None and idle_rate <= 0:
+            raise ValueError("idle_rate must be greater than 0")
+        self.client = client
+        self.sample_rate = sample_rate
+        self.scheduler = scheduler
+        # Sample timestamps; a replayed capture substitutes its own timeline
+        self.clock = clock
+        self.idle_rate = idle_rate
+        self.lease_seconds = lease_seconds
+        self._consumers = 0
+        self._lease_until = 0.0
+        self._lease_lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._idle = False
+        self.snapshot: Optional[OBDSnapshot] = None
+        self.total_distance = 0.0
+        self.last_sample_time: Optional[float] = None
+        self._sequence = 0
+        # Sampling outcomes, exported per vehicle at /metrics
+        self.samples = 0
+        self.failed_samples = 0
+        # Failures since the last sample; a stalled link only shows up as a run of these
+        self.consecutive_failures = 0
+        self._task: Optional[asyncio.Task] = None
+        self._listeners: List[Callable[[OBDSnapshot], None]] = []
+
+    @property
+    def period(self) -> float:
+        return 1.0 / self.sample_rate
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def consumers(self) -> int:
+        """Consumers currently holding a lease (not counting `touch` leases)"""
+        return self._consumers
+
+    @property
+    def active(self) -> bool:
+        """Whether someone is consuming samples (always True without an idle rate)"""
+        return self.idle_rate is None or self._consumers > 0 or time.monotonic() < self._lease_until
+
+    def start(self) -> asyncio.Task:
+        """Starts the acquisition task on the running event loop"""
+        if not self.running:
+            self._loop = asyncio.get_running_loop()
+            self._wake = asyncio.Event()
+            self._task = self._loop.create_task(self._run())
+        return self._task
+
+    async def stop(self) -> None:
+        """Cancels the acquisition task and waits for it to finish"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def add_listener(self, callback: Callable[[OBDSnapshot], None]) -> None:
+        """Registers a callback invoked on the poller's loop for every published snapshot"""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[OBDSnapshot], None]) -> None:
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def acquire(self) -> None:
+        """Registers a long-lived consumer until `release`. Thread safe"""
+        with self._lease_lock:
+            self._consumers += 1
+        self._wake_up()
+
+    def release(self) -> None:
+        with self._lease_lock:
+            self._consumers = max(0, self._consumers - 1)
+            if self._consumers == 0:
+                # Keep sampling for one lease window, a reconnect is likely
+                self._lease_until = max(self._lease_until, time.monotonic() + self.lease_seconds)
+
+    def touch(self) -> None:
+        """Renews the lease of short-lived consumers (HTTP polling) for `lease_seconds`. Thread safe"""
+        self._lease_until = time.monotonic() + self.lease_seconds
+        self._wake_up()
+
+    def _wake_up(self) -> None:
+        if self._idle and self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def reset_distance(self) -> None:
+        """Resets the accumulated distance. Must be called from the poller's loop"""
+        self.last_sample_time = None
+        self.total_distance = 0.0
+        if self.snapshot is not None:
+            self._publish(self.snapshot.data, self.snapshot.timestamp)
+
+    async def sample_once(self) -> Optional[OBDSnapshot]:
+        """
+        Requests one sample from the client (or the PIDs that are due) and publishes it
+
+        Returns:
+            OBDSnapshot: The published snapshot, None if the sample failed or no PID was due
+        """
+        if self.scheduler is not None:
+            if self.scheduler.next_wakeup() > time.monotonic():
+                # Nothing is due yet (e.g. woken up from idle): not a failed sample
+                return None
+            data = self.scheduler.data() if await self.scheduler.step() else None
+        else:
+            data = await self.client.request_all_settings()
+        if data is None:
+            self.failed_samples += 1
+            self.consecutive_failures += 1
+            return None
+        self.samples += 1
+        self.consecutive_failures = 0
+
+        sample_time = self.clock()
+        if self.last_sample_time is not None and data.speed is not None and data.speed >= 0:
+            elapsed_seconds = sample_time - self.last_sample_time
+            distance_increment = calculate_distance_increment(data.speed, elapsed_seconds)
+            self.total_distance += distance_increment
+            log.debug("Added distance: %.2f km (speed: %s km/h, time: %.2fs)", distance_increment, data.speed, elapsed_seconds)
+        self.last_sample_time = sample_time
+
+        return self._publish(data, sample_time)
+
+    def _publish(self, data: OBDDataStructure, timestamp: float) -> OBDSnapshot:
+        self._sequence += 1
+        snapshot = OBDSnapshot(data, timestamp, self.total_distance, self._sequence)
+        self.snapshot = snapshot
+        for listener in self._listeners:
+            try:
+                listener(snapshot)
+            except Exception as e:
+                log.error(f"Error in snapshot listener: {e}")
+        return snapshot
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while True:
+            try:
+                await self.sample_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed_samples += 1
+                self.consecutive_failures += 1
+                log.error(f"Error sampling OBD client: {e}")
+
+            if not self.active:
+                await self._idle_wait()
+                continue
+            if self._idle:
+                self._idle = False
+                log.info("Consumer attached, resuming full-rate sampling")
+                next_tick = loop.time()
+
+            if self.scheduler is not None:
+                # Sleep until the next PID is due; the scheduler handles missed deadlines
+                wakeup = self.scheduler.next_wakeup()
+                await asyncio.sleep(max(0.0, wakeup - time.monotonic()))
+                LOOP_LAG_SECONDS.observe(max(0.0, time.monotonic() - wakeup))
+                continue
+
+            # Fixed-rate schedule; skip ticks we already missed instead of bursting
+            next_tick += self.period
+            now = loop.time()
+            if next_tick < now:
+                next_tick = now
+            await asyncio.sleep(next_tick - now)
+            LOOP_LAG_SECONDS.observe(max(0.0, loop.time() - next_tick))
+
+    async def _idle_wait(self) -> None:
+        """Sleeps one keep-alive period, or until a consumer comes back"""
+        if not self._idle:
+            log.info(f"No consumers, sampling at keep-alive rate ({self.idle_rate} Hz)")
+            self._idle = True
+        self._wake.clear()
+        # A consumer may have arrived between the check and the clear
+        if self.active:
+            return
+        try:
+            await asyncio.wait_for(self._wake.wait(), 1.0 / self.idle_rate)
+        except asyncio.TimeoutError:
+            pass
@@ -0,0 +1,249 @@
+import ast
+import json
+import logging as log
+import os
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+RES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", ".res", "OBD2")
+
+# Service -> PID description file in RES_DIR
+PID_SERVICE_FILES = {
+    "01": "pid_service_01.json",
+    "09": "pid_service_09.json"
+}
+
+# Formula variables: A is the first data byte, B the second...
+_FORMULA_VARIABLES = "ABCDEFGHIJ"
+_FORMULA_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Constant, ast.Name, ast.Load,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+    ast.LShift, ast.RShift, ast.BitAnd, ast.BitOr, ast.BitXor, ast.USub, ast.UAdd
+)
+
+
+class _ByteIndexer(ast.NodeTransformer):
+    """Rewrites formula variables (A, B...) into indexes of a byte string (d[0], d[1]...)"""
+    def __init__(self, variable: str, offset: int):
+        self.variable = variable
+        self.offset = offset
+
+    def visit_Name(self, node: ast.Name) -> ast.AST:
+        index = self.offset + _FORMULA_VARIABLES.index(node.id)
+        subscript = ast.Subscript(value=ast.Name(id=self.variable, ctx=ast.Load()), slice=ast.Constant(index), ctx=ast.Load())
+        return ast.copy_location(subscript, node)
+
+
+def formula_source(formula: str, data_len: int, variable: str = "d", offset: int = 0) -> str:
+    """
+    Validates a scaling formula such as "(256*A+B)/4" and rewrites it as Python source
+    over `variable`, with A at index `offset`
+
+    Raises:
+        ValueError: If the formula uses anything but arithmetic over the data bytes
+    """
+    tree = ast.parse(formula, mode="eval")
+    for node in ast.walk(tree):
+        if not isinstance(node, _FORMULA_NODES):
+            raise ValueError(f"Unsupported expression in formula '{formula}': {type(node).__name__}")
+        if isinstance(node, ast.Name) and (node.id not in _FORMULA_VARIABLES or _FORMULA_VARIABLES.index(node.id) >= data_len):
+            raise ValueError(f"Unknown variable '{node.id}' in formula '{formula}'")
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float)):
+            raise ValueError(f"Unsupported constant in formula '{formula}'")
+
+    return ast.unparse(ast.fix_missing_locations(_ByteIndexer(variable, offset).visit(tree)))
+
+
+def compile_formula(formula: str, data_len: int) -> Callable[[bytes], Any]:
+    """Compiles a scaling formula into a function of the data bytes"""
+    return eval(f"lambda d: {formula_source(formula, data_len)}", {"__builtins__": {}})
+
+
+def _raw_decoder(data_len: int, encoding: Optional[str]) -> Callable[[bytes], Any]:
+    """Decoder for PIDs without a formula"""
+    if encoding:
+        return lambda d: d.decode(encoding, errors="ignore").strip("\x00 ")
+    if data_len <= 4:
+        return lambda d: int.from_bytes(d, "big")
+    return bytes
+
+
+@dataclass(frozen=True)
+class PIDDefinition:
+    mode: str
+    pid: str
+    data_len: int
+    desc: str = ""
+    name: str = ""
+    unit: str = ""
+    formula: Optional[str] = None
+    decode: Callable[[bytes], Any] = field(default=bytes, compare=False, repr=False)
+
+    def source(self, variable: str, offset: int) -> Optional[str]:
+        """Inline Python expression decoding this PID from `variable` at `offset`, if it has one"""
+        if self.formula:
+            return formula_source(self.formula, self.data_len, variable, offset)
+        if self.decode is not bytes and self.data_len == 1:
+            return f"{variable}[{offset}]"
+        return None
+
+    @classmethod
+    def from_dict(cls, mode: str, entry: dict) -> "PIDDefinition":
+        pid = entry["PID"].upper()
+        data_len = int(entry["DataLen"])
+        formula = entry.get("Formula")
+        decode = compile_formula(formula, data_len) if formula else _raw_decoder(data_len, entry.get("Encoding"))
+        return cls(mode, pid, data_len, entry.get("Desc", ""), entry.get("Name", ""), entry.get("Unit", ""), formula, decode)
+
+
+class PIDDecoderRegistry(object):
+    """
+    Decoders for every PID described in .res/OBD2, built once. Each PID gets a
+    precompiled function over its raw data bytes, and `decode_message` decodes a
+    whole (multi-PID) reply in a single pass through per-service lookup tables.
+    """
+
+    _default: Optional["PIDDecoderRegistry"] = None
+
+    def __init__(self):
+        self._definitions: Dict[str, Dict[str, PIDDefinition]] = {}
+        # Reply service byte (0x41...) -> 256 slots of (pid, data_len, decode)
+        self._tables: Dict[int, List[Optional[Tuple[str, int, Callable[[bytes], Any]]]]] = {}
+        self._frame_decoders: Dict[Tuple[str, Tuple[str, ...]], Callable[[bytes], Dict[str, Any]]] = {}
+        self._command_decoders: Dict[str, Callable[[bytes], Dict[str, Any]]] = {}
+
+    @classmethod
+    def default(cls) -> "PIDDecoderRegistry":
+        """Registry loaded from PID_SERVICE_FILES (loaded on first use, then shared)"""
+        if cls._default is None:
+            cls._default = cls.load()
+        return cls._default
+
+    @classmethod
+    def load(cls, service_files: Optional[Dict[str, str]] = None, res_dir: str = RES_DIR) -> "PIDDecoderRegistry":
+        """
+        Builds a registry from PID description files
+
+        Args:
+            service_files (Dict[str, str], optional): Service -> file name. Defaults to PID_SERVICE_FILES
+            res_dir (str, optional): Directory of the files. Defaults to RES_DIR
+        """
+        registry = cls()
+        for mode, file_name in (service_files or PID_SERVICE_FILES).items():
+            path = os.path.join(res_dir, file_name)
+            try:
+                with open(path, encoding="utf-8") as file:
+                    entries = json.load(file)["PIDs"]
+            except Exception as ex:
+                log.error(f"Couldn't load PID descriptions from '{path}' ({ex})")
+                continue
+            for entry in entries:
+                registry.add(PIDDefinition.from_dict(mode, entry))
+        return registry
+
+    def add(self, definition: PIDDefinition) -> None:
+        self._frame_decoders.clear()
+        self._command_decoders.clear()
+        self._definitions.setdefault(definition.mode, {})[definition.pid] = definition
+        table = self._tables.setdefault(int(definition.mode, 16) + 0x40, [None] * 256)
+        table[int(definition.pid, 16)] = (definition.pid, definition.data_len, definition.decode)
+
+    def get(self, mode: str, pid: str) -> Optional[PIDDefinition]:
+        return self._definitions.get(mode, {}).get(pid.upper())
+
+    def definitions(self, mode: str) -> List[PIDDefinition]:
+        return list(self._definitions.get(mode, {}).values())
+
+    def data_lengths(self, mode: str = "01") -> Dict[str, int]:
+        return {pid: definition.data_len for pid, definition in self._definitions.get(mode, {}).items()}
+
+    def decode(self, mode: str, pid: str, data: bytes) -> Any:
+        """Decodes the data bytes of a single PID"""
+        definition = self.get(mode, pid)
+        if definition is None:
+            raise KeyError(f"Unknown PID {mode} {pid}")
+        return definition.decode(data)
+
+    def decode_message(self, message: bytes) -> Dict[str, Any]:
+        """
+        Decodes one reply message (service byte followed by PID/data groups) in one pass
+
+        Returns:
+            Dict[str, Any]: Decoded value per PID (unknown or truncated PIDs end the message)
+        """
+        results: Dict[str, Any] = {}
+        if not message:
+            return results
+        table = self._tables.get(message[0])
+        if table is None:
+            return results
+
+        i = 1
+        end = len(message)
+        while i < end:
+            entry = table[message[i]]
+            if entry is None:
+                break
+            pid, data_len, decode = entry
+            start = i + 1
+            i = start + data_len
+            if i > end:
+                break
+            results[pid] = decode(message[start:i])
+        return results
+
+    def frame_decoder(self, mode: str, pids: Tuple[str, ...]) -> Callable[[bytes], Dict[str, Any]]:
+        """
+        Decoder specialised for the reply to one multi-PID request (e.g. 01 0C 0D 1F).
+        The layout check and every formula are compiled into a single function; replies
+        with any other layout go through `decode_message`.
+
+        Args:
+            mode (str): Service of the request
+            pids (Tuple[str, ...]): PIDs of the request, in request order
+
+        Returns:
+            Callable[[bytes], Dict[str, Any]]: Message -> decoded value per PID
+        """
+        key = (mode, tuple(pid.upper() for pid in pids))
+        decoder = self._frame_decoders.get(key)
+        if decoder is None:
+            decoder = self._compile_frame_decoder(*key)
+            self._frame_decoders[key] = decoder
+        return decoder
+
+    def command_decoder(self, command: str) -> Callable[[bytes], Dict[str, Any]]:
+        """`frame_decoder` for a request string such as "010C0D1F" (cached by string)"""
+        decoder = self._command_decoders.get(command)
+        if decoder is None:
+            compact = command.replace(" ", "").upper()
+            decoder = self.frame_decoder(compact[:2], tuple(compact[i:i + 2] for i in range(2, len(compact), 2)))
+            self._command_decoders[command] = decoder
+        return decoder
+
+    def _compile_frame_decoder(self, mode: str, pids: Tuple[str, ...]) -> Callable[[bytes], Dict[str, Any]]:
+        namespace: Dict[str, Any] = {"__builtins__": {"len": len}, "_fallback": self.decode_message}
+        checks = [f"m[0] == {int(mode, 16) + 0x40}"]
+        values = []
+        offset = 1
+        for pid in pids:
+            definition = self.get(mode, pid)
+            if definition is None:
+                return self.decode_message
+            checks.append(f"m[{offset}] == {int(pid, 16)}")
+            start = offset + 1
+            offset = start + definition.data_len
+            source = definition.source("m", start)
+            if source is None:
+                namespace[f"_decode_{pid}"] = definition.decode
+                source = f"_decode_{pid}(m[{start}:{offset}])"
+            values.append(f"{pid!r}: {source}")
+
+        code = (
+            "def decode(m):\n"
+            f"    if len(m) == {offset} and {' and '.join(checks)}:\n"
+            f"        return {{{', '.join(values)}}}\n"
+            "    return _fallback(m)\n"
+        )
+        exec(code, namespace)
+        return namespace["decode"]
@@ -0,0 +1,138 @@
+from typing import Any, Dict, Iterable, List, Optional
+
+from src.OBD.PIDDecoder import PIDDecoderRegistry
+
+# Max PIDs per service 01 request allowed by SAE J1979 / ISO 15031-5
+MAX_PIDS_PER_REQUEST = 6
+
+def build_pid_commands(pids: Iterable[str], mode: str = "01", max_pids: int = MAX_PIDS_PER_REQUEST) -> List[str]:
+    """
+    Builds the fewest requests covering every PID, e.g. ["0C", "0D", "1F"] -> ["010C0D1F"]
+
+    Args:
+        pids (Iterable[str]): Hex PIDs (duplicates are requested once)
+        mode (str, optional): Service. Defaults to "01"
+        max_pids (int, optional): PIDs per request. Defaults to 6
+
+    Returns:
+        List[str]: Commands to send
+    """
+    unique = list(dict.fromkeys(pid.upper() for pid in pids))
+    return [mode + "".join(unique[i:i + max_pids]) for i in range(0, len(unique), max_pids)]
+
+
+def _split_messages(response: str) -> List[bytes]:
+    """
+    Splits an ELM327 response (headers off) into one byte string per ECU message,
+    reassembling ISO-TP multi-frame replies ("00E", "0: 41 0C ...", "1: ...")
+    """
+    messages: List[bytes] = []
+    current: Optional[bytearray] = None
+    expected_len: Optional[int] = None
+
+    if "\n" not in response and ":" not in response:
+        # Common case: one single-frame reply
+        try:
+            return [bytes.fromhex(response)]
+        except ValueError:
+            pass
+
+    for line in response.split("\n"):
+        if ":" in line:
+            index, _, data = line.partition(":")
+            try:
+                frame = bytes.fromhex(data)
+            except ValueError:
+                continue
+            if index.strip() == "0" or current is None:
+                current = bytearray()
+                messages.append(current)
+            current += frame
+            if expected_len is not None:
+                del current[expected_len:]
+            continue
+
+        line = line.strip()
+        if len(line) == 3:
+            # ISO-TP length header for the frames that follow
+            try:
+                expected_len = int(line, 16)
+            except ValueError:
+                continue
+            current = None
+            continue
+        try:
+            # bytes.fromhex skips the spaces between bytes
+            messages.append(bytes.fromhex(line))
+        except ValueError:
+            continue    # NO DATA, STOPPED, ?...
+        current = None
+        expected_len = None
+
+    return [bytes(message) if type(message) is bytearray else message for message in messages]
+
+
+def decode_pid_response(response: Optional[str], command: Optional[str] = None, registry: Optional[PIDDecoderRegistry] = None) -> Dict[str, Any]:
+    """
+    Decodes every PID of a (multi-)PID response to its scaled value in one pass
+
+    Args:
+        response (str): Response text as returned by send_command
+        command (str, optional): The request (e.g. "010C0D1F"); enables the decoder
+            compiled for that request's reply layout
+        registry (PIDDecoderRegistry, optional): Defaults to the shared registry
+
+    Returns:
+        Dict[str, Any]: Decoded value per PID
+    """
+    if not response:
+        return {}
+    registry = registry or PIDDecoderRegistry.default()
+    decode = registry.command_decoder(command) if command else registry.decode_message
+
+    messages = _split_messages(response)
+    if len(messages) == 1:
+        return decode(messages[0])
+    results: Dict[str, Any] = {}
+    for message in messages:
+        results.update(decode(message))
+    return results
+
+
+def supported_pids_from_bitmask(base_pid: int, bitmask: int) -> List[str]:
+    """
+    Expands a "PIDs supported" reply, e.g. PID 00 -> 0xBE1FA813
+
+    Args:
+        base_pid (int): The queried PID (0x00, 0x20, 0x40...)
+        bitmask (int): Its 32 bit value; the MSB stands for PID base_pid + 1
+
+    Returns:
+        List[str]: Supported PIDs in that range
+    """
+    return [f"{base_pid + i + 1:02X}" for i in range(32) if bitmask & (1 << (31 - i))]
+
+
+def parse_vin(response: Optional[str]) -> Optional[str]:
+    """
+    Extracts the VIN from a service 09 PID 02 reply, either as one ISO-TP message
+    (49 02 01 + 17 characters) or as numbered legacy lines (49 02 NN + 4 bytes)
+
+    Returns:
+        str: 17 character VIN, None if the reply holds none
+    """
+    if not response:
+        return None
+
+    chunks: Dict[int, bytes] = {}
+    for message in _split_messages(response):
+        if len(message) < 4 or message[0] != 0x49 or message[1] != 0x02:
+            continue
+        if len(message) > 7:
+            chunks[0] = message[3:]
+        else:
+            chunks[message[2]] = message[3:]
+
+    data = b"".join(chunks[index] for index in sorted(chunks))
+    vin = "".join(chr(byte) for byte in data if chr(byte).isalnum())
+    return vin[-17:] if len(vin) >= 17 else None
@@ -0,0 +1,229 @@
+import json
+import logging as log
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, TYPE_CHECKING
+
+from src.OBD.OBDDataStructure import OBDDataStructure
+from src.OBD.PIDDecoder import PIDDecoderRegistry
+from src.OBD.PIDRequests import MAX_PIDS_PER_REQUEST
+
+if TYPE_CHECKING:
+    from src.Bluetooth.iBluetoothOBDClient import iBluetoothOBDClient
+
+# OBDDataStructure field -> service 01 PID
+OBD_FIELD_PIDS = {
+    "rpm": "0C",
+    "speed": "0D",
+    "runtime": "1F"
+}
+
+# Speed and RPM get the bandwidth, runtime barely changes
+DEFAULT_PID_SCHEDULE = {
+    "0D": {"rate": 10.0, "priority": 3},
+    "0C": {"rate": 10.0, "priority": 2},
+    "1F": {"rate": 0.1, "priority": 1}
+}
+
+
+@dataclass
+class PIDSchedule:
+    """Requested rate (Hz) and priority (higher wins) of one PID, plus its runtime state"""
+    pid: str
+    rate: float
+    priority: int = 0
+    effective_rate: float = 0.0
+    next_due: float = 0.0
+    value: Any = None
+    misses: int = 0
+    _sample_times: Deque[float] = field(default_factory=lambda: deque(maxlen=20), repr=False)
+
+    def __post_init__(self):
+        if self.rate <= 0:
+            raise ValueError(f"Rate of PID {self.pid} must be greater than 0")
+        self.pid = self.pid.upper()
+        self.effective_rate = self.effective_rate or self.rate
+
+    @property
+    def period(self) -> float:
+        return 1.0 / self.effective_rate
+
+    def achieved_rate(self, now: float) -> float:
+        """Measured sample rate over the last samples (0 once the PID went stale)"""
+        times = self._sample_times
+        if len(times) < 2 or now - times[-1] > 3 * self.period:
+            return 0.0
+        return (len(times) - 1) / (times[-1] - times[0])
+
+
+class PIDScheduler(object):
+    """
+    Shares the single adapter link among PIDs by target rate and priority. Every
+    `step` sends one frame with the PIDs that are due (highest priority first, topped
+    up with PIDs that are due soon). The measured round-trip time bounds how many
+    frames per second the link can carry; when the requested rates don't fit, the
+    lowest priorities are slowed down first so the link never falls behind.
+    """
+
+    def __init__(self, client: "iBluetoothOBDClient", schedules: List[PIDSchedule],
+                 max_pids_per_request: int = MAX_PIDS_PER_REQUEST, target_utilization: float = 0.8,
+                 min_rate: float = 0.05, rtt_alpha: float = 0.2):
+        if not schedules:
+            raise ValueError("At least one PID must be scheduled")
+        self.client = client
+        self.schedules = sorted(schedules, key=lambda schedule: -schedule.priority)
+        self.max_pids_per_request = max_pids_per_request
+        self.target_utilization = target_utilization
+        self.min_rate = min_rate
+        self.rtt_alpha = rtt_alpha
+        self.rtt: Optional[float] = None
+        self.frames = 0
+        self._allocated_rtt: Optional[float] = None
+        self._by_pid = {schedule.pid: schedule for schedule in self.schedules}
+
+    @classmethod
+    def from_config(cls, client: "iBluetoothOBDClient", config: Optional[Dict[str, dict]] = None, **kwargs) -> "PIDScheduler":
+        """Builds a scheduler from {"0D": {"rate": 10, "priority": 3}, ...}"""
+        config = config or DEFAULT_PID_SCHEDULE
+        return cls(client, [PIDSchedule(pid, float(entry["rate"]), int(entry.get("priority", 0))) for pid, entry in config.items()], **kwargs)
+
+    @classmethod
+    def from_file(cls, client: "iBluetoothOBDClient", path: str, **kwargs) -> "PIDScheduler":
+        try:
+            with open(path) as file:
+                config = json.load(file)
+        except Exception as ex:
+            log.error(f"Couldn't read PID schedule '{path}' ({ex}). Using defaults")
+            config = None
+        return cls.from_config(client, config, **kwargs)
+
+    def next_wakeup(self) -> float:
+        """time.monotonic() at which the next PID becomes due"""
+        return min(schedule.next_due for schedule in self.schedules)
+
+    def frame_demand(self, rates: List[float]) -> float:
+        """Frames per second needed for these rates, assuming due PIDs share frames"""
+        if not rates:
+            return 0.0
+        return max(max(rates), sum(rates) / self.max_pids_per_request)
+
+    def allocate(self) -> None:
+        """Sets effective rates: requested rates if they fit the link, else slow down low priorities first"""
+        if not self.rtt:
+            return
+        capacity = self.target_utilization / self.rtt
+        self._allocated_rtt = self.rtt
+
+        allocated: List[float] = []
+        levels = sorted(set(schedule.priority for schedule in self.schedules), reverse=True)
+        for level in levels:
+            group = [schedule for schedule in self.schedules if schedule.priority == level]
+            lower = [schedule for schedule in self.schedules if schedule.priority < level]
+            floor = [self.min_rate] * len(lower)
+
+            def demand(scale: float) -> float:
+                return self.frame_demand(allocated + [max(self.min_rate, s.rate * scale) for s in group] + floor)
+
+            scale = 1.0
+            if demand(1.0) > capacity:
+                # Demand grows with scale: bisect the largest scale that fits
+                low, high = 0.0, 1.0
+                for _ in range(20):
+                    middle = (low + high) / 2
+                    if demand(middle) > capacity:
+                        high = middle
+                    else:
+                        low = middle
+                scale = low
+            for schedule in group:
+                schedule.effective_rate = max(self.min_rate, schedule.rate * scale)
+                allocated.append(schedule.effective_rate)
+
+    def _update_rtt(self, rtt: float) -> None:
+        self.rtt = rtt if self.rtt is None else (1 - self.rtt_alpha) * self.rtt + self.rtt_alpha * rtt
+        # Re-plan when the link got noticeably slower or faster
+        if self._allocated_rtt is None or abs(self.rtt - self._allocated_rtt) > 0.1 * self._allocated_rtt:
+            self.allocate()
+
+    def _pick(self, now: float) -> List[PIDSchedule]:
+        due = [schedule for schedule in self.schedules if schedule.next_due <= now]
+        if not due:
+            return []
+        due.sort(key=lambda schedule: (-schedule.priority, schedule.next_due))
+        batch = due[:self.max_pids_per_request]
+        if len(batch) < self.max_pids_per_request:
+            # Fill the frame with PIDs due within half a period; they ride along for free
+            soon = [schedule for schedule in self.schedules
+                    if schedule not in batch and schedule.next_due - now <= 0.5 * schedule.period]
+            soon.sort(key=lambda schedule: (-schedule.priority, schedule.next_due))
+            batch += soon[:self.max_pids_per_request - len(batch)]
+        return batch
+
+    async def step(self) -> Dict[str, Any]:
+        """
+        Sends one frame with the PIDs that are due
+
+        Returns:
+            Dict[str, Any]: Decoded value per PID that answered ({} if nothing was due)
+        """
+        now = time.monotonic()
+        batch = self._pick(now)
+        if not batch:
+            return {}
+
+        try:
+            values = await self.client.request_pids([schedule.pid for schedule in batch])
+        except Exception:
+            # Back off these PIDs for a period instead of retrying them in a tight loop
+            done = time.monotonic()
+            for schedule in batch:
+                schedule.misses += 1
+                schedule.next_due = done + schedule.period
+            raise
+        done = time.monotonic()
+        self.frames += 1
+        self._update_rtt(done - now)
+
+        for schedule in batch:
+            if schedule.pid in values:
+                schedule.value = values[schedule.pid]
+                schedule._sample_times.append(done)
+            else:
+                schedule.misses += 1
+            # Late PIDs restart from this frame instead of bursting to catch up
+            schedule.next_due = max(schedule.next_due, now) + schedule.period
+        return values
+
+    def value(self, pid: str) -> Any:
+        schedule = self._by_pid.get(pid.upper())
+        return schedule.value if schedule is not None else None
+
+    def data(self) -> Optional[OBDDataStructure]:
+        """Latest value of every OBDDataStructure field (None until something answered)"""
+        values = {name: self.value(pid) for name, pid in OBD_FIELD_PIDS.items()}
+        if all(value is None for value in values.values()):
+            return None
+        return OBDDataStructure(**{name: int(value) if value is not None else -1 for name, value in values.items()})
+
+    def report(self) -> dict:
+        """Requested vs. effective vs. achieved rate per PID, and the measured round trip"""
+        now = time.monotonic()
+        registry = PIDDecoderRegistry.default()
+        pids = []
+        for schedule in self.schedules:
+            definition = registry.get("01", schedule.pid)
+            pids.append({
+                "pid": schedule.pid,
+                "name": definition.name if definition is not None else "",
+                "priority": schedule.priority,
+                "requested_rate": schedule.rate,
+                "effective_rate": round(schedule.effective_rate, 3),
+                "achieved_rate": round(schedule.achieved_rate(now), 3),
+                "misses": schedule.misses
+            })
+        return {
+            "rtt": self.rtt,
+            "frames": self.frames,
+            "pids": pids
+        }
@@ -0,0 +1,457 @@
+import asyncio
+import json
+import logging as log
+import struct
+import time
+from multiprocessing import shared_memory
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from src.OBD.OBDDataStructure import OBDDataStructure
+from src.OBD.OBDPoller import OBDSnapshot
+from src.OBD.TelemetryRingBuffer import HISTORY_COLUMNS, TelemetryRingBuffer
+from src.OBD.VehicleRegistry import Vehicle, VehicleRegistry
+from src.Trip.TripStatistics import TripStatistics
+
+# Environment variable naming the bus, for the server workers the owner starts
+BUS_ENV = "OBD_SNAPSHOT_BUS"
+
+# Layout: header (magic, layout version, manifest length), the JSON manifest (vehicles,
+# array offsets), then 64-byte aligned: one seqlock version per vehicle (odd while the
+# owner writes), one record per vehicle, the control cells workers write and, last,
+# the vehicles' trip statistics and history rings.
+HEADER = struct.Struct("<4sBxxxI")
+MAGIC = b"OBDB"
+LAYOUT_VERSION = 1
+# Sequence, timestamp, distance, RPM, speed, runtime, reconnects, consumers, samples,
+# failed samples, flags and trip ID
+RECORD = struct.Struct("<QddiiiIIQQB23s")
+RECORD_STRIDE = 96
+# Missing (None) sample values
+MISSING = -2 ** 31
+HAS_SAMPLE, CONNECTED, ACTIVE = 1, 2, 4
+
+# How often workers look for new samples, and the owner for their requests
+POLL_INTERVAL = 0.01
+CONTROL_INTERVAL = 0.02
+# How often the owner publishes the status of vehicles without new samples
+STATUS_INTERVAL = 0.5
+# How often workers renew the sampling lease of their open streams
+LEASE_RENEWAL = 1.0
+
+
+class VehicleStatus(NamedTuple):
+    connected: bool = False
+    active: bool = False
+    consumers: int = 0
+    reconnects: int = 0
+    samples: int = 0
+    failed_samples: int = 0
+    trip_id: Optional[str] = None
+
+
+def _align(offset: int) -> int:
+    return (offset + 63) // 64 * 64
+
+
+def _value(value) -> int:
+    return MISSING if value is None else value
+
+
+def _optional(value: int) -> Optional[int]:
+    return None if value == MISSING else value
+
+
+class SnapshotBus(object):
+    """
+    The latest sample, status, trip statistics and history of every vehicle, in shared memory. A single
+    process owns the adapters and writes the bus; any number of server processes attach
+    to it and read without copies or locks: records are guarded by a seqlock (readers
+    retry while the version is odd or changed under them), statistics and history by
+    their own versions.
+
+    Workers can't write records, they ask the owner through control cells instead: the
+    time of the latest sampling lease renewal and of the latest distance reset request
+    per vehicle. Every worker writes the same cells, and a lost update is harmless since
+    the owner only reacts to changes. A config cell announces threshold updates.
+    """
+
+    def __init__(self, memory: shared_memory.SharedMemory, manifest: dict, owner: bool):
+        self.memory = memory
+        self.manifest = manifest
+        self.owner = owner
+        self.vehicles: List[dict] = manifest["vehicles"]
+        self._index = {entry["id"]: index for index, entry in enumerate(self.vehicles)}
+        count = len(self.vehicles)
+        buf = memory.buf
+        self._versions = np.ndarray(count, dtype=np.uint64, buffer=buf, offset=manifest["versions"])
+        self._records = manifest["records"]
+        self._touched = np.ndarray(count, dtype=np.float64, buffer=buf, offset=manifest["touched"])
+        self._resets = np.ndarray(count, dtype=np.float64, buffer=buf, offset=manifest["resets"])
+        self._config = np.ndarray(1, dtype=np.float64, buffer=buf, offset=manifest["config"])
+        # Owner: the values behind each record. Readers: the last record read, by version
+        self._rows: List[list] = [[0, 0.0, 0.0, MISSING, MISSING, MISSING, 0, 0, 0, 0, 0, b""] for _ in range(count)]
+        self._cache: List[Tuple[int, Optional[OBDSnapshot], VehicleStatus]] = [(-1, None, VehicleStatus())] * count
+        self._task: Optional[asyncio.Task] = None
+        # Statistics and history rings kept in the bus's memory
+        self._stats: List[TripStatistics] = []
+        self._rings: List[TelemetryRingBuffer] = []
+
+    @classmethod
+    def create(cls, vehicles: Iterable[Vehicle], name: Optional[str] = None) -> "SnapshotBus":
+        """
+        Creates a bus for `vehicles` and moves their trip statistics and history into it.
+        Call it on the loop the vehicles are sampled on, then `serve` them.
+        """
+        vehicles = list(vehicles)
+        entries = [{"id": vehicle.vehicle_id, "type": vehicle.client_type, "sample_rate": vehicle.poller.sample_rate,
+                    "lease_seconds": vehicle.poller.lease_seconds, "rpm_bands": list(vehicle.trip_stats.rpm_bands),
+                    "history": vehicle.history.capacity if vehicle.history is not None else 0} for vehicle in vehicles]
+        manifest = {"vehicles": entries}
+        # Offsets depend on the manifest's length, which depends on the offsets: settle them
+        offsets_size = 0
+        while True:
+            encoded = json.dumps(manifest).encode()
+            if len(encoded) == offsets_size:
+                break
+            offsets_size = len(encoded)
+            offset = _align(HEADER.size + offsets_size + 64)
+            for key, size in (("versions", 8), ("records", RECORD_STRIDE), ("touched", 8), ("resets", 8)):
+                manifest[key] = offset
+                offset = _align(offset + size * len(vehicles))
+            manifest["config"] = offset
+            offset = _align(offset + 8)
+            for entry in entries:
+                entry["stats_offset"] = offset
+                offset = _align(offset + TripStatistics.buffer_size(entry["rpm_bands"]))
+                entry["history_offset"] = offset
+                offset = _align(offset + TelemetryRingBuffer.buffer_size(entry["history"])) if entry["history"] else offset
+            manifest["size"] = offset
+
+        memory = shared_memory.SharedMemory(name=name, create=True, size=manifest["size"])
+        HEADER.pack_into(memory.buf, 0, MAGIC, LAYOUT_VERSION, len(encoded))
+        memory.buf[HEADER.size:HEADER.size + len(encoded)] = encoded
+        bus = cls(memory, manifest, owner=True)
+        for vehicle, entry in zip(vehicles, entries):
+            vehicle.trip_stats.move_to(bus._stats_buffer(entry))
+            bus._stats.append(vehicle.trip_stats)
+            if vehicle.history is not None:
+                vehicle.history.move_to(bus._history_buffer(entry))
+                bus._rings.append(vehicle.history)
+        return bus
+
+    @classmethod
+    def attach(cls, name: str) -> "SnapshotBus":
+        memory = shared_memory.SharedMemory(name=name)
+        magic, version, length = HEADER.unpack_from(memory.buf, 0)
+        if magic != MAGIC or version != LAYOUT_VERSION:
+            memory.close()
+            raise ValueError(f"'{name}' is not a version {LAYOUT_VERSION} snapshot bus")
+        manifest = json.loads(bytes(memory.buf[HEADER.size:HEADER.size + length]))
+        return cls(memory, manifest, owner=False)
+
+    @property
+    def name(self) -> str:
+        return self.memory.name
+
+    def __len__(self) -> int:
+        return len(self.vehicles)
+
+    def index(self, vehicle_id: str) -> int:
+        return self._index[vehicle_id]
+
+    def _stats_buffer(self, entry: dict):
+        size = TripStatistics.buffer_size(entry["rpm_bands"])
+        return self.memory.buf[entry["stats_offset"]:entry["stats_offset"] + size]
+
+    def trip_stats(self, index: int) -> TripStatistics:
+        """A reader of the vehicle's trip statistics, without copying them"""
+        entry = self.vehicles[index]
+        stats = TripStatistics(rpm_bands=entry["rpm_bands"], buffer=self._stats_buffer(entry))
+        self._stats.append(stats)
+        return stats
+
+    def _history_buffer(self, entry: dict):
+        size = TelemetryRingBuffer.buffer_size(entry["history"])
+        return self.memory.buf[entry["history_offset"]:entry["history_offset"] + size]
+
+    def history(self, index: int) -> Optional[TelemetryRingBuffer]:
+        """A reader of the vehicle's history, without copying it"""
+        entry = self.vehicles[index]
+        if not entry["history"]:
+            return None
+        ring = TelemetryRingBuffer(entry["history"], HISTORY_COLUMNS, buffer=self._history_buffer(entry))
+        self._rings.append(ring)
+        return ring
+
+    # Owner
+
+    def publish(self, index: int, snapshot: OBDSnapshot) -> None:
+        """Publishes a vehicle's latest sample"""
+        row = self._rows[index]
+        data = snapshot.data
+        row[0:6] = (snapshot.sequence, snapshot.timestamp, snapshot.accumulated_distance,
+                    _value(data.rpm), _value(data.speed), _value(data.runtime))
+        row[10] |= HAS_SAMPLE
+        self._write(index, row)
+
+    def publish_status(self, index: int, status: VehicleStatus) -> None:
+        row = self._rows[index]
+        row[6:10] = (status.reconnects, status.consumers, status.samples, status.failed_samples)
+        row[10] = (row[10] & HAS_SAMPLE) | (CONNECTED if status.connected else 0) | (ACTIVE if status.active else 0)
+        row[11] = (status.trip_id or "").encode()
+        self._write(index, row)
+
+    def _write(self, index: int, row: list) -> None:
+        versions = self._versions
+        versions[index] += 1
+        RECORD.pack_into(self.memory.buf, self._records + index * RECORD_STRIDE, *row)
+        versions[index] += 1
+
+    # Readers
+
+    def version(self, index: int) -> int:
+        return int(self._versions[index])
+
+    def read(self, index: int) -> Tuple[Optional[OBDSnapshot], VehicleStatus]:
+        """A vehicle's latest sample (None before the first one) and status"""
+        cached = self._cache[index]
+        version = int(self._versions[index])
+        if version == cached[0]:
+            return cached[1], cached[2]
+        while True:
+            if version & 1:
+                # The owner is writing it; that takes a microsecond
+                time.sleep(0)
+                version = int(self._versions[index])
+                continue
+            fields = RECORD.unpack_from(self.memory.buf, self._records + index * RECORD_STRIDE)
+            latest = int(self._versions[index])
+            if latest == version:
+                break
+            version = latest
+
+        sequence, timestamp, distance, rpm, speed, runtime, reconnects, consumers, samples, failed, flags, trip_id = fields
+        snapshot = cached[1]
+        if not flags & HAS_SAMPLE:
+            snapshot = None
+        elif snapshot is None or snapshot.sequence != sequence:
+            snapshot = OBDSnapshot(OBDDataStructure(_optional(rpm), _optional(speed), _optional(runtime)),
+                                   timestamp, distance, sequence)
+        trip_id = trip_id.rstrip(b"\0").decode()
+        status = VehicleStatus(bool(flags & CONNECTED), bool(flags & ACTIVE), consumers, reconnects, samples, failed,
+                               trip_id or None)
+        self._cache[index] = (version, snapshot, status)
+        return snapshot, status
+
+    def touch(self, index: int) -> None:
+        """Asks the owner to keep sampling the vehicle at full rate for a lease window"""
+        self._touched[index] = time.monotonic()
+
+    def request_reset(self, index: int) -> None:
+        """Asks the owner to reset the vehicle's trip distance"""
+        self._resets[index] = time.time()
+
+    def announce_config(self) -> None:
+        """Tells every process that the trigger config file changed"""
+        self._config[0] = time.time()
+
+    @property
+    def config_version(self) -> float:
+        return float(self._config[0])
+
+    # Owner and reader tasks
+
+    def serve(self, vehicles: Iterable[Vehicle], on_config_change: Optional[Callable[[], None]] = None) -> asyncio.Task:
+        """
+        Publishes every sample of `vehicles` (in bus order) and their status, and applies
+        the workers' requests, from a task on the running loop
+        """
+        vehicles = list(vehicles)
+        for index, vehicle in enumerate(vehicles):
+            vehicle.poller.add_listener(self._publisher(index))
+            if vehicle.poller.snapshot is not None:
+                self.publish(index, vehicle.poller.snapshot)
+        # Requests count from now on
+        self._task = asyncio.get_running_loop().create_task(
+            self._serve(vehicles, self._touched.copy(), self._resets.copy(), on_config_change))
+        return self._task
+
+    def _publisher(self, index: int) -> Callable[[OBDSnapshot], None]:
+        def publish_to_bus(snapshot: OBDSnapshot) -> None:
+            self.publish(index, snapshot)
+        return publish_to_bus
+
+    async def _serve(self, vehicles: List[Vehicle], touched: np.ndarray, resets: np.ndarray,
+                     on_config_change: Optional[Callable[[], None]]) -> None:
+        statuses: List[Optional[VehicleStatus]] = [None] * len(vehicles)
+        next_status = 0.0
+        config_version = self.config_version
+        while True:
+            latest = self._touched.copy()
+            for index in np.flatnonzero(latest != touched):
+                vehicles[index].poller.touch()
+            touched = latest
+
+            latest = self._resets.copy()
+            for index in np.flatnonzero(latest != resets):
+                vehicles[index].poller.reset_distance()
+            resets = latest
+
+            if self.config_version != config_version:
+                config_version = self.config_version
+                if on_config_change is not None:
+                    on_config_change()
+
+            if time.monotonic() >= next_status:
+                next_status = time.monotonic() + STATUS_INTERVAL
+                for index, vehicle in enumerate(vehicles):
+                    poller = vehicle.poller
+                    status = VehicleStatus(vehicle.connected, poller.active, poller.consumers, vehicle.reconnects,
+                                           poller.samples, poller.failed_samples, vehicle.trip_id)
+                    if status != statuses[index]:
+                        self.publish_status(index, status)
+                        statuses[index] = status
+            await asyncio.sleep(CONTROL_INTERVAL)
+
+    def mirror(self, registry: VehicleRegistry) -> List[Vehicle]:
+        """Registers a stand-in of every vehicle on the bus; `follow` keeps them up to date"""
+        mirrored = []
+        for index, entry in enumerate(self.vehicles):
+            poller = MirroredPoller(self, index, entry["sample_rate"], entry["lease_seconds"])
+            vehicle = Vehicle(entry["id"], None, poller, client_type=entry["type"], history=self.history(index),
+                              trip_stats=self.trip_stats(index))
+            mirrored.append(registry.add_vehicle(vehicle))
+        return mirrored
+
+    def follow(self, vehicles: List[Vehicle], on_config_change: Optional[Callable[[], None]] = None) -> asyncio.Task:
+        """Runs the listeners of the mirrored `vehicles` for every new sample, from a task on the running loop"""
+        self._task = asyncio.get_running_loop().create_task(self._follow(vehicles, on_config_change))
+        return self._task
+
+    async def _follow(self, vehicles: List[Vehicle], on_config_change: Optional[Callable[[], None]]) -> None:
+        seen = np.zeros(len(vehicles), dtype=np.uint64)
+        config_version = self.config_version
+        next_renewal = 0.0
+        while True:
+            versions = self._versions.copy()
+            for index in np.flatnonzero(versions != seen):
+                vehicles[index].poller.refresh(vehicles[index])
+            seen = versions
+
+            if self.config_version != config_version:
+                config_version = self.config_version
+                if on_config_change is not None:
+                    on_config_change()
+
+            if time.monotonic() >= next_renewal:
+                next_renewal = time.monotonic() + LEASE_RENEWAL
+                for index, vehicle in enumerate(vehicles):
+                    if vehicle.poller.consumers > 0:
+                        self.touch(index)
+            await asyncio.sleep(POLL_INTERVAL)
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def close(self) -> None:
+        """Detaches from the bus (history rings keep a private copy); the owner also removes it"""
+        # Views into the memory must go before it can be closed
+        for stats in self._stats:
+            stats.move_to(bytearray(TripStatistics.buffer_size(stats.rpm_bands)))
+        for ring in self._rings:
+            ring.move_to(bytearray(TelemetryRingBuffer.buffer_size(ring.capacity, ring.columns)))
+        self._stats, self._rings = [], []
+        self._versions = self._touched = self._resets = self._config = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+class MirroredPoller(object):
+    """
+    Stand-in for the OBDPoller of a vehicle sampled by another process: reads its samples
+    and status from the bus, and forwards leases and distance resets to the owner
+    """
+
+    scheduler = None
+
+    def __init__(self, bus: SnapshotBus, index: int, sample_rate: float, lease_seconds: float):
+        self.bus = bus
+        self.index = index
+        self.sample_rate = sample_rate
+        self.lease_seconds = lease_seconds
+        self._consumers = 0
+        self._sequence = 0
+        self._listeners: List[Callable[[OBDSnapshot], None]] = []
+
+    @property
+    def snapshot(self) -> Optional[OBDSnapshot]:
+        return self.bus.read(self.index)[0]
+
+    @property
+    def status(self) -> VehicleStatus:
+        return self.bus.read(self.index)[1]
+
+    @property
+    def active(self) -> bool:
+        return self.status.active
+
+    @property
+    def samples(self) -> int:
+        return self.status.samples
+
+    @property
+    def failed_samples(self) -> int:
+        return self.status.failed_samples
+
+    @property
+    def consumers(self) -> int:
+        """Consumers holding a lease in this process"""
+        return self._consumers
+
+    def add_listener(self, callback: Callable[[OBDSnapshot], None]) -> None:
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[OBDSnapshot], None]) -> None:
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def acquire(self) -> None:
+        self._consumers += 1
+        self.bus.touch(self.index)
+
+    def release(self) -> None:
+        self._consumers = max(0, self._consumers - 1)
+
+    def touch(self) -> None:
+        self.bus.touch(self.index)
+
+    def reset_distance(self) -> None:
+        self.bus.request_reset(self.index)
+
+    def refresh(self, vehicle: Vehicle) -> None:
+        """Mirrors the owner's status onto `vehicle` and runs the listeners if there is a new sample"""
+        snapshot, status = self.bus.read(self.index)
+        vehicle.connected = status.connected
+        vehicle.reconnects = status.reconnects
+        vehicle.trip_id = status.trip_id
+        if snapshot is None or snapshot.sequence == self._sequence:
+            return
+        self._sequence = snapshot.sequence
+        for listener in self._listeners:
+            try:
+                listener(snapshot)
+            except Exception as e:
+                log.error(f"Error in snapshot listener: {e}")
+
+    async def stop(self) -> None:
+        pass
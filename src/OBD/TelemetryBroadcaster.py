@@ -0,0 +1,166 @@
+import asyncio
+import logging as log
+import queue
+import threading
+from typing import Optional
+
+
+class TelemetrySubscriber(object):
+    """
+    A single stream consumer. Payloads are queued up to `max_pending`; a consumer
+    that falls further behind is dropped instead of slowing everybody else down.
+    """
+
+    def __init__(self, max_pending: int = 8):
+        self._queue: "queue.Queue[Optional[bytes]]" = queue.Queue(maxsize=max_pending)
+        self.closed = False
+
+    def push(self, payload: bytes) -> bool:
+        """
+        Queues a payload without blocking
+
+        Returns:
+            bool: False if the subscriber was too slow and has been closed
+        """
+        if self.closed:
+            return False
+        try:
+            self._queue.put_nowait(payload)
+            return True
+        except queue.Full:
+            self.close()
+            return False
+
+    def close(self) -> None:
+        """Closes the subscriber and wakes up its reader"""
+        self.closed = True
+        # Drop whatever is pending so the end-of-stream marker fits. A push that was already
+        # under way can refill the queue in between: drain again, no new push gets past `closed`
+        while True:
+            try:
+                while True:
+                    self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                self._queue.put_nowait(None)
+                return
+            except queue.Full:
+                pass
+
+    def get(self, timeout: Optional[float] = None) -> Optional[bytes]:
+        """
+        Waits for the next payload
+
+        Raises:
+            queue.Empty: If nothing was published within `timeout`
+
+        Returns:
+            bytes: Next payload, None once the subscriber is closed
+        """
+        return self._queue.get(timeout=timeout)
+
+
+class AsyncTelemetrySubscriber(TelemetrySubscriber):
+    """
+    Stream consumer living on an asyncio loop. Payloads must be published from
+    that same loop (the acquisition loop in ASGI mode), so no thread hop is needed.
+    """
+
+    def __init__(self, max_pending: int = 8):
+        self._queue: "asyncio.Queue[Optional[bytes]]" = asyncio.Queue(maxsize=max_pending)
+        self.closed = False
+
+    def push(self, payload: bytes) -> bool:
+        if self.closed:
+            return False
+        try:
+            self._queue.put_nowait(payload)
+            return True
+        except asyncio.QueueFull:
+            self.close()
+            return False
+
+    def close(self) -> None:
+        self.closed = True
+        try:
+            while True:
+                self._queue.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+        self._queue.put_nowait(None)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[bytes]:
+        """
+        Waits for the next payload
+
+        Raises:
+            asyncio.TimeoutError: If nothing was published within `timeout`
+
+        Returns:
+            bytes: Next payload, None once the subscriber is closed
+        """
+        return await asyncio.wait_for(self._queue.get(), timeout)
+
+
+class TelemetryBroadcaster(object):
+    """
+    Fans a pre-encoded payload out to every subscriber, so each sample is encoded
+    once regardless of how many dashboards are listening. Thread safe.
+    """
+
+    def __init__(self, max_pending: int = 8):
+        self.max_pending = max_pending
+        # Subscribers dropped for falling behind
+        self.dropped = 0
+        self._subscribers: set = set()
+        self._lock = threading.Lock()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> TelemetrySubscriber:
+        """Subscribes a blocking (thread-based) consumer"""
+        return self._add(TelemetrySubscriber(self.max_pending))
+
+    def subscribe_async(self) -> AsyncTelemetrySubscriber:
+        """Subscribes a consumer running on the publishing event loop"""
+        return self._add(AsyncTelemetrySubscriber(self.max_pending))
+
+    def _add(self, subscriber):
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: TelemetrySubscriber) -> None:
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, payload: bytes) -> int:
+        """
+        Pushes a payload to every subscriber, dropping the ones that fell behind
+
+        Returns:
+            int: Number of subscribers that received the payload
+        """
+        with self._lock:
+            subscribers = list(self._subscribers)
+
+        delivered = 0
+        for subscriber in subscribers:
+            if subscriber.push(payload):
+                delivered += 1
+            else:
+                log.warning("Dropping slow telemetry subscriber")
+                self.dropped += 1
+                self.unsubscribe(subscriber)
+        return delivered
+
+    def close(self) -> None:
+        """Ends every open stream"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+            self._subscribers.clear()
+        for subscriber in subscribers:
+            subscriber.close()
@@ -0,0 +1,245 @@
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple, TypeVar, TYPE_CHECKING
+
+import numpy as np
+
+from src.OBD.OBDDataStructure import OBDDataStructure
+
+if TYPE_CHECKING:
+    from src.OBD.OBDPoller import OBDSnapshot
+
+# One column per OBDDataStructure field, plus the trip distance
+HISTORY_COLUMNS = OBDDataStructure._fields + ("distance",)
+
+# A day at the default 2 Hz sample rate
+DEFAULT_HISTORY_SIZE = 2 * 60 * 60 * 24
+
+# Buffer layout: next slot, sample count and a version (odd while an append is in
+# progress), then the mirrored timestamps and the mirrored (columns x samples) values
+_NEXT, _COUNT, _VERSION = range(3)
+_STATE_BYTES = 3 * 8
+
+T = TypeVar("T")
+
+
+def _json_list(values: np.ndarray) -> list:
+    """NaN (no value) as None, which JSON can encode"""
+    if not np.isnan(values).any():
+        return values.tolist()
+    return [None if value != value else value for value in values.tolist()]
+
+
+class TelemetryRingBuffer(object):
+    """
+    Fixed-capacity sample history, preallocated once. Every sample is written twice,
+    at `i` and `i + capacity`, so the latest N samples are always one contiguous
+    slice: windows are returned as views and appending never allocates.
+
+    Appends come from the acquisition loop, queries from HTTP threads; both take a
+    short lock. The storage can also be a caller's buffer, e.g. shared memory read by
+    other processes: those readers can't take the lock, so they check the version
+    instead and retry when an append overwrote rows they were reading.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_HISTORY_SIZE, columns: Tuple[str, ...] = HISTORY_COLUMNS, buffer=None):
+        """
+        Args:
+            capacity (int, optional): Samples kept
+            columns (Tuple[str, ...], optional): Value columns
+            buffer (optional): Writable buffer of `buffer_size(capacity, columns)` bytes to keep the
+                samples in, as left by another ring of the same shape (zeroed: empty). Defaults to a new one.
+        """
+        if capacity <= 0:
+            raise ValueError("capacity must be greater than 0")
+        self.capacity = capacity
+        self.columns = columns
+        self._column_index = {name: i for i, name in enumerate(columns)}
+        self._row = np.empty(len(columns), dtype=np.float32)
+        self._lock = threading.Lock()
+        self._bind(buffer if buffer is not None else bytearray(self.buffer_size(capacity, columns)))
+
+    @staticmethod
+    def buffer_size(capacity: int, columns: Tuple[str, ...] = HISTORY_COLUMNS) -> int:
+        return _STATE_BYTES + 2 * capacity * 8 + len(columns) * 2 * capacity * 4
+
+    def _bind(self, buffer) -> None:
+        size = self.buffer_size(self.capacity, self.columns)
+        if len(memoryview(buffer).cast("B")) < size:
+            raise ValueError(f"A ring of {self.capacity} samples needs a buffer of {size} bytes")
+        self.buffer = buffer
+        self._state = np.ndarray(3, dtype=np.int64, buffer=buffer)
+        # The writer's own copy, rings sharing a buffer have a single writer
+        self._next, self._count, self._version = (int(value) for value in self._state)
+        self._timestamps = np.ndarray(2 * self.capacity, dtype=np.float64, buffer=buffer, offset=_STATE_BYTES)
+        self._values = np.ndarray((len(self.columns), 2 * self.capacity), dtype=np.float32, buffer=buffer,
+                                  offset=_STATE_BYTES + self._timestamps.nbytes)
+
+    def move_to(self, buffer) -> None:
+        """Moves the samples to another buffer (see `buffer_size`), e.g. to share them"""
+        with self._lock:
+            size = self.buffer_size(self.capacity, self.columns)
+            memoryview(buffer).cast("B")[:size] = memoryview(self.buffer).cast("B")[:size]
+            self._bind(buffer)
+
+    def __len__(self) -> int:
+        return int(self._state[_COUNT])
+
+    @property
+    def nbytes(self) -> int:
+        return self._timestamps.nbytes + self._values.nbytes
+
+    def append(self, timestamp: float, values) -> None:
+        """Appends one sample; `values` holds one number per column, in column order"""
+        row = self._row
+        row[:] = values
+        state = self._state
+        with self._lock:
+            i = self._next
+            if self._count and timestamp < self._timestamps[i + self.capacity - 1]:
+                # Keep timestamps sorted if the wall clock steps back
+                timestamp = self._timestamps[i + self.capacity - 1]
+            self._version += 1
+            state[_VERSION] = self._version
+            self._timestamps[i] = self._timestamps[i + self.capacity] = timestamp
+            self._values[:, i] = self._values[:, i + self.capacity] = row
+            self._next = state[_NEXT] = i + 1 if i + 1 < self.capacity else 0
+            if self._count < self.capacity:
+                self._count += 1
+                state[_COUNT] = self._count
+            self._version += 1
+            state[_VERSION] = self._version
+
+    def append_snapshot(self, snapshot: "OBDSnapshot") -> None:
+        """OBDPoller listener"""
+        data = snapshot.data
+        self.append(snapshot.timestamp, (data.rpm, data.speed, data.runtime, snapshot.accumulated_distance))
+
+    def _read(self, read: Callable[[int, int], Tuple[T, int]]) -> T:
+        """
+        Runs `read(next, count)`, which returns its result and how many of the latest samples
+        it used, under the lock. Appends from other processes are checked for afterwards: each
+        overwrites the oldest sample, so a read of `n` samples is intact as long as fewer than
+        `capacity - n` appends started meanwhile.
+        """
+        state = self._state
+        while True:
+            with self._lock:
+                version = int(state[_VERSION])
+                next_slot, count = int(state[_NEXT]), int(state[_COUNT])
+                if version & 1 or int(state[_VERSION]) != version:
+                    continue
+                result, rows = read(next_slot, count)
+                appends = (int(state[_VERSION]) - version + 1) // 2
+            if appends == 0 or appends <= self.capacity - rows:
+                return result
+
+    def _latest(self, next_slot: int, n: int) -> slice:
+        # The last n samples end right before the mirrored copy of the next slot
+        end = next_slot + self.capacity
+        return slice(end - n, end)
+
+    def window(self, seconds: Optional[float] = None, now: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Samples of the last `seconds` (all of them if None), oldest first, as views.
+        The views are only stable until the buffer wraps around; copy them to keep them.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Timestamps and a (columns x samples) value array
+        """
+        def read(next_slot: int, count: int):
+            window = self._window(next_slot, count, seconds, now)
+            return window, len(window[0])
+        return self._read(read)
+
+    def _window(self, next_slot: int, count: int, seconds: Optional[float], now: Optional[float]) -> Tuple[np.ndarray, np.ndarray]:
+        rows = self._latest(next_slot, count)
+        timestamps = self._timestamps[rows]
+        values = self._values[:, rows]
+        if seconds is not None and count:
+            start = (now if now is not None else time.time()) - seconds
+            first = int(np.searchsorted(timestamps, start, side="left"))
+            timestamps = timestamps[first:]
+            values = values[:, first:]
+        return timestamps, values
+
+    def column(self, name: str, seconds: Optional[float] = None) -> np.ndarray:
+        _, values = self.window(seconds)
+        return values[self._column_index[name]]
+
+    def downsample(self, seconds: float, points: int, now: Optional[float] = None) -> Dict[str, object]:
+        """
+        Summarises the last `seconds` into at most `points` time buckets
+
+        Returns:
+            Dict[str, object]: {"t": bucket start times, "count": samples per bucket,
+                "<column>": {"min": [...], "max": [...], "mean": [...]}} (empty buckets are left out;
+                None where a column has no value in a bucket)
+        """
+        columns = self.downsample_columns(seconds, points, now)
+        result: Dict[str, object] = {"t": columns["t"].tolist(), "count": columns["count"].tolist()}
+        for name in self.columns:
+            result[name] = {stat: _json_list(columns[f"{name}.{stat}"]) for stat in ("min", "max", "mean")}
+        return result
+
+    def downsample_columns(self, seconds: float, points: int, now: Optional[float] = None) -> Dict[str, np.ndarray]:
+        """
+        `downsample` as flat column arrays, for the binary encoding
+
+        Returns:
+            Dict[str, np.ndarray]: "t", "count" and "<column>.min", "<column>.max", "<column>.mean"
+        """
+        if points <= 0:
+            raise ValueError("points must be greater than 0")
+        now = now if now is not None else time.time()
+
+        def read(next_slot: int, count: int):
+            timestamps, values = self._window(next_slot, count, seconds, now)
+            return self._summarise(timestamps, values, seconds, points, now), len(timestamps)
+        return self._read(read)
+
+    def _summarise(self, timestamps: np.ndarray, values: np.ndarray, seconds: float, points: int,
+                   now: float) -> Dict[str, np.ndarray]:
+        if not len(timestamps):
+            empty = np.empty((len(self.columns), 0), dtype=np.float32)
+            return self._columns(np.empty(0), np.empty(0, dtype=np.uint32), empty, empty, empty.astype(np.float64))
+
+        edges = np.linspace(now - seconds, now, points + 1)[:-1]
+        starts = np.searchsorted(timestamps, edges, side="left")
+        # reduceat needs strictly increasing, in-range starts: drop empty buckets
+        keep = np.empty(len(starts), dtype=bool)
+        keep[:-1] = starts[:-1] != starts[1:]
+        keep[-1] = starts[-1] < len(timestamps)
+        starts = starts[keep]
+        counts = np.diff(np.append(starts, len(timestamps)))
+
+        missing = np.isnan(values)
+        if not missing.any():
+            minimum = np.minimum.reduceat(values, starts, axis=1)
+            maximum = np.maximum.reduceat(values, starts, axis=1)
+            mean = np.add.reduceat(values, starts, axis=1, dtype=np.float64) / counts
+        else:
+            # Missing values (None) are stored as NaN: summarise the samples that have one,
+            # a bucket without any stays NaN
+            minimum = np.fmin.reduceat(values, starts, axis=1)
+            maximum = np.fmax.reduceat(values, starts, axis=1)
+            present = np.add.reduceat(~missing, starts, axis=1)
+            with np.errstate(invalid="ignore"):
+                mean = np.add.reduceat(np.where(missing, 0, values), starts, axis=1, dtype=np.float64) / present
+        return self._columns(edges[keep], counts.astype(np.uint32), minimum, maximum, mean)
+
+    def _columns(self, starts: np.ndarray, counts: np.ndarray, minimum: np.ndarray, maximum: np.ndarray,
+                 mean: np.ndarray) -> Dict[str, np.ndarray]:
+        columns: Dict[str, np.ndarray] = {"t": starts, "count": counts}
+        for i, name in enumerate(self.columns):
+            columns[f"{name}.min"] = minimum[i]
+            columns[f"{name}.max"] = maximum[i]
+            columns[f"{name}.mean"] = mean[i]
+        return columns
+
+    def clear(self) -> None:
+        with self._lock:
+            # Readers in other processes see every sample as overwritten
+            self._version += 2 * self.capacity
+            self._next = self._count = 0
+            self._state[:] = (0, 0, self._version)
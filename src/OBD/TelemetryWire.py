@@ -0,0 +1,197 @@
+import functools
+import json
+import struct
+from typing import Dict, List, Optional, Sequence, Tuple, TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from src.OBD.OBDPoller import OBDSnapshot
+
+# Media types offered by the telemetry routes, besides JSON
+JSON = "application/json"
+NDJSON = "application/x-ndjson"
+EVENT_STREAM = "text/event-stream"
+SAMPLE_BINARY = "application/x-obd-sample"
+COLUMNS_BINARY = "application/x-obd-columns"
+# Encodings of /api/obd/data, the default first
+DATA_MEDIA_TYPES = (JSON, SAMPLE_BINARY)
+
+# One sample: format version, sequence, timestamp, trip distance (km), RPM, speed, ECU
+# runtime, fatigue level (-1: unknown) and the worried trigger bits; 27 bytes, little-endian.
+# Streams are back to back samples; an all-zero record (version 0) is a keep-alive.
+SAMPLE_VERSION = 1
+SAMPLE = struct.Struct("<BIdfhhibB")
+KEEPALIVE = bytes(SAMPLE.size)
+TRIGGERS = ("speed_exceeded", "distance_exceeded", "time_exceeded", "fatigue_exceeded")
+
+# Column arrays: magic, version, column count and row count, then per column the name
+# length, the name and its NumPy dtype string (e.g. "<f8"), then the columns' data in
+# the same order. Every column has the same number of rows.
+COLUMNS_MAGIC = b"OBDC"
+COLUMNS_VERSION = 1
+COLUMNS_HEADER = struct.Struct("<4sBBI")
+COLUMN_NAME = struct.Struct("<B")
+_COLUMN_DTYPES = {"<f8", "<f4", "<i4", "<u4", "<i8"}
+
+
+def negotiate(accept: Optional[str], offered: Sequence[str]) -> str:
+    """
+    Picks the offered media type the client prefers, from its Accept header
+
+    Args:
+        accept (str): Accept header, None if the client sent none
+        offered (Sequence[str]): Media types the route can produce, the default first
+
+    Returns:
+        str: Best match; the default when nothing matches, rather than a 406
+    """
+    if not accept:
+        return offered[0]
+    best, best_quality = offered[0], 0.0
+    for entry in accept.split(","):
+        media_type, _, params = entry.strip().partition(";")
+        media_type = media_type.strip().lower()
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        # Exact types win over wildcards of the same quality
+        if media_type in offered:
+            candidate = media_type
+        elif media_type in ("*/*", "application/*"):
+            candidate, quality = offered[0], quality - 0.0001
+        else:
+            continue
+        if quality > best_quality:
+            best, best_quality = candidate, quality
+    return best
+
+
+def trigger_bits(triggers: Optional[Dict[str, bool]]) -> int:
+    if not triggers:
+        return 0
+    bits = 0
+    for bit, name in enumerate(TRIGGERS):
+        if triggers.get(name):
+            bits |= 1 << bit
+    return bits
+
+
+def encode_sample(snapshot: "OBDSnapshot", triggers: Optional[Dict[str, bool]] = None, fatigue_level: Optional[int] = None) -> bytes:
+    rpm, speed, runtime = snapshot.data
+    try:
+        return SAMPLE.pack(SAMPLE_VERSION, snapshot.sequence & 0xFFFFFFFF, snapshot.timestamp, snapshot.accumulated_distance,
+                           rpm, speed, runtime, -1 if fatigue_level is None else fatigue_level, trigger_bits(triggers))
+    except struct.error:
+        # Missing (None), fractional or out of range values: slow path
+        return SAMPLE.pack(SAMPLE_VERSION, snapshot.sequence & 0xFFFFFFFF, snapshot.timestamp, snapshot.accumulated_distance,
+                           _int(rpm, -1, 0x7FFF), _int(speed, -1, 0x7FFF), _int(runtime, -1, 0x7FFFFFFF),
+                           _int(fatigue_level, -1, 0x7F), trigger_bits(triggers))
+
+
+def _int(value, minimum: int, maximum: int) -> int:
+    # Missing values travel as -1, like OBDDataStructure's defaults
+    if value is None:
+        return -1
+    return max(minimum, min(maximum, int(value)))
+
+
+def build_obd_response(snapshot: "OBDSnapshot", thresholds: Optional[Tuple[float, float, float, float]] = None) -> dict:
+    """
+    The /api/obd/data body of a published snapshot
+
+    Args:
+        snapshot (OBDSnapshot): Published sample
+        thresholds (tuple, optional): Speed, distance, time and fatigue thresholds of the
+            worried triggers; without them the body has no 'worried_triggers'
+    """
+    ret_dict = snapshot.data.to_dict()
+    ret_dict['timestamp'] = snapshot.timestamp
+
+    # Add accumulated distance and fatigue data to response
+    ret_dict['accumulated_distance'] = round(snapshot.accumulated_distance, 1)
+    ret_dict['fatigue_level'] = None  # TODO: Implement camera client (0=Not tired, 1=Lightly tired, 2=Heavily tired)
+
+    # Add worried triggers status
+    if thresholds:
+        speed_threshold, distance_threshold, time_threshold, fatigue_threshold = thresholds
+        # A PID the ECU doesn't answer is None, and never exceeds its threshold
+        ret_dict['worried_triggers'] = {
+            'speed_exceeded': ret_dict['speed'] is not None and ret_dict['speed'] > speed_threshold,
+            'distance_exceeded': snapshot.accumulated_distance > distance_threshold,
+            'time_exceeded': ret_dict['runtime'] is not None and ret_dict['runtime'] > time_threshold,
+            'fatigue_exceeded': ret_dict['fatigue_level'] is not None and ret_dict['fatigue_level'] >= fatigue_threshold
+        }
+
+    return ret_dict
+
+
+@functools.lru_cache(maxsize=4096)
+def encode_obd_response(snapshot: "OBDSnapshot", media_type: str, thresholds: Optional[Tuple[float, float, float, float]]) -> bytes:
+    """A snapshot's response body in one of DATA_MEDIA_TYPES; encoded once however many clients read it"""
+    body = build_obd_response(snapshot, thresholds)
+    if media_type == SAMPLE_BINARY:
+        return encode_sample(snapshot, body.get('worried_triggers'), body['fatigue_level'])
+    return json.dumps(body, separators=(',', ':')).encode()
+
+
+def decode_sample(payload: bytes, offset: int = 0) -> Optional[dict]:
+    """A sample record as the JSON route would return it; None for a keep-alive"""
+    version, sequence, timestamp, distance, rpm, speed, runtime, fatigue_level, bits = SAMPLE.unpack_from(payload, offset)
+    if version == 0:
+        return None
+    if version != SAMPLE_VERSION:
+        raise ValueError(f"Unsupported sample format version {version}")
+    return {
+        "rpm": rpm, "speed": speed, "runtime": runtime, "timestamp": timestamp,
+        "accumulated_distance": distance, "fatigue_level": fatigue_level if fatigue_level >= 0 else None,
+        "worried_triggers": {name: bool(bits >> bit & 1) for bit, name in enumerate(TRIGGERS)},
+        "sequence": sequence
+    }
+
+
+def encode_columns(columns: Dict[str, np.ndarray]) -> bytes:
+    """Packs equally long 1-D arrays; other dtypes are widened to float64 or int64"""
+    arrays: List[Tuple[bytes, np.ndarray]] = []
+    rows = None
+    for name, values in columns.items():
+        values = np.asarray(values)
+        if values.dtype.newbyteorder("<").str not in _COLUMN_DTYPES:
+            values = values.astype("<i8" if values.dtype.kind in "iub" else "<f8")
+        values = values.astype(values.dtype.newbyteorder("<"), copy=False)
+        if rows is None:
+            rows = len(values)
+        elif len(values) != rows:
+            raise ValueError(f"Column '{name}' has {len(values)} rows, expected {rows}")
+        arrays.append((name.encode(), values))
+
+    parts = [COLUMNS_HEADER.pack(COLUMNS_MAGIC, COLUMNS_VERSION, len(arrays), rows or 0)]
+    for name, values in arrays:
+        parts += [COLUMN_NAME.pack(len(name)), name, values.dtype.str.encode()]
+    parts += [values.tobytes() for _, values in arrays]
+    return b"".join(parts)
+
+
+def decode_columns(payload: bytes) -> Dict[str, np.ndarray]:
+    magic, version, count, rows = COLUMNS_HEADER.unpack_from(payload)
+    if magic != COLUMNS_MAGIC or version != COLUMNS_VERSION:
+        raise ValueError("Not a version 1 column payload")
+    offset = COLUMNS_HEADER.size
+    layout = []
+    for _ in range(count):
+        (length,) = COLUMN_NAME.unpack_from(payload, offset)
+        offset += COLUMN_NAME.size
+        name = payload[offset:offset + length].decode()
+        dtype = np.dtype(payload[offset + length:offset + length + 3].decode())
+        offset += length + 3
+        layout.append((name, dtype))
+    columns = {}
+    for name, dtype in layout:
+        columns[name] = np.frombuffer(payload, dtype=dtype, count=rows, offset=offset)
+        offset += rows * dtype.itemsize
+    return columns
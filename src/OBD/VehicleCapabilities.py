@@ -0,0 +1,93 @@
+import logging as log
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Iterable, List, Optional
+
+from src.Commons.Serializable import Serializable
+from src.OBD.PIDRequests import decode_pid_response, parse_vin, supported_pids_from_bitmask
+
+# Capability cache, one JSON file per VIN next to config/settings.json
+CAPABILITIES_DIR = "config/vehicles"
+
+# Ranges queried through the "PIDs supported" PIDs 00, 20, 40...
+_SUPPORT_PIDS = range(0x00, 0xE0, 0x20)
+
+
+@dataclass
+class VehicleCapabilities(Serializable):
+    """Service 01 PIDs a vehicle's ECU answers, discovered once and cached per VIN"""
+    vin: str = ""
+    supported_pids: List[str] = field(default_factory=list)
+    discovered_at: float = 0.0
+
+    def __post_init__(self):
+        self._supported = set(pid.upper() for pid in self.supported_pids)
+
+    def supports(self, pid: str) -> bool:
+        return pid.upper() in self._supported
+
+    def filter(self, pids: Iterable[str]) -> List[str]:
+        """Keeps only the PIDs the ECU supports"""
+        return [pid for pid in pids if pid.upper() in self._supported]
+
+    @staticmethod
+    def cache_path(vin: str, cache_dir: str = CAPABILITIES_DIR) -> str:
+        return f"{cache_dir}/{vin}.json"
+
+    @classmethod
+    def load(cls, vin: str, cache_dir: str = CAPABILITIES_DIR) -> Optional["VehicleCapabilities"]:
+        """Cached capabilities of a VIN, None if it was never discovered"""
+        path = cls.cache_path(vin, cache_dir)
+        if not os.path.exists(path):
+            return None
+        capabilities = cls.from_file(path)
+        if capabilities is None or capabilities.vin != vin:
+            return None
+        return capabilities
+
+    def save(self, cache_dir: str = CAPABILITIES_DIR) -> Optional[str]:
+        if not self.vin:
+            return None
+        self.create_dir_if_not_exists(cache_dir + "/")
+        return self.to_file(self.cache_path(self.vin, cache_dir))
+
+    @classmethod
+    async def discover(cls, send_command: Callable[[str], Awaitable[Optional[str]]], cache_dir: Optional[str] = CAPABILITIES_DIR) -> Optional["VehicleCapabilities"]:
+        """
+        Reads the VIN (09 02) and reuses its cached capabilities; otherwise walks the
+        "PIDs supported" bitmasks (01 00, 01 20, ...) and caches the result
+
+        Args:
+            send_command (Callable): The client's send_command
+            cache_dir (str, optional): Cache directory, None to disable caching
+
+        Returns:
+            VehicleCapabilities: None if the ECU doesn't answer PID 00 (support unknown)
+        """
+        vin = parse_vin(await send_command("0902")) or ""
+        if vin and cache_dir:
+            cached = cls.load(vin, cache_dir)
+            if cached is not None:
+                log.info(f"Using cached capabilities for VIN {vin} ({len(cached.supported_pids)} PIDs)")
+                return cached
+
+        supported: List[str] = []
+        for base_pid in _SUPPORT_PIDS:
+            command = f"01{base_pid:02X}"
+            bitmask = decode_pid_response(await send_command(command), command).get(f"{base_pid:02X}")
+            if bitmask is None:
+                if base_pid == 0:
+                    log.warning("ECU did not report its supported PIDs")
+                    return None
+                break
+            supported += supported_pids_from_bitmask(base_pid, bitmask)
+            # The last bit flags whether the next range exists
+            if not bitmask & 1:
+                break
+
+        capabilities = cls(vin, supported, time.time())
+        log.info(f"Discovered {len(supported)} supported PIDs{f' for VIN {vin}' if vin else ''}")
+        if vin and cache_dir:
+            capabilities.save(cache_dir)
+        return capabilities
@@ -0,0 +1,322 @@
+import asyncio
+import logging as log
+import os
+import random
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, TYPE_CHECKING
+
+from src.Commons.Metrics import REGISTRY, MetricsRegistry
+from src.OBD.OBDPoller import OBDPoller
+from src.OBD.TelemetryBroadcaster import TelemetryBroadcaster
+from src.OBD.TelemetryRingBuffer import DEFAULT_HISTORY_SIZE, TelemetryRingBuffer
+from src.Trip.TripRecorder import TripRecorder, read_trip_columns
+from src.Trip.TripStateStore import TripStateStore
+from src.Trip.TripStatistics import TripStatistics
+
+if TYPE_CHECKING:
+    from src.Bluetooth.iBluetoothOBDClient import iBluetoothOBDClient
+
+CONNECT_ATTEMPTS = REGISTRY.counter("obd_connect_attempts", "Find/connect/init sequences run, by result", ("result",))
+
+# A run of failed samples this long is treated as a lost link (a stalled adapter never closes it)
+MAX_FAILED_SAMPLES = 10
+
+
+class ReconnectBackoff(object):
+    """Exponentially growing, jittered delays between reconnection attempts"""
+
+    def __init__(self, initial: float = 0.25, maximum: float = 30.0, factor: float = 2.0, jitter: float = 0.2):
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.jitter = jitter
+        self.attempts = 0
+
+    def next_delay(self) -> float:
+        delay = min(self.maximum, self.initial * self.factor ** self.attempts)
+        self.attempts += 1
+        # Spread the retries of adapters that dropped together
+        return delay * random.uniform(1.0 - self.jitter, 1.0 + self.jitter)
+
+    def reset(self) -> None:
+        self.attempts = 0
+
+
+@dataclass
+class Vehicle:
+    """One OBD adapter: its client, its acquisition task (with trip state), its stream, its history and its trip log"""
+    vehicle_id: str
+    # None for vehicles mirrored from the process that owns their adapter (see SnapshotBus)
+    client: Optional["iBluetoothOBDClient"]
+    poller: OBDPoller
+    broadcaster: TelemetryBroadcaster = field(default_factory=TelemetryBroadcaster)
+    # Streams of binary sample records, fed only while someone subscribes
+    binary_broadcaster: TelemetryBroadcaster = field(default_factory=TelemetryBroadcaster)
+    client_type: str = ""
+    connected: bool = False
+    history: Optional[TelemetryRingBuffer] = None
+    recorder: Optional[TripRecorder] = None
+    trip_state: Optional[TripStateStore] = None
+    trip_id: Optional[str] = None
+    trip_stats: TripStatistics = field(default_factory=TripStatistics)
+    # Keeps the adapter connected: reconnects with backoff after failures and link drops
+    supervisor: Optional[asyncio.Task] = None
+    link_lost: Optional[asyncio.Event] = None
+    reconnects: int = 0
+
+    @property
+    def subscriber_count(self) -> int:
+        return self.broadcaster.subscriber_count + self.binary_broadcaster.subscriber_count
+
+    def to_dict(self) -> dict:
+        snapshot = self.poller.snapshot
+        return {
+            "id": self.vehicle_id,
+            "type": self.client_type,
+            "connected": self.connected,
+            "sample_rate": self.poller.sample_rate,
+            "samples": snapshot.sequence if snapshot is not None else 0,
+            "active": self.poller.active,
+            "history": len(self.history) if self.history is not None else 0,
+            "trip": self.trip_id,
+            "consumers": self.poller.consumers,
+            "subscribers": self.subscriber_count,
+            "reconnects": self.reconnects
+        }
+
+
+class VehicleRegistry(object):
+    """
+    Vehicles served by this gateway, keyed by device ID. Every vehicle is polled by its
+    own asyncio task, so adapters are sampled concurrently on the acquisition loop.
+    Once started, vehicles that failed to connect or lost their link are reconnected
+    in the background with exponential backoff.
+    """
+
+    def __init__(self, backoff_initial: float = 0.25, backoff_max: float = 30.0, max_failed_samples: int = MAX_FAILED_SAMPLES):
+        self._vehicles: Dict[str, Vehicle] = {}
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.max_failed_samples = max_failed_samples
+
+    def __len__(self) -> int:
+        return len(self._vehicles)
+
+    def __iter__(self) -> Iterator[Vehicle]:
+        return iter(list(self._vehicles.values()))
+
+    def __contains__(self, vehicle_id: str) -> bool:
+        return vehicle_id in self._vehicles
+
+    def ids(self) -> List[str]:
+        return list(self._vehicles.keys())
+
+    def get(self, vehicle_id: str) -> Optional[Vehicle]:
+        return self._vehicles.get(vehicle_id)
+
+    def default(self) -> Optional[Vehicle]:
+        """The first registered vehicle, served by the single-vehicle /api/obd routes"""
+        return next(iter(self._vehicles.values()), None)
+
+    def add(self, vehicle_id: str, client: "iBluetoothOBDClient", sample_rate: float = 2.0, client_type: str = "",
+            idle_rate: Optional[float] = None, lease_seconds: float = 10.0, history_size: int = DEFAULT_HISTORY_SIZE,
+            trips_dir: Optional[str] = None) -> Vehicle:
+        if vehicle_id in self._vehicles:
+            raise ValueError(f"Vehicle '{vehicle_id}' is already registered")
+        poller = OBDPoller(client, sample_rate=sample_rate, idle_rate=idle_rate, lease_seconds=lease_seconds)
+        vehicle = Vehicle(vehicle_id, client, poller, client_type=client_type)
+        if history_size > 0:
+            vehicle.history = TelemetryRingBuffer(history_size)
+            poller.add_listener(vehicle.history.append_snapshot)
+        if trips_dir:
+            # Resume the odometer where the last run left it
+            vehicle.trip_state = TripStateStore(os.path.join(trips_dir, vehicle_id))
+            poller.total_distance = vehicle.trip_state.load().distance
+            vehicle.trip_id = vehicle.trip_state.state.trip_id
+            vehicle.recorder = TripRecorder.for_vehicle(vehicle_id, trips_dir, trip_id=vehicle.trip_id, poller=poller)
+            # The statistics of a resumed trip are rebuilt from its log, once
+            columns = read_trip_columns(vehicle.recorder.trip_dir)
+            vehicle.trip_stats.replay(columns["timestamp"], columns["speed"], columns["rpm"])
+            # Before the recorder, so the sample that resets the distance opens the new trip
+            poller.add_listener(self._trip_tracker(vehicle))
+            poller.add_listener(vehicle.recorder.record)
+        poller.add_listener(vehicle.trip_stats.observe)
+        client.on_connection_lost = self._link_lost_handler(vehicle)
+        self._vehicles[vehicle_id] = vehicle
+        return vehicle
+
+    def add_vehicle(self, vehicle: Vehicle) -> Vehicle:
+        """Registers a vehicle built elsewhere, e.g. mirrored from another process"""
+        if vehicle.vehicle_id in self._vehicles:
+            raise ValueError(f"Vehicle '{vehicle.vehicle_id}' is already registered")
+        self._vehicles[vehicle.vehicle_id] = vehicle
+        return vehicle
+
+    @staticmethod
+    def _link_lost_handler(vehicle: Vehicle):
+        def link_lost() -> None:
+            if vehicle.link_lost is not None:
+                vehicle.link_lost.set()
+        return link_lost
+
+    @staticmethod
+    def _trip_tracker(vehicle: Vehicle):
+        def track_trip(snapshot) -> None:
+            if vehicle.trip_state.observe(snapshot):
+                vehicle.trip_id = vehicle.trip_state.state.trip_id
+                vehicle.recorder.switch_trip(vehicle.trip_id)
+        return track_trip
+
+    async def remove(self, vehicle_id: str) -> None:
+        vehicle = self._vehicles.pop(vehicle_id, None)
+        if vehicle is not None:
+            await self._stop_vehicle(vehicle)
+
+    @classmethod
+    async def connect_vehicle(cls, vehicle: Vehicle) -> bool:
+        """Runs the find/connect/init sequence for one vehicle"""
+        connected = await cls._connect(vehicle)
+        CONNECT_ATTEMPTS.labels("ok" if connected else "failed").inc()
+        return connected
+
+    @staticmethod
+    async def _connect(vehicle: Vehicle) -> bool:
+        client = vehicle.client
+        try:
+            if not client.target_address and not await client.find_device():
+                log.error(f"[{vehicle.vehicle_id}] Failed to find device")
+                return False
+
+            if not await client.connect():
+                log.error(f"[{vehicle.vehicle_id}] Failed to connect to device")
+                return False
+
+            if not await client.init_communication():
+                log.error(f"[{vehicle.vehicle_id}] Failed to initialize communication")
+                return False
+        except Exception as e:
+            log.error(f"[{vehicle.vehicle_id}] Error connecting: {e}")
+            return False
+
+        vehicle.connected = True
+        return True
+
+    def register_metrics(self, metrics: MetricsRegistry = REGISTRY) -> None:
+        """Exports the per-vehicle sampling, streaming and trip logging state, read at scrape time"""
+        def per_vehicle(read):
+            return lambda: [((vehicle.vehicle_id,), read(vehicle)) for vehicle in self]
+
+        labels = ("vehicle",)
+        metrics.callback("obd_vehicle_connected", "Whether the vehicle's adapter is connected",
+                         per_vehicle(lambda vehicle: vehicle.connected), labels)
+        metrics.callback("obd_vehicle_active", "Whether the vehicle is sampled at full rate (someone is consuming it)",
+                         per_vehicle(lambda vehicle: vehicle.poller.active), labels)
+        metrics.callback("obd_samples", "Samples published", per_vehicle(lambda vehicle: vehicle.poller.samples),
+                         labels, metric_type="counter")
+        metrics.callback("obd_samples_failed", "Sampling attempts that returned no data",
+                         per_vehicle(lambda vehicle: vehicle.poller.failed_samples), labels, metric_type="counter")
+        metrics.callback("obd_consumers", "Consumers holding a sampling lease (streams, loggers)",
+                         per_vehicle(lambda vehicle: vehicle.poller.consumers), labels)
+        metrics.callback("obd_stream_subscribers", "Open telemetry streams",
+                         per_vehicle(lambda vehicle: vehicle.subscriber_count), labels)
+        metrics.callback("obd_stream_subscribers_dropped", "Telemetry streams dropped for falling behind",
+                         per_vehicle(lambda vehicle: vehicle.broadcaster.dropped + vehicle.binary_broadcaster.dropped), labels, metric_type="counter")
+        metrics.callback("obd_reconnects", "Reconnections started after the adapter link was lost",
+                         per_vehicle(lambda vehicle: vehicle.reconnects), labels, metric_type="counter")
+        metrics.callback("trip_samples_dropped", "Samples the trip log failed to write",
+                         lambda: [((vehicle.vehicle_id,), vehicle.recorder.dropped) for vehicle in self if vehicle.recorder is not None],
+                         labels, metric_type="counter")
+
+    async def connect_all(self) -> Dict[str, bool]:
+        """
+        Connects every vehicle concurrently
+
+        Returns:
+            Dict[str, bool]: Connection result per vehicle ID
+        """
+        vehicles = [vehicle for vehicle in self if not vehicle.connected]
+        results = await asyncio.gather(*(self.connect_vehicle(vehicle) for vehicle in vehicles))
+        return {vehicle.vehicle_id: result for vehicle, result in zip(vehicles, results)}
+
+    def start_all(self) -> None:
+        """Starts the acquisition task of every connected vehicle, and the reconnection supervisor of every vehicle"""
+        loop = asyncio.get_running_loop()
+        for vehicle in self:
+            if vehicle.connected:
+                self._start_vehicle(vehicle)
+            if vehicle.supervisor is None:
+                vehicle.link_lost = asyncio.Event()
+                vehicle.supervisor = loop.create_task(self._supervise(vehicle))
+
+    @staticmethod
+    def _start_vehicle(vehicle: Vehicle) -> None:
+        if vehicle.recorder is not None:
+            vehicle.recorder.start()
+        vehicle.poller.start()
+
+    async def _supervise(self, vehicle: Vehicle) -> None:
+        """Waits for the vehicle's link to drop (or stall) and reconnects it, backing off while it fails"""
+        backoff = ReconnectBackoff(self.backoff_initial, self.backoff_max)
+        if not vehicle.connected:
+            # connect_all just failed for it
+            await asyncio.sleep(backoff.next_delay())
+        while True:
+            if vehicle.connected:
+                await self._wait_link_lost(vehicle)
+                log.warning(f"[{vehicle.vehicle_id}] Link lost, reconnecting")
+                await vehicle.poller.stop()
+                try:
+                    await vehicle.client.close()
+                except Exception as e:
+                    log.error(f"[{vehicle.vehicle_id}] Error closing client: {e}")
+                vehicle.connected = False
+                vehicle.reconnects += 1
+                # Retry straight away: the adapter is usually back already
+                continue
+
+            vehicle.link_lost.clear()
+            if await self.connect_vehicle(vehicle):
+                backoff.reset()
+                vehicle.poller.consecutive_failures = 0
+                self._start_vehicle(vehicle)
+                log.info(f"[{vehicle.vehicle_id}] Connected")
+                continue
+            delay = backoff.next_delay()
+            log.info(f"[{vehicle.vehicle_id}] Retrying connection in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    async def _wait_link_lost(self, vehicle: Vehicle) -> None:
+        while vehicle.poller.consecutive_failures < self.max_failed_samples:
+            try:
+                await asyncio.wait_for(vehicle.link_lost.wait(), 1.0)
+                return
+            except asyncio.TimeoutError:
+                pass
+
+    async def stop_all(self) -> None:
+        """Stops every supervisor and acquisition task, ends open streams and closes every client"""
+        await asyncio.gather(*(self._stop_vehicle(vehicle) for vehicle in self))
+
+    @staticmethod
+    async def _stop_vehicle(vehicle: Vehicle) -> None:
+        if vehicle.supervisor is not None:
+            vehicle.supervisor.cancel()
+            try:
+                await vehicle.supervisor
+            except asyncio.CancelledError:
+                pass
+            vehicle.supervisor = None
+        await vehicle.poller.stop()
+        vehicle.broadcaster.close()
+        vehicle.binary_broadcaster.close()
+        if vehicle.recorder is not None:
+            # Flushing and syncing the last batch blocks, keep it off the loop
+            await asyncio.get_running_loop().run_in_executor(None, vehicle.recorder.close)
+        if vehicle.trip_state is not None:
+            await asyncio.get_running_loop().run_in_executor(None, vehicle.trip_state.close)
+        if vehicle.connected and vehicle.client is not None:
+            try:
+                await vehicle.client.close()
+            except Exception as e:
+                log.error(f"[{vehicle.vehicle_id}] Error closing client: {e}")
+            vehicle.connected = False
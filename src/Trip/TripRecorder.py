@@ -0,0 +1,297 @@
+import logging as log
+import os
+import queue
+import re
+import struct
+import threading
+import time
+import zlib
+from typing import Dict, Iterator, List, NamedTuple, Optional, TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from src.OBD.OBDPoller import OBDPoller, OBDSnapshot
+
+# Trips are stored as <TRIPS_DIR>/<vehicle id>/<trip id>/<segment>.seg
+TRIPS_DIR = "trips"
+
+# Segment layout: SEGMENT_MAGIC, then batches of BATCH_HEADER (record count, CRC32 of
+# the records) followed by that many RECORD structs
+SEGMENT_MAGIC = b"FDTRIP1\n"
+BATCH_HEADER = struct.Struct("<II")
+RECORD = struct.Struct("<diiid")
+# RECORD as a packed NumPy record, to read whole batches as column arrays
+RECORD_DTYPE = np.dtype([("timestamp", "<f8"), ("rpm", "<i4"), ("speed", "<i4"), ("runtime", "<i4"), ("distance", "<f8")])
+SEGMENT_SUFFIX = ".seg"
+OPEN_SEGMENT_SUFFIX = ".seg.part"
+
+_TRIP_ID = re.compile(r"^[\w.-]+$")
+
+
+class TripRecord(NamedTuple):
+    timestamp: float
+    rpm: int
+    speed: int
+    runtime: int
+    distance: float
+
+
+def _pack(timestamp: float, rpm, speed, runtime, distance: float) -> bytes:
+    # Missing values (None) are stored as -1, like OBDDataStructure's defaults
+    return RECORD.pack(timestamp,
+                       int(rpm) if rpm is not None else -1,
+                       int(speed) if speed is not None else -1,
+                       int(runtime) if runtime is not None else -1,
+                       distance)
+
+
+def new_trip_id(timestamp: Optional[float] = None) -> str:
+    return time.strftime("%Y%m%d-%H%M%S", time.localtime(timestamp))
+
+
+def is_valid_trip_id(trip_id: str) -> bool:
+    return bool(_TRIP_ID.match(trip_id)) and trip_id not in (".", "..")
+
+
+def _read_batches(file) -> Iterator[bytes]:
+    """Yields the records of every complete, intact batch; stops at the first torn one"""
+    while True:
+        header = file.read(BATCH_HEADER.size)
+        if len(header) < BATCH_HEADER.size:
+            return
+        count, crc = BATCH_HEADER.unpack(header)
+        payload = file.read(count * RECORD.size)
+        if len(payload) < count * RECORD.size or zlib.crc32(payload) != crc:
+            return
+        yield payload
+
+
+def recover_segment(path: str) -> Optional[str]:
+    """
+    Seals a segment left open by a crash: cuts it after its last intact batch and
+    renames it to its final name
+
+    Returns:
+        str: Path of the sealed segment, None if it held no complete batch
+    """
+    with open(path, "r+b") as file:
+        valid = 0
+        if file.read(len(SEGMENT_MAGIC)) == SEGMENT_MAGIC:
+            valid = file.tell()
+            for _ in _read_batches(file):
+                valid = file.tell()
+        file.truncate(valid)
+
+    if valid <= len(SEGMENT_MAGIC):
+        os.remove(path)
+        return None
+    sealed = path[:-len(OPEN_SEGMENT_SUFFIX)] + SEGMENT_SUFFIX
+    os.replace(path, sealed)
+    log.info(f"Recovered trip segment '{sealed}'")
+    return sealed
+
+
+def recover_trips(vehicle_dir: str) -> None:
+    """Seals the segments every trip of a vehicle left open"""
+    if not os.path.isdir(vehicle_dir):
+        return
+    for trip_id in os.listdir(vehicle_dir):
+        trip_dir = os.path.join(vehicle_dir, trip_id)
+        if os.path.isdir(trip_dir):
+            for name in os.listdir(trip_dir):
+                if name.endswith(OPEN_SEGMENT_SUFFIX):
+                    recover_segment(os.path.join(trip_dir, name))
+
+
+class TripRecorder(object):
+    """
+    Append-only trip log. `record` only queues the sample, so the acquisition loop never
+    waits on the disk; a writer thread packs queued samples into CRC-checked batches and
+    appends them to the current segment every `flush_interval`. Segments are written as
+    `.seg.part` and renamed once full and synced; after a crash the open segment is cut
+    back to its last intact batch, so at most one flush interval of samples is lost.
+
+    Given its poller, the recorder is a consumer like a stream subscriber: it holds a
+    lease from `start` to `close`, so trips are logged at the full sample rate even with
+    no dashboard open.
+    """
+
+    def __init__(self, trip_dir: str, batch_size: int = 256, flush_interval: float = 1.0,
+                 segment_bytes: int = 4 * 1024 * 1024, fsync: bool = True, poller: Optional["OBDPoller"] = None):
+        self.trip_dir = trip_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self.poller = poller
+        self.records = 0
+        self.dropped = 0
+        self._queue: "queue.SimpleQueue[Optional[tuple]]" = queue.SimpleQueue()
+        self._segment_index = 0
+        self._file = None
+        self._path: Optional[str] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def for_vehicle(cls, vehicle_id: str, trips_dir: str = TRIPS_DIR, trip_id: Optional[str] = None, **kwargs) -> "TripRecorder":
+        """Recorder for a new trip of a vehicle, after sealing whatever earlier runs left open"""
+        recover_trips(os.path.join(trips_dir, vehicle_id))
+        return cls(os.path.join(trips_dir, vehicle_id, trip_id or new_trip_id()), **kwargs)
+
+    @property
+    def trip_id(self) -> str:
+        return os.path.basename(self.trip_dir)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """Seals segments a previous run left open and starts the writer thread"""
+        if self.running:
+            return
+        self._resume_trip()
+        self._thread = threading.Thread(target=self._write_loop, name=f"trip-{self.trip_id}", daemon=True)
+        self._thread.start()
+        if self.poller is not None:
+            self.poller.acquire()
+
+    def switch_trip(self, trip_id: str) -> None:
+        """Continues logging into a new trip next to the current one. Samples recorded before stay in the old trip"""
+        self._queue.put(("switch", trip_id))
+
+    def record(self, snapshot: "OBDSnapshot") -> None:
+        """OBDPoller listener. Never blocks"""
+        data = snapshot.data
+        self._queue.put((snapshot.timestamp, data.rpm, data.speed, data.runtime, snapshot.accumulated_distance))
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Writes what is still queued, seals the current segment and stops the writer"""
+        if self._thread is None:
+            return
+        if self.poller is not None:
+            self.poller.release()
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _write_loop(self) -> None:
+        batch: List[tuple] = []
+        deadline = time.monotonic() + self.flush_interval
+        closing = False
+        while not closing:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                if item is None:
+                    closing = True
+                elif item[0] == "switch":
+                    if batch:
+                        self._write_batch(batch)
+                        batch = []
+                    self._seal()
+                    self.trip_dir = os.path.join(os.path.dirname(self.trip_dir), item[1])
+                    self._resume_trip()
+                else:
+                    batch.append(item)
+            except queue.Empty:
+                pass
+
+            if batch and (closing or len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._write_batch(batch)
+                batch = []
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.flush_interval
+        self._seal()
+
+    def _resume_trip(self) -> None:
+        """Seals segments left open in the current trip; new segments go after the existing ones"""
+        os.makedirs(self.trip_dir, exist_ok=True)
+        for name in os.listdir(self.trip_dir):
+            if name.endswith(OPEN_SEGMENT_SUFFIX):
+                recover_segment(os.path.join(self.trip_dir, name))
+        indexes = [int(name[:-len(SEGMENT_SUFFIX)]) for name in os.listdir(self.trip_dir)
+                   if name.endswith(SEGMENT_SUFFIX) and name[:-len(SEGMENT_SUFFIX)].isdigit()]
+        self._segment_index = max(indexes, default=0)
+
+    def _write_batch(self, batch: List[tuple]) -> None:
+        try:
+            payload = b"".join(_pack(*record) for record in batch)
+            if self._file is None:
+                self._open_segment()
+            self._file.write(BATCH_HEADER.pack(len(batch), zlib.crc32(payload)) + payload)
+            self._file.flush()
+            self.records += len(batch)
+            if self._file.tell() >= self.segment_bytes:
+                self._seal()
+        except Exception as e:
+            self.dropped += len(batch)
+            log.error(f"Error writing trip '{self.trip_id}' ({e}), dropped {len(batch)} samples")
+
+    def _open_segment(self) -> None:
+        self._segment_index += 1
+        self._path = os.path.join(self.trip_dir, f"{self._segment_index:06d}{OPEN_SEGMENT_SUFFIX}")
+        self._file = open(self._path, "wb")
+        self._file.write(SEGMENT_MAGIC)
+
+    def _seal(self) -> None:
+        """Syncs the open segment and gives it its final name"""
+        if self._file is None:
+            return
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self._path, self._path[:-len(OPEN_SEGMENT_SUFFIX)] + SEGMENT_SUFFIX)
+        self._file = None
+        self._path = None
+
+
+def list_trips(vehicle_id: str, trips_dir: str = TRIPS_DIR) -> List[str]:
+    """Trip IDs recorded for a vehicle, oldest first"""
+    path = os.path.join(trips_dir, vehicle_id)
+    if not os.path.isdir(path):
+        return []
+    return sorted(name for name in os.listdir(path) if os.path.isdir(os.path.join(path, name)))
+
+
+def read_trip(trip_dir: str) -> Iterator[TripRecord]:
+    """
+    Streams a trip back one batch at a time, including the segment still being written
+
+    Args:
+        trip_dir (str): Directory of the trip
+
+    Returns:
+        Iterator[TripRecord]: Samples, oldest first
+    """
+    if not os.path.isdir(trip_dir):
+        return
+    for payload in _trip_batches(trip_dir):
+        for record in RECORD.iter_unpack(payload):
+            yield TripRecord(*record)
+
+
+def _trip_batches(trip_dir: str) -> Iterator[bytes]:
+    names = sorted(name for name in os.listdir(trip_dir) if name.endswith((SEGMENT_SUFFIX, OPEN_SEGMENT_SUFFIX)))
+    for name in names:
+        with open(os.path.join(trip_dir, name), "rb") as file:
+            if file.read(len(SEGMENT_MAGIC)) != SEGMENT_MAGIC:
+                log.warning(f"Skipping '{name}' in '{trip_dir}': not a trip segment")
+                continue
+            yield from _read_batches(file)
+
+
+def read_trip_columns(trip_dir: str) -> Dict[str, np.ndarray]:
+    """
+    A whole trip as one array per TripRecord field, read batch by batch without
+    unpacking records one at a time
+
+    Args:
+        trip_dir (str): Directory of the trip
+
+    Returns:
+        Dict[str, np.ndarray]: Columns, oldest sample first
+    """
+    payload = b"".join(_trip_batches(trip_dir)) if os.path.isdir(trip_dir) else b""
+    records = np.frombuffer(payload, dtype=RECORD_DTYPE)
+    return {name: np.ascontiguousarray(records[name]) for name in TripRecord._fields}
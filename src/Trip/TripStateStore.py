@@ -0,0 +1,236 @@
+import logging as log
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Optional, TYPE_CHECKING
+
+from src.Commons.Serializable import Serializable
+from src.Trip.TripRecorder import new_trip_id
+
+if TYPE_CHECKING:
+    from src.OBD.OBDPoller import OBDSnapshot
+
+STATE_FILE = "state.json"
+# Journal of the increments since the snapshot of the same generation
+JOURNAL_FILE = "state.{generation}.journal"
+# timestamp, distance increment, ECU runtime, CRC32 of the preceding fields
+JOURNAL_RECORD = struct.Struct("<ddiI")
+_JOURNAL_FIELDS = struct.Struct("<ddi")
+
+
+@dataclass
+class TripState(Serializable):
+    """Odometer of the current trip. ECU runtime restarts with the engine; `runtime_base` keeps earlier engine runs"""
+    trip_id: str = ""
+    started_at: float = 0.0
+    updated_at: float = 0.0
+    distance: float = 0.0
+    runtime_base: int = 0
+    last_runtime: int = 0
+    generation: int = 0
+
+    @property
+    def trip_runtime(self) -> int:
+        return self.runtime_base + self.last_runtime
+
+    def apply(self, timestamp: float, distance_increment: float, runtime: int) -> None:
+        self.distance += distance_increment
+        if 0 <= runtime < self.last_runtime:
+            # The engine was restarted
+            self.runtime_base += self.last_runtime
+        if runtime >= 0:
+            self.last_runtime = runtime
+        self.updated_at = timestamp
+
+
+class TripStateStore(object):
+    """
+    Crash-safe trip state: a small JSON snapshot, checkpointed every `checkpoint_interval`
+    seconds, plus an unbuffered journal of the increments since. Every checkpoint starts a
+    new journal generation, so a crash between writing the snapshot and dropping the old
+    journal never counts an increment twice. Loading is one JSON read and a replay of at
+    most one checkpoint interval of records.
+
+    Once loaded, the state is updated in memory and the journal records and snapshots are
+    queued to a writer thread, in order, so the acquisition loop never waits on a write or
+    an fsync. A crash loses what was still queued, like an unflushed journal.
+    """
+
+    def __init__(self, state_dir: str, checkpoint_interval: float = 60.0):
+        self.state_dir = state_dir
+        self.checkpoint_interval = checkpoint_interval
+        self.state = TripState()
+        self._journal = None
+        self._last_checkpoint = 0.0
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        # Trip IDs started by this store
+        self._trip_ids = set()
+
+    @property
+    def state_path(self) -> str:
+        return os.path.join(self.state_dir, STATE_FILE)
+
+    def journal_path(self, generation: int) -> str:
+        return os.path.join(self.state_dir, JOURNAL_FILE.format(generation=generation))
+
+    def load(self) -> TripState:
+        """Rebuilds the state from the snapshot and its journal, or starts a new trip, and starts the writer thread"""
+        os.makedirs(self.state_dir, exist_ok=True)
+        state = TripState.from_file(self.state_path) if os.path.exists(self.state_path) else None
+        if state is None or not state.trip_id:
+            self.state = TripState(self._unique_trip_id(time.time()), time.time(), time.time())
+            self.checkpoint()
+            self._start_writer()
+            return self.state
+
+        self.state = state
+        self._trip_ids.add(state.trip_id)
+        replayed = 0
+        try:
+            with open(self.journal_path(state.generation), "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            data = b""
+        for offset in range(0, len(data) - JOURNAL_RECORD.size + 1, JOURNAL_RECORD.size):
+            timestamp, increment, runtime, crc = JOURNAL_RECORD.unpack_from(data, offset)
+            if zlib.crc32(data[offset:offset + _JOURNAL_FIELDS.size]) != crc:
+                break   # torn write at the end
+            state.apply(timestamp, increment, runtime)
+            replayed += 1
+
+        log.info(f"Resumed trip {state.trip_id}: {state.distance:.2f} km ({replayed} journal records)")
+        # Fold the journal into a fresh snapshot so the next load is a plain read
+        self.checkpoint()
+        self._start_writer()
+        return self.state
+
+    def checkpoint(self) -> None:
+        """Snapshots the state as a new generation, whose journal the following records go to"""
+        state = self.state
+        state.generation += 1
+        self._submit(("checkpoint", state.generation, state.serialize(compact=True)))
+        self._last_checkpoint = time.monotonic()
+
+    def _write_checkpoint(self, generation: int, serialized: str) -> None:
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w") as file:
+            file.write(serialized)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.state_path)
+
+        if self._journal is not None:
+            self._journal.close()
+        # Unbuffered: a record reaches the OS as soon as it is written
+        self._journal = open(self.journal_path(generation), "wb", buffering=0)
+        for name in os.listdir(self.state_dir):
+            if name.endswith(".journal") and name != os.path.basename(self.journal_path(generation)):
+                os.remove(os.path.join(self.state_dir, name))
+
+    def record(self, timestamp: float, distance_increment: float, runtime: int) -> None:
+        """Applies and journals one increment, checkpointing when the interval has elapsed"""
+        self.state.apply(timestamp, distance_increment, runtime)
+        fields = _JOURNAL_FIELDS.pack(timestamp, distance_increment, runtime)
+        self._submit(("journal", fields + struct.pack("<I", zlib.crc32(fields))))
+        if time.monotonic() - self._last_checkpoint >= self.checkpoint_interval:
+            self.checkpoint()
+
+    def start_trip(self, timestamp: Optional[float] = None) -> TripState:
+        """Starts a new trip from zero"""
+        timestamp = timestamp or time.time()
+        self.state = TripState(self._unique_trip_id(timestamp), timestamp, timestamp, generation=self.state.generation)
+        self.checkpoint()
+        log.info(f"Started trip {self.state.trip_id}")
+        return self.state
+
+    def _unique_trip_id(self, timestamp: float) -> str:
+        """A new trip ID; trips started within the same second get a -2, -3... suffix"""
+        base = trip_id = new_trip_id(timestamp)
+        suffix = 1
+        # The recorder creates a trip's directory on its own thread: also check the IDs handed out
+        while trip_id in self._trip_ids or os.path.exists(os.path.join(self.state_dir, trip_id)):
+            suffix += 1
+            trip_id = f"{base}-{suffix}"
+        self._trip_ids.add(trip_id)
+        return trip_id
+
+    def observe(self, snapshot: "OBDSnapshot") -> bool:
+        """
+        OBDPoller listener: journals the distance and runtime of each snapshot
+
+        Returns:
+            bool: True if the distance was reset, which starts a new trip
+        """
+        runtime = snapshot.data.runtime if snapshot.data.runtime is not None else -1
+        increment = snapshot.accumulated_distance - self.state.distance
+        if increment < 0:
+            self.start_trip(snapshot.timestamp)
+            return True
+        if increment > 0 or (runtime >= 0 and runtime != self.state.last_runtime):
+            self.record(snapshot.timestamp, increment, int(runtime))
+        return False
+
+    def flush(self) -> None:
+        """Waits until everything queued so far is written"""
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Checkpoints, writes what is still queued and stops the writer. Blocks, keep it off the acquisition loop"""
+        if self._thread is None:
+            return
+        self.checkpoint()
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _start_writer(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._write_loop, name=f"trip-state-{os.path.basename(self.state_dir)}", daemon=True)
+            self._thread.start()
+
+    def _submit(self, item: tuple) -> None:
+        if self._thread is None:
+            # Loading, before the writer starts
+            self._write(item)
+        else:
+            self._queue.put(item)
+
+    def _write_loop(self) -> None:
+        while True:
+            item = self._queue.get()
+            taken, records = 1, []
+            # Records queued together go out in one write
+            while item is not None and item[0] == "journal":
+                records.append(item[1])
+                try:
+                    item = self._queue.get_nowait()
+                    taken += 1
+                except queue.Empty:
+                    item = ()
+                    break
+            if records:
+                self._write(("journal", b"".join(records)))
+            if item:
+                self._write(item)
+            for _ in range(taken):
+                self._queue.task_done()
+            if item is None:
+                break
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def _write(self, item: tuple) -> None:
+        try:
+            if item[0] == "journal":
+                self._journal.write(item[1])
+            else:
+                self._write_checkpoint(item[1], item[2])
+        except Exception as e:
+            log.error(f"Error writing trip state in '{self.state_dir}': {e}")
@@ -0,0 +1,261 @@
+import math
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Optional, Sequence, TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from src.OBD.OBDPoller import OBDSnapshot
+
+# Lower bounds (rpm) of the RPM bands whose dwell time is tracked
+RPM_BANDS = (0, 1000, 2000, 3000, 4000, 5000)
+# Samples further apart are a gap (lost link, keep-alive sampling), not time driven
+MAX_GAP_SECONDS = 10.0
+# Slower than this (km/h) is standing still: idle with the engine running, stopped without
+MOVING_SPEED = 1.0
+# Percentile sketches: time-weighted histograms of fixed-width bins spanning the PIDs'
+# ranges (speed 0-255 km/h, RPM 0-16383), so quantiles are exact to within a bin
+SPEED_BIN, SPEED_MAX = 1.0, 255.0
+RPM_BIN, RPM_MAX = 50.0, 16383.0
+PERCENTILES = (0.5, 0.9, 0.95, 0.99)
+
+# State vector: these scalars, then the dwell time per RPM band and the two sketches.
+# The version is odd while an update is in progress.
+(_VERSION, _STARTED, _UPDATED, _SAMPLES, _DURATION, _DISTANCE, _MOVING, _IDLE, _STOPPED, _GAPS, _ABOVE,
+ _MAX_SPEED, _MAX_RPM, _LAST_SPEED, _LAST_RPM, _LAST_DISTANCE, _THRESHOLD) = range(17)
+_SCALARS = 17
+# Summed when merging
+_ADDITIVE = (_SAMPLES, _DURATION, _DISTANCE, _MOVING, _IDLE, _STOPPED, _GAPS, _ABOVE)
+_SPEED_BINS = int(SPEED_MAX // SPEED_BIN) + 1
+_RPM_BINS = int(RPM_MAX // RPM_BIN) + 1
+
+
+class TripStatistics(object):
+    """
+    Running statistics of a trip, updated in O(1) per sample without allocating:
+    trapezoidal distance, moving, idle and stopped time, mean and max speed, time above
+    the speed threshold, dwell time per RPM band and speed/RPM percentiles.
+
+    Everything lives in one float64 vector, so statistics merge by adding vectors (see
+    `merge`, for fleets and multi-trip totals) and can be kept in shared memory. The
+    acquisition loop is the only writer; readers on other threads or processes copy the
+    vector and retry if an update was in progress.
+    """
+
+    def __init__(self, speed_threshold: Optional[float] = None, rpm_bands: Sequence[int] = RPM_BANDS,
+                 max_gap: float = MAX_GAP_SECONDS, buffer=None):
+        """
+        Args:
+            speed_threshold (float, optional): Speed (km/h) time above which is tracked
+            rpm_bands (Sequence[int], optional): Ascending lower bounds of the RPM bands
+            max_gap (float, optional): Longest interval (s) between samples that is integrated
+            buffer (optional): Writable buffer of `buffer_size(rpm_bands)` bytes to keep the state in,
+                as left by statistics of the same bands (zeroed: empty). Defaults to a new one.
+        """
+        self.rpm_bands = tuple(rpm_bands)
+        self.max_gap = max_gap
+        self._bands = slice(_SCALARS, _SCALARS + len(self.rpm_bands))
+        self._speed_sketch = slice(self._bands.stop, self._bands.stop + _SPEED_BINS)
+        self._rpm_sketch = slice(self._speed_sketch.stop, self._speed_sketch.stop + _RPM_BINS)
+        if buffer is None:
+            self._state = np.zeros(self.size(self.rpm_bands), dtype=np.float64)
+            self.reset()
+        else:
+            self._state = np.ndarray(self.size(self.rpm_bands), dtype=np.float64, buffer=buffer)
+        if speed_threshold is not None:
+            self.speed_threshold = speed_threshold
+
+    @staticmethod
+    def size(rpm_bands: Sequence[int] = RPM_BANDS) -> int:
+        return _SCALARS + len(rpm_bands) + _SPEED_BINS + _RPM_BINS
+
+    @classmethod
+    def buffer_size(cls, rpm_bands: Sequence[int] = RPM_BANDS) -> int:
+        return cls.size(rpm_bands) * 8
+
+    def move_to(self, buffer) -> None:
+        """Moves the state to another buffer (see `buffer_size`), e.g. to share it"""
+        state = np.ndarray(len(self._state), dtype=np.float64, buffer=buffer)
+        state[:] = self._state
+        self._state = state
+
+    @property
+    def speed_threshold(self) -> Optional[float]:
+        threshold = float(self._state[_THRESHOLD])
+        return None if math.isnan(threshold) else threshold
+
+    @speed_threshold.setter
+    def speed_threshold(self, value: Optional[float]) -> None:
+        """Applies from the next sample on. Like updates, only from the writer"""
+        state = self._state
+        state[_VERSION] += 1
+        state[_THRESHOLD] = math.nan if value is None else value
+        state[_VERSION] += 1
+
+    def reset(self) -> None:
+        """Starts over, e.g. for a new trip; keeps the speed threshold"""
+        state = self._state
+        threshold = state[_THRESHOLD] if state[_VERSION] else math.nan
+        state[_VERSION] += 1
+        state[_STARTED:] = 0.0
+        state[(_STARTED, _UPDATED, _LAST_SPEED, _LAST_RPM, _THRESHOLD), ] = (math.nan, math.nan, math.nan, math.nan, threshold)
+        state[_VERSION] += 1
+
+    def observe(self, snapshot: "OBDSnapshot") -> None:
+        """OBDPoller listener. A distance reset starts a new trip, and new statistics"""
+        if snapshot.accumulated_distance < self._state[_LAST_DISTANCE]:
+            self.reset()
+        self._state[_LAST_DISTANCE] = snapshot.accumulated_distance
+        data = snapshot.data
+        self.update(snapshot.timestamp, data.speed, data.rpm)
+
+    def update(self, timestamp: float, speed: Optional[float], rpm: Optional[float]) -> None:
+        """
+        Integrates the interval since the previous sample (trapezoidal rule)
+
+        Args:
+            timestamp (float): Sample time (s)
+            speed (float): km/h; None or negative if unknown
+            rpm (float): None or negative if unknown
+        """
+        state = self._state
+        speed = math.nan if speed is None or speed < 0 else float(speed)
+        rpm = math.nan if rpm is None or rpm < 0 else float(rpm)
+        state[_VERSION] += 1
+        state[_SAMPLES] += 1
+        elapsed = timestamp - state[_UPDATED]
+        if elapsed > self.max_gap:
+            state[_GAPS] += elapsed
+        elif elapsed > 0:
+            self._integrate(state, elapsed, speed, rpm)
+        elif elapsed != elapsed:
+            # NaN: the first sample
+            state[_STARTED] = timestamp
+        if not elapsed <= 0:
+            state[_UPDATED] = timestamp
+        if speed > state[_MAX_SPEED]:
+            state[_MAX_SPEED] = speed
+        if rpm > state[_MAX_RPM]:
+            state[_MAX_RPM] = rpm
+        state[_LAST_SPEED] = speed
+        state[_LAST_RPM] = rpm
+        state[_VERSION] += 1
+
+    def _integrate(self, state: np.ndarray, elapsed: float, speed: float, rpm: float) -> None:
+        state[_DURATION] += elapsed
+        previous_speed, previous_rpm = state[_LAST_SPEED], state[_LAST_RPM]
+        mean_rpm = (previous_rpm + rpm) / 2 if previous_rpm == previous_rpm and rpm == rpm else math.nan
+        if previous_speed == previous_speed and speed == speed:
+            mean_speed = (previous_speed + speed) / 2
+            state[_DISTANCE] += mean_speed * elapsed / 3600
+            if mean_speed >= MOVING_SPEED:
+                state[_MOVING] += elapsed
+            elif mean_rpm > 0:
+                state[_IDLE] += elapsed
+            else:
+                state[_STOPPED] += elapsed
+
+            threshold = state[_THRESHOLD]
+            low, high = (previous_speed, speed) if previous_speed <= speed else (speed, previous_speed)
+            if low >= threshold:
+                state[_ABOVE] += elapsed
+            elif high > threshold:
+                # Speed crosses the threshold: the share of the interval spent above it
+                state[_ABOVE] += elapsed * (high - threshold) / (high - low)
+            state[self._speed_sketch.start + min(int(mean_speed / SPEED_BIN), _SPEED_BINS - 1)] += elapsed
+        if mean_rpm == mean_rpm:
+            state[self._bands.start + max(0, bisect_right(self.rpm_bands, mean_rpm) - 1)] += elapsed
+            state[self._rpm_sketch.start + min(int(mean_rpm / RPM_BIN), _RPM_BINS - 1)] += elapsed
+
+    def replay(self, timestamps: Iterable[float], speeds: Iterable[float], rpms: Iterable[float]) -> None:
+        """Rebuilds the statistics of a logged trip, e.g. one resumed after a restart"""
+        for timestamp, speed, rpm in zip(timestamps, speeds, rpms):
+            self.update(float(timestamp), float(speed), float(rpm))
+
+    def state(self) -> np.ndarray:
+        """A consistent copy of the state vector"""
+        state = self._state
+        while True:
+            version = state[_VERSION]
+            if version % 2 == 0:
+                copy = state.copy()
+                if state[_VERSION] == version:
+                    return copy
+
+    @classmethod
+    def merge(cls, statistics: Iterable["TripStatistics"]) -> "TripStatistics":
+        """
+        Statistics of several trips or vehicles together. Time above the speed threshold is
+        each one's own; the merged threshold is only set if they all share it.
+        """
+        statistics = list(statistics)
+        bands = statistics[0].rpm_bands if statistics else RPM_BANDS
+        if any(other.rpm_bands != bands for other in statistics):
+            raise ValueError("Only statistics of the same RPM bands can be merged")
+        merged = cls(rpm_bands=bands)
+        result = merged._state
+        for other in statistics:
+            state = other.state()
+            result[_SCALARS:] += state[_SCALARS:]
+            result[list(_ADDITIVE)] += state[list(_ADDITIVE)]
+            result[_STARTED] = np.fmin(result[_STARTED], state[_STARTED])
+            result[_UPDATED] = np.fmax(result[_UPDATED], state[_UPDATED])
+            result[_MAX_SPEED] = max(result[_MAX_SPEED], state[_MAX_SPEED])
+            result[_MAX_RPM] = max(result[_MAX_RPM], state[_MAX_RPM])
+        thresholds = {other.speed_threshold for other in statistics}
+        merged.speed_threshold = thresholds.pop() if len(thresholds) == 1 else None
+        return merged
+
+    @staticmethod
+    def _quantiles(weights: np.ndarray, width: float, fractions: Sequence[float]) -> List[Optional[float]]:
+        total = weights.sum()
+        if total <= 0:
+            return [None] * len(fractions)
+        cumulative = np.cumsum(weights)
+        result = []
+        for fraction in fractions:
+            target = fraction * total
+            index = min(int(np.searchsorted(cumulative, target, side="left")), len(weights) - 1)
+            before = cumulative[index - 1] if index else 0.0
+            # Spread each bin's time evenly over its width
+            share = (target - before) / weights[index] if weights[index] > 0 else 0.0
+            result.append(round(float((index + share) * width), 1))
+        return result
+
+    def to_dict(self, percentiles: Sequence[float] = PERCENTILES) -> Dict[str, object]:
+        """Summary of the statistics, as served by /api/trip/stats"""
+        state = self.state()
+        started, updated = state[_STARTED], state[_UPDATED]
+        moving, duration, distance = state[_MOVING], state[_DURATION], state[_DISTANCE]
+        threshold = state[_THRESHOLD]
+        bands: List[Dict[str, object]] = []
+        for i, lower in enumerate(self.rpm_bands):
+            upper = self.rpm_bands[i + 1] if i + 1 < len(self.rpm_bands) else None
+            bands.append({"min": lower, "max": upper, "seconds": round(float(state[self._bands][i]), 3)})
+        speed_quantiles = self._quantiles(state[self._speed_sketch], SPEED_BIN, percentiles)
+        rpm_quantiles = self._quantiles(state[self._rpm_sketch], RPM_BIN, percentiles)
+
+        def optional(value: float, digits: int = 3) -> Optional[float]:
+            return None if math.isnan(value) else round(float(value), digits)
+
+        return {
+            "started_at": optional(started, 6),
+            "updated_at": optional(updated, 6),
+            "samples": int(state[_SAMPLES]),
+            "duration": round(float(duration), 3),
+            "distance": round(float(distance), 4),
+            "moving_time": round(float(moving), 3),
+            "idle_time": round(float(state[_IDLE]), 3),
+            "stopped_time": round(float(state[_STOPPED]), 3),
+            "gap_time": round(float(state[_GAPS]), 3),
+            # km/h over the time spent moving, and over the whole trip
+            "mean_moving_speed": round(float(distance / moving * 3600), 2) if moving > 0 else None,
+            "mean_speed": round(float(distance / duration * 3600), 2) if duration > 0 else None,
+            "max_speed": optional(state[_MAX_SPEED], 1) if state[_SAMPLES] else None,
+            "max_rpm": optional(state[_MAX_RPM], 1) if state[_SAMPLES] else None,
+            "speed_threshold": optional(threshold, 1),
+            "time_above_speed_threshold": round(float(state[_ABOVE]), 3),
+            "rpm_bands": bands,
+            "speed_percentiles": {f"p{round(p * 100):d}": value for p, value in zip(percentiles, speed_quantiles)},
+            "rpm_percentiles": {f"p{round(p * 100):d}": value for p, value in zip(percentiles, rpm_quantiles)}
+        }
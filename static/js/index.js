@@ -51,44 +51,75 @@ function updateFaceState(data) {
 let faceDisplay;
 let dataPanel;
 
+// Function to push a telemetry sample to the display
+function renderOBDData(data) {
+    if (data.error) {
+        console.error('OBD Error:', data.error);
+        return;
+    }
+
+    // Calculate display data
+    const time = formatRuntime(data.runtime);
+
+    // Update data panel (face state is handled inside DataPanel)
+    dataPanel.updateData({
+        time: time,
+        speed: data.speed,
+        distance: data.accumulated_distance,
+        fatigue: mapFatigueToStatus(data.fatigue_level)
+    });
+}
+
 // Function to fetch OBD data and update display
 async function updateOBDData() {
     try {
         const response = await fetch('/api/obd/data');
-        const data = await response.json();
-
-        if (data.error) {
-            console.error('OBD Error:', data.error);
-            return;
-        }
-
-        // Calculate display data
-        const time = formatRuntime(data.runtime);
-
-        // Update data panel (face state is handled inside DataPanel)
-        dataPanel.updateData({
-            time: time,
-            speed: data.speed,
-            distance: data.accumulated_distance,
-            fatigue: mapFatigueToStatus(data.fatigue_level)
-        });
-
+        renderOBDData(await response.json());
     } catch (error) {
         console.error('Error fetching OBD data:', error);
     }
 }
 
+// Fall back to polling every second when the live stream is not available
+let pollingTimer = null;
+function startPolling() {
+    if (pollingTimer !== null) return;
+    pollingTimer = setInterval(updateOBDData, 1000);
+    updateOBDData();
+}
+
+// Subscribe to server-pushed samples (one message per new sample)
+function startStream() {
+    if (!window.EventSource) {
+        startPolling();
+        return;
+    }
+
+    const source = new EventSource('/api/obd/stream');
+    source.onmessage = (event) => {
+        try {
+            renderOBDData(JSON.parse(event.data));
+        } catch (error) {
+            console.error('Error parsing OBD stream data:', error);
+        }
+    };
+    source.onerror = () => {
+        // EventSource reconnects by itself unless the server refused the stream
+        if (source.readyState === EventSource.CLOSED) {
+            console.warn('OBD stream closed, falling back to polling');
+            startPolling();
+        }
+    };
+}
+
 // Wait for DOM to be fully loaded
 document.addEventListener('DOMContentLoaded', () => {
     // Initialize components
     faceDisplay = new FaceDisplay('face-container');
     dataPanel = new DataPanel('data-container', faceDisplay);
 
-    // Update data every second
-    setInterval(updateOBDData, 1000);
-
-    // Initial update
-    updateOBDData();
+    // Receive live updates as they are sampled
+    startStream();
 });
 
 //# sourceMappingURL=index.js.map 
\ No newline at end of file
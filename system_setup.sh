@@ -49,7 +49,7 @@ echo "Upgrading pip..."
 echo "Installing Python packages..."
 "$VENV_PIP" install -r requirements.txt
 
-echo "Installing PyBluez..."
-"$VENV_PIP" install git+https://github.com/pybluez/pybluez.git
+echo "Installing Bluetooth adapter packages (PyBluez)..."
+"$VENV_PIP" install -r requirements-bluetooth.txt
 
 echo "Setup complete!" 
\ No newline at end of file
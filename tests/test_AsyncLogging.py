@@ -0,0 +1,108 @@
+import io
+import json
+import logging as log
+import queue
+import unittest
+
+from src.Commons.AsyncLogging import AsyncLogging, JSONLinesFormatter, NonBlockingQueueHandler, RateLimitFilter, TextFormatter
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_record(message: str = "sample %d", args: tuple = (1,), level: int = log.INFO, lineno: int = 10) -> log.LogRecord:
+    return log.LogRecord("test", level, "/src/module.py", lineno, message, args, None)
+
+
+class TestRateLimitFilter(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limit = RateLimitFilter(rate=2.0, burst=3, clock=self.clock)
+
+    def test_burst_then_suppressed(self):
+        passed = [self.limit.filter(make_record()) for _ in range(5)]
+        self.assertEqual(passed, [True, True, True, False, False])
+        self.assertEqual(self.limit.suppressed, 2)
+
+    def test_next_record_reports_suppressed(self):
+        for _ in range(5):
+            self.limit.filter(make_record())
+        self.clock.now = 0.5
+        record = make_record()
+        self.assertTrue(self.limit.filter(record))
+        self.assertEqual(record.suppressed, 2)
+        self.assertIn("(+2 similar suppressed)", TextFormatter("%(message)s").format(record))
+
+    def test_call_sites_are_independent(self):
+        for _ in range(4):
+            self.limit.filter(make_record(lineno=10))
+        self.assertTrue(self.limit.filter(make_record(lineno=11)))
+
+    def test_exempt_level_always_passes(self):
+        for _ in range(10):
+            self.assertTrue(self.limit.filter(make_record(level=log.CRITICAL)))
+        self.assertEqual(self.limit.suppressed, 0)
+
+
+class TestFormattersAndHandler(unittest.TestCase):
+    def test_json_lines(self):
+        record = make_record()
+        record.suppressed = 4
+        entry = json.loads(JSONLinesFormatter().format(record))
+        self.assertEqual(entry["message"], "sample 1")
+        self.assertEqual(entry["level"], "INFO")
+        self.assertEqual(entry["line"], 10)
+        self.assertEqual(entry["suppressed"], 4)
+
+    def test_full_queue_drops(self):
+        handler = NonBlockingQueueHandler(queue.Queue(2))
+        for _ in range(5):
+            handler.handle(make_record())
+        self.assertEqual(handler.queue.qsize(), 2)
+        self.assertEqual(handler.dropped, 3)
+
+    def test_formatting_is_deferred(self):
+        handler = NonBlockingQueueHandler(queue.Queue(1))
+        handler.handle(make_record())
+        record = handler.queue.get_nowait()
+        self.assertEqual(record.msg, "sample %d")
+        self.assertEqual(record.args, (1,))
+
+
+class TestAsyncLoggingSetup(unittest.TestCase):
+    def setUp(self):
+        root = log.getLogger()
+        self.saved = (list(root.handlers), root.level)
+
+    def tearDown(self):
+        AsyncLogging.shutdown()
+        root = log.getLogger()
+        root.handlers[:] = self.saved[0]
+        root.setLevel(self.saved[1])
+
+    def test_setup_writes_through_listener(self):
+        output = io.StringIO()
+        AsyncLogging.setup("DEBUG", fmt="json", stream=output, rate=0)
+        log.getLogger("probe").debug("value %s", 42)
+        AsyncLogging.shutdown()
+        entry = json.loads(output.getvalue().splitlines()[-1])
+        self.assertEqual(entry["message"], "value 42")
+        self.assertEqual(entry["logger"], "probe")
+        self.assertEqual(AsyncLogging.dropped(), 0)
+
+    def test_rate_limit_counts(self):
+        output = io.StringIO()
+        AsyncLogging.setup("INFO", asynchronous=False, stream=output, rate=1.0, burst=2)
+        for _ in range(6):
+            log.getLogger("probe").info("flood")
+        self.assertEqual(output.getvalue().count("flood"), 2)
+        self.assertEqual(AsyncLogging.suppressed(), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
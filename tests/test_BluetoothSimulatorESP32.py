@@ -0,0 +1,56 @@
+import os
+import tempfile
+from unittest import IsolatedAsyncioTestCase
+
+from src.Bluetooth.BluetoothSimulatorESP32 import BluetoothSimulatorESP32
+from src.OBD.ELM327Emulator import ELM327Emulator, serve_tcp
+from src.Settings import Device, Settings
+
+
+class CachedAddressTests(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.settings_path = os.path.join(self.directory.name, "settings.json")
+        self.client = BluetoothSimulatorESP32()
+        self.client.settings_path = self.settings_path
+        self.client.capabilities_dir = None
+        self.discoveries = 0
+
+        async def discover():
+            self.discoveries += 1
+            return False
+        self.client._discover = discover
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    async def test_cached_address_skips_discovery(self):
+        server = await serve_tcp(ELM327Emulator(), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        Settings(Device(self.client.target_name, f"tcp://127.0.0.1:{port}")).to_file(self.settings_path)
+        try:
+            self.assertTrue(await self.client.find_device())
+            self.assertTrue(await self.client.connect())
+            self.assertTrue(await self.client.init_communication())
+        finally:
+            await self.client.close()
+            server.close()
+            await server.wait_closed()
+        self.assertEqual(self.discoveries, 0)
+
+    async def test_unreachable_cached_address_falls_back_to_discovery(self):
+        Settings(Device(self.client.target_name, "tcp://127.0.0.1:1")).to_file(self.settings_path)
+        self.assertTrue(await self.client.find_device())
+        self.assertFalse(await self.client.connect())
+        self.assertEqual(self.discoveries, 1)
+
+    async def test_address_of_another_adapter_is_ignored(self):
+        Settings(Device("Some other adapter", "tcp://127.0.0.1:1")).to_file(self.settings_path)
+        self.assertFalse(await self.client.find_device())
+        self.assertEqual(self.discoveries, 1)
+
+    def test_discovered_address_is_saved(self):
+        self.client._cache_address("00:11:22:AA:BB:CC")
+        settings = Settings.from_file(self.settings_path)
+        self.assertEqual((settings.device.name, settings.device.address), (self.client.target_name, "00:11:22:AA:BB:CC"))
+        self.assertEqual(self.client._cached_address(), "00:11:22:AA:BB:CC")
@@ -0,0 +1,62 @@
+import asyncio
+import os
+import tempfile
+import time
+from unittest import IsolatedAsyncioTestCase
+
+from src.OBD.ELM327Capture import ELM327Capture, ELM327Replay, load_capture
+from src.OBD.ELM327Connection import ELM327Connection
+from src.OBD.PIDRequests import decode_pid_response
+
+SAMPLE_CAPTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".res", "captures", "sample_drive.jsonl")
+
+
+class ELM327CaptureTests(IsolatedAsyncioTestCase):
+    async def test_captured_traffic_replays_identically(self):
+        responses = {"010D": ["41 0D 32", "41 0D 33"], "010C": ["41 0C 1A F8"]}
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "capture.jsonl")
+            capture = ELM327Capture(path)
+
+            def adapter(data: bytes) -> None:
+                frame = responses[data.decode().strip()].pop(0).encode() + b"\r\r>"
+                loop = asyncio.get_running_loop()
+                loop.call_later(0.01, elm.data_received, frame[:4])
+                loop.call_later(0.02, elm.data_received, frame[4:])
+
+            elm = ELM327Connection(adapter, capture=capture)
+            live = [await elm.send_command(command) for command in ("010D", "010C", "010D")]
+            capture.close()
+
+            started, exchanges = load_capture(path)
+            self.assertEqual([exchange.command for exchange in exchanges], ["010D", "010C", "010D"])
+            self.assertEqual(len(exchanges[0].chunks), 2)
+
+            replay = ELM327Replay(exchanges, started, speed=0)
+            elm = ELM327Connection(replay.write)
+            replay.attach(elm)
+            replayed = [await elm.send_command(command) for command in ("010D", "010C", "010D")]
+
+        self.assertEqual(replayed, live)
+        self.assertEqual(live, ["41 0D 32", "41 0C 1A F8", "41 0D 33"])
+        self.assertEqual(await elm.send_command("0105"), "?")
+
+    async def test_replay_speed_scales_latency_but_not_the_clock(self):
+        started, exchanges = load_capture(SAMPLE_CAPTURE)
+        clocks = {}
+        for speed in (0, 10):
+            replay = ELM327Replay(exchanges, started, speed=speed)
+            elm = ELM327Connection(replay.write)
+            replay.attach(elm)
+
+            begin = time.perf_counter()
+            for _ in range(5):
+                response = await elm.send_command("010C0D1F")
+            elapsed = time.perf_counter() - begin
+            clocks[speed] = replay.clock()
+
+            self.assertIn("0D", decode_pid_response(response, "010C0D1F"))
+            # 5 x 60 ms captured latency
+            self.assertLess(elapsed, 0.02 if speed == 0 else 0.1)
+
+        self.assertEqual(clocks[0], clocks[10])
@@ -0,0 +1,83 @@
+import asyncio
+import time
+from unittest import IsolatedAsyncioTestCase
+
+from src.OBD.ELM327Connection import ELM327Connection, ELM327Error
+
+
+class FakeAdapter(object):
+    """Answers every command after `latency` seconds, in chunks like a serial link"""
+    def __init__(self, responses: dict, latency: float = 0.0):
+        self.responses = responses
+        self.latency = latency
+        self.written = []
+        self.elm = ELM327Connection(self.write, default_timeout=0.5)
+
+    def write(self, data: bytes) -> None:
+        self.written.append(data)
+        command = data.decode().strip()
+        if command in self.responses:
+            loop = asyncio.get_running_loop()
+            frame = self.responses[command].encode() + b"\r\r>"
+            loop.call_later(self.latency, self.elm.data_received, frame[:3])
+            loop.call_later(self.latency, self.elm.data_received, frame[3:])
+
+
+class ELM327ConnectionTests(IsolatedAsyncioTestCase):
+    async def test_response_resolves_on_prompt(self):
+        adapter = FakeAdapter({"010D": "SEARCHING...\r41 0D 32"})
+        start = time.perf_counter()
+        response = await adapter.elm.send_command("010D")
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(response, "41 0D 32")
+        self.assertEqual(adapter.written, [b"010D\r"])
+        # No fixed 100 ms floor anymore
+        self.assertLess(elapsed, 0.05)
+
+    async def test_commands_are_serialized(self):
+        adapter = FakeAdapter({"010C": "41 0C 1A F8", "010D": "41 0D 32"}, latency=0.01)
+        rpm, speed = await asyncio.gather(
+            adapter.elm.send_command("010C"),
+            adapter.elm.send_command("010D")
+        )
+        self.assertEqual(rpm, "41 0C 1A F8")
+        self.assertEqual(speed, "41 0D 32")
+
+    async def test_late_response_does_not_answer_next_command(self):
+        adapter = FakeAdapter({"010C": "41 0C 1A F8", "010D": "41 0D 32"}, latency=0.1)
+        with self.assertRaises(asyncio.TimeoutError):
+            await adapter.elm.send_command("010C", timeout=0.05)
+
+        await asyncio.sleep(0.06)  # the late RPM frame arrives now
+        adapter.latency = 0
+        self.assertEqual(await adapter.elm.send_command("010D"), "41 0D 32")
+
+    async def test_cancellation_frees_the_link(self):
+        adapter = FakeAdapter({"010D": "41 0D 32"}, latency=0.05)
+        task = asyncio.ensure_future(adapter.elm.send_command("010D"))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+
+        await asyncio.sleep(0.06)
+        self.assertEqual(adapter.elm.pending_count, 0)
+
+    async def test_connection_lost_fails_pending(self):
+        adapter = FakeAdapter({})
+        task = asyncio.ensure_future(adapter.elm.send_command("010D"))
+        await asyncio.sleep(0)
+        adapter.elm.connection_lost(OSError("gone"))
+        with self.assertRaises(ELM327Error):
+            await task
+
+    async def test_pipelined_commands_are_written_back_to_back(self):
+        adapter = FakeAdapter({"010C": "41 0C 1A F8", "010D": "41 0D 32"}, latency=0.02)
+        adapter.elm.set_pipeline_depth(2)
+
+        task = asyncio.ensure_future(adapter.elm.send_commands(["010C", "010D"]))
+        await asyncio.sleep(0.005)
+        # Both written before the first prompt arrived
+        self.assertEqual(adapter.written, [b"010C\r", b"010D\r"])
+        self.assertEqual(await task, ["41 0C 1A F8", "41 0D 32"])
@@ -0,0 +1,74 @@
+import asyncio
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+from src.OBD.ELM327Connection import ELM327Connection
+from src.OBD.ELM327Emulator import EmulatedVehicle, ELM327Emulator, serve_pty, serve_tcp
+from src.OBD.ELM327Transport import RFCOMMTransport, SerialTransport, TCPTransport, transport_from_address
+from src.OBD.PIDRequests import decode_pid_response
+from src.OBD.VehicleCapabilities import VehicleCapabilities
+
+
+class ELM327TransportTests(IsolatedAsyncioTestCase):
+    async def _query(self, transport, elm):
+        await transport.open(elm.data_received, elm.connection_lost)
+        try:
+            self.assertIn("ELM327", await elm.send_command("ATZ"))
+            self.assertEqual(await elm.send_command("ATE0"), "OK")
+            return await elm.send_command("010C0D1F")
+        finally:
+            await transport.close()
+
+    async def test_tcp_transport_reaches_emulator(self):
+        emulator = ELM327Emulator(latency=0.005, jitter=0.002, seed=1)
+        server = await serve_tcp(emulator, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            transport = TCPTransport("127.0.0.1", port)
+            response = await self._query(transport, ELM327Connection(transport.write))
+        finally:
+            server.close()
+            await server.wait_closed()
+
+        values = decode_pid_response(response, "010C0D1F")
+        self.assertEqual(set(values), {"0C", "0D", "1F"})
+        self.assertTrue(5 <= values["0D"] <= 115)
+
+    async def test_serial_transport_reaches_emulator_on_pty(self):
+        path = serve_pty(ELM327Emulator(latency=0.005))
+        transport = SerialTransport(path)
+        response = await self._query(transport, ELM327Connection(transport.write))
+        self.assertIn("0D", decode_pid_response(response, "010C0D1F"))
+
+    async def test_pipelined_commands_answered_in_order(self):
+        emulator = ELM327Emulator(latency=0.005, jitter=0.004, seed=2, stn=True)
+        server = await serve_tcp(emulator, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        transport = TCPTransport("127.0.0.1", port)
+        elm = ELM327Connection(transport.write, pipeline_depth=4)
+        await transport.open(elm.data_received, elm.connection_lost)
+        try:
+            await elm.send_command("ATE0")
+            responses = await elm.send_commands(["010D", "STI", "010C"])
+            capabilities = await VehicleCapabilities.discover(elm.send_command, None)
+        finally:
+            await transport.close()
+            server.close()
+            await server.wait_closed()
+
+        self.assertTrue(responses[0].startswith("41 0D"))
+        self.assertEqual(responses[1], "STN1110 v4.2.0")
+        self.assertTrue(responses[2].startswith("41 0C"))
+        self.assertEqual(capabilities.vin, emulator.vin)
+        self.assertTrue(set(EmulatedVehicle.supported_pids()) <= set(capabilities.supported_pids))
+
+
+class TransportAddressTests(TestCase):
+    def test_addresses(self):
+        self.assertIsInstance(transport_from_address("00:11:22:AA:BB:CC"), RFCOMMTransport)
+        self.assertEqual(transport_from_address("rfcomm://00:11:22:AA:BB:CC/3").channel, 3)
+        tcp = transport_from_address("tcp://192.168.0.10:35000")
+        self.assertEqual((tcp.host, tcp.port), ("192.168.0.10", 35000))
+        self.assertEqual(transport_from_address("/dev/ttyUSB0").path, "/dev/ttyUSB0")
+        self.assertEqual(transport_from_address("serial:///dev/ttyUSB0?baud=115200").baudrate, 115200)
+        with self.assertRaises(ValueError):
+            transport_from_address("OBD-II Simulator")
@@ -0,0 +1,79 @@
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+import numpy as np
+
+from src.Bluetooth.BluetoothFleetSimulator import BluetoothFleetSimulator
+from src.OBD.FleetSimulator import IDLE_RPM, MAX_RPM, FleetSimulator
+from src.OBD.PIDRequests import decode_pid_response
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def drive(seed: int, seconds: float = 600.0, size: int = 200) -> FleetSimulator:
+    clock = FakeClock()
+    fleet = FleetSimulator(size, seed=seed, tick=0.5, clock=clock)
+    for _ in range(int(seconds)):
+        clock.now += 1.0
+        fleet.advance()
+    return fleet
+
+
+class FleetSimulatorTests(TestCase):
+    def test_same_seed_same_drive(self):
+        first, second = drive(7), drive(7)
+        np.testing.assert_array_equal(first.speed, second.speed)
+        np.testing.assert_array_equal(first.rpm, second.rpm)
+        self.assertFalse(np.array_equal(first.speed, drive(8).speed))
+
+    def test_values_are_plausible(self):
+        fleet = drive(1)
+        self.assertEqual(fleet.steps, 1200)
+        self.assertTrue(np.all(fleet.speed >= 0) and np.all(fleet.speed < 180))
+        self.assertTrue(np.all(fleet.rpm >= IDLE_RPM - 50) and np.all(fleet.rpm <= MAX_RPM))
+        np.testing.assert_allclose(fleet.runtime, 600.0)
+        # Some cars are moving, and some are waiting at a stop
+        self.assertGreater(np.count_nonzero(fleet.speed > 20), 50)
+        self.assertGreater(np.count_nonzero(fleet.target_speed == 0), 0)
+
+    def test_rpm_follows_speed(self):
+        fleet = drive(3)
+        stopped = fleet.speed < 1
+        cruising = (fleet.speed > 40) & (np.abs(fleet.speed - fleet.target_speed) < 5)
+        self.assertTrue(np.all(fleet.rpm[stopped] < IDLE_RPM + 100))
+        self.assertTrue(np.all(fleet.rpm[cruising] > 1200))
+
+    def test_readers_at_the_same_time_share_one_step(self):
+        clock = FakeClock()
+        fleet = FleetSimulator(1000, clock=clock, tick=0.5)
+        clock.now = 0.5
+        values = [fleet.values(index) for index in range(fleet.size)]
+        self.assertEqual(fleet.steps, 1)
+        self.assertEqual(len(values), 1000)
+        # A long pause is caught up in a bounded number of steps
+        clock.now = 3600.0
+        fleet.advance()
+        self.assertLessEqual(fleet.steps, 62)
+        np.testing.assert_allclose(fleet.runtime, 3600.0)
+
+
+class BluetoothFleetSimulatorTests(IsolatedAsyncioTestCase):
+    async def test_client_reads_its_vehicle(self):
+        clock = FakeClock()
+        fleet = FleetSimulator(10, seed=4, clock=clock)
+        clock.now = 120.0
+        client = BluetoothFleetSimulator(fleet, 3)
+        self.assertTrue(await client.connect() and await client.init_communication())
+
+        data = await client.request_all_settings()
+        self.assertEqual((data.rpm, data.speed, data.runtime), fleet.values(3))
+        values = decode_pid_response(await client.send_command("010C0D1F"), "010C0D1F")
+        self.assertEqual((int(values["0C"]), values["0D"], values["1F"]), fleet.values(3))
+        self.assertEqual(await client.request_pids(["0D", "05"]), {"0D": data.speed})
+        with self.assertRaises(ValueError):
+            BluetoothFleetSimulator(fleet, 10)
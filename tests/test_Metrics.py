@@ -0,0 +1,65 @@
+import threading
+from unittest import TestCase
+
+from src.Commons.Metrics import MetricsRegistry
+
+
+class MetricsTests(TestCase):
+    def test_counter_increments_from_many_threads_add_up(self):
+        metrics = MetricsRegistry()
+        counter = metrics.counter("events", "Events", ("kind",))
+
+        def work():
+            child = counter.labels("a")
+            for _ in range(10000):
+                child.inc()
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(counter.labels("a").value, 80000)
+        self.assertIn('events_total{kind="a"} 80000', metrics.render())
+
+    def test_cells_of_finished_threads_are_retired(self):
+        metrics = MetricsRegistry()
+        histogram = metrics.histogram("request_seconds", "Latency", ("route",), buckets=(0.1, 1.0))
+
+        # One thread per request, like the threaded dev server
+        for _ in range(500):
+            thread = threading.Thread(target=lambda: histogram.labels("/api/obd/data").observe(0.05))
+            thread.start()
+            thread.join()
+        child = histogram.labels("/api/obd/data")
+        self.assertLessEqual(len(child._shards), 1)
+        self.assertIn('request_seconds_count{route="/api/obd/data"} 500', metrics.render())
+
+    def test_histogram_buckets_are_cumulative(self):
+        metrics = MetricsRegistry()
+        histogram = metrics.histogram("rtt_seconds", "RTT", buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value)
+        text = metrics.render()
+        self.assertIn('rtt_seconds_bucket{le="0.1"} 2', text)
+        self.assertIn('rtt_seconds_bucket{le="1"} 3', text)
+        self.assertIn('rtt_seconds_bucket{le="+Inf"} 4', text)
+        self.assertIn("rtt_seconds_count 4", text)
+        self.assertIn("rtt_seconds_sum 2.65", text)
+        self.assertIn("# TYPE rtt_seconds histogram", text)
+
+    def test_callbacks_are_read_at_scrape_time(self):
+        metrics = MetricsRegistry()
+        subscribers = {"car \"1\"": 2}
+        metrics.callback("subscribers", "Subscribers", lambda: [((name,), count) for name, count in subscribers.items()], ("vehicle",))
+        metrics.callback("connected", "Connected", lambda: True)
+        subscribers["car \"1\""] = 3
+        text = metrics.render()
+        self.assertIn('subscribers{vehicle="car \\"1\\""} 3', text)
+        self.assertIn("connected 1", text)
+
+    def test_registration_is_idempotent(self):
+        metrics = MetricsRegistry()
+        self.assertIs(metrics.counter("events", "Events"), metrics.counter("events", "Events"))
+        with self.assertRaises(ValueError):
+            metrics.histogram("events", "Events")
@@ -0,0 +1,38 @@
+import subprocess
+import sys
+from unittest import TestCase
+
+from src.Bluetooth.OBDClientBackends import backend_names, create_client, load_backend
+
+
+class OBDClientBackendsTests(TestCase):
+    def test_mock_backend_does_not_load_bluetooth_libraries(self):
+        code = ("import sys\n"
+                "from src.Bluetooth.OBDClientBackends import create_client\n"
+                "client = create_client('mock')\n"
+                "print(type(client).__name__, [name for name in ('bluetooth', 'bleak', 'obd') if name in sys.modules])\n")
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.strip(), "BluetoothMockSimulator []")
+
+    def test_mock_and_fleet_vehicles_do_not_load_bluetooth_libraries(self):
+        # What app.py does for --obd mock and --fleet
+        code = ("import sys\n"
+                "from src.Bluetooth.BluetoothFleetSimulator import BluetoothFleetSimulator\n"
+                "from src.Bluetooth.OBDClientBackends import create_client\n"
+                "from src.OBD.FleetSimulator import FleetSimulator\n"
+                "from src.OBD.VehicleRegistry import VehicleRegistry\n"
+                "registry = VehicleRegistry()\n"
+                "registry.add('mock', create_client('mock'), client_type='mock')\n"
+                "registry.add('fleet0000', BluetoothFleetSimulator(FleetSimulator(1, seed=1), 0), client_type='fleet')\n"
+                "print(len(registry), sorted(name for name in sys.modules if name.split('.')[0] in ('bluetooth', 'bleak', 'obd')))\n")
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.strip(), "2 []")
+
+    def test_backends_are_loaded_once(self):
+        self.assertIs(load_backend("mock"), load_backend("mock"))
+        self.assertIs(load_backend("esp32"), load_backend("replay"))
+        self.assertEqual(backend_names(), ["mock", "esp32", "replay"])
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            create_client("obdlink")
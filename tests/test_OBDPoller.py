@@ -0,0 +1,73 @@
+import asyncio
+from unittest import IsolatedAsyncioTestCase
+
+from src.OBD.OBDDataStructure import OBDDataStructure
+from src.OBD.OBDPoller import OBDPoller
+
+
+class FakeOBDClient(object):
+    """Counts requests and always reports the same sample"""
+    def __init__(self, speed: int = 36):
+        self.speed = speed
+        self.requests = 0
+
+    async def request_all_settings(self):
+        self.requests += 1
+        return OBDDataStructure(1500, self.speed, self.requests)
+
+
+class OBDPollerTests(IsolatedAsyncioTestCase):
+    async def test_snapshot_is_published(self):
+        poller = OBDPoller(FakeOBDClient())
+        self.assertIsNone(poller.snapshot)
+
+        snapshot = await poller.sample_once()
+        self.assertIs(poller.snapshot, snapshot)
+        self.assertEqual(snapshot.data.rpm, 1500)
+        self.assertEqual(snapshot.sequence, 1)
+
+    async def test_distance_accumulates_between_samples(self):
+        poller = OBDPoller(FakeOBDClient(speed=3600))
+        await poller.sample_once()
+        poller.last_sample_time -= 1.0  # pretend one second went by
+        snapshot = await poller.sample_once()
+        self.assertAlmostEqual(snapshot.accumulated_distance, 1.0, places=2)
+
+        poller.reset_distance()
+        self.assertEqual(poller.snapshot.accumulated_distance, 0.0)
+
+    async def test_background_task_samples_at_rate(self):
+        client = FakeOBDClient()
+        poller = OBDPoller(client, sample_rate=50)
+        poller.start()
+        await asyncio.sleep(0.2)
+        await poller.stop()
+
+        self.assertFalse(poller.running)
+        self.assertGreater(client.requests, 3)
+        self.assertLess(client.requests, 20)
+
+    def test_invalid_rate(self):
+        with self.assertRaises(ValueError):
+            OBDPoller(FakeOBDClient(), sample_rate=0)
+
+    async def test_idles_without_consumers_and_wakes_on_demand(self):
+        client = FakeOBDClient()
+        poller = OBDPoller(client, sample_rate=50, idle_rate=1, lease_seconds=0.1)
+        poller.start()
+        await asyncio.sleep(0.3)
+        idle_requests = client.requests
+        self.assertLessEqual(idle_requests, 2)
+
+        poller.acquire()
+        await asyncio.sleep(0.01)
+        # Woken up right away, not after the keep-alive period
+        self.assertGreater(client.requests, idle_requests)
+        await asyncio.sleep(0.2)
+        self.assertGreater(client.requests, idle_requests + 3)
+
+        poller.release()
+        self.assertTrue(poller.active)  # still within the lease window
+        await asyncio.sleep(0.2)
+        self.assertFalse(poller.active)
+        await poller.stop()
@@ -0,0 +1,46 @@
+from unittest import TestCase
+
+from src.OBD.PIDDecoder import PIDDecoderRegistry, PIDDefinition, compile_formula
+from src.OBD.PIDRequests import decode_pid_response
+
+
+class PIDDecoderTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.registry = PIDDecoderRegistry.load()
+
+    def test_registry_is_built_from_resources(self):
+        self.assertEqual(self.registry.get("01", "0C").data_len, 2)
+        self.assertEqual(self.registry.get("01", "0c").name, "rpm")
+        self.assertEqual(self.registry.get("09", "02").name, "vin")
+        self.assertEqual(len(self.registry.definitions("01")), 140)
+
+    def test_formulas(self):
+        self.assertEqual(self.registry.decode("01", "0C", b"\x1a\xf8"), 1726)
+        self.assertEqual(self.registry.decode("01", "0D", b"\x32"), 50)
+        self.assertEqual(self.registry.decode("01", "05", b"\x00"), -40)
+        self.assertAlmostEqual(self.registry.decode("01", "42", b"\x30\x39"), 12.345)
+        # Without formula: raw big endian integer
+        self.assertEqual(self.registry.decode("01", "00", b"\xbe\x1f\xa8\x13"), 0xBE1FA813)
+
+    def test_unsafe_formula_is_rejected(self):
+        with self.assertRaises(ValueError):
+            compile_formula("__import__('os').system('true')", 1)
+        with self.assertRaises(ValueError):
+            compile_formula("256*A+B", 1)
+
+    def test_bulk_decode_of_multi_pid_frame(self):
+        message = bytes.fromhex("410C1AF80D321F008C")
+        expected = {"0C": 1726, "0D": 50, "1F": 140}
+        self.assertEqual(self.registry.decode_message(message), expected)
+        self.assertEqual(self.registry.frame_decoder("01", ("0C", "0D", "1F"))(message), expected)
+
+    def test_compiled_decoder_falls_back_on_other_layouts(self):
+        decoder = self.registry.command_decoder("010C0D1F")
+        # ECU only answered speed
+        self.assertEqual(decoder(bytes.fromhex("410D32")), {"0D": 50})
+
+    def test_new_pid_needs_no_code(self):
+        registry = PIDDecoderRegistry()
+        registry.add(PIDDefinition.from_dict("01", {"PID": "5C", "DataLen": 1, "Formula": "A-40"}))
+        self.assertEqual(decode_pid_response("41 5C 7B", "015C", registry), {"5C": 83})
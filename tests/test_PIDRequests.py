@@ -0,0 +1,30 @@
+from unittest import TestCase
+
+from src.OBD.PIDRequests import build_pid_commands, decode_pid_response
+
+
+class PIDRequestsTests(TestCase):
+    def test_pids_are_batched_six_per_frame(self):
+        self.assertEqual(build_pid_commands(["0C", "0D", "1F"]), ["010C0D1F"])
+        self.assertEqual(build_pid_commands(["0c", "0D", "0C"]), ["010C0D"])
+        pids = [f"{i:02X}" for i in range(4, 12)]
+        self.assertEqual(build_pid_commands(pids), ["01040506070809", "010A0B"])
+
+    def test_single_frame_reply(self):
+        values = decode_pid_response("41 0C 1A F8 0D 32 1F 00 8C")
+        self.assertEqual(values, {"0C": 1726.0, "0D": 50, "1F": 140})
+
+    def test_iso_tp_reply_with_padding(self):
+        response = "00A\n0: 41 0C 1A F8 0D 32\n1: 1F 00 8C 00 00 00 00"
+        self.assertEqual(decode_pid_response(response), {"0C": 1726.0, "0D": 50, "1F": 140})
+        self.assertEqual(decode_pid_response(response, "010C0D1F"), {"0C": 1726.0, "0D": 50, "1F": 140})
+
+    def test_one_line_per_ecu(self):
+        self.assertEqual(decode_pid_response("41 0D 32\n41 0C 1A F8"), {"0D": 50, "0C": 1726.0})
+
+    def test_no_data(self):
+        self.assertEqual(decode_pid_response("NO DATA"), {})
+        self.assertEqual(decode_pid_response(None), {})
+        # Negative response: service 01 not supported
+        self.assertEqual(decode_pid_response("7F 01 12"), {})
+        self.assertEqual(decode_pid_response("7F 01 12", "010C0D1F"), {})
@@ -0,0 +1,73 @@
+import asyncio
+import time
+from unittest import IsolatedAsyncioTestCase
+
+from src.OBD.OBDPoller import OBDPoller
+from src.OBD.PIDScheduler import PIDSchedule, PIDScheduler
+
+
+class FakePIDClient(object):
+    """Answers request_pids after `latency` seconds and records every frame"""
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.frames = []
+        self.values = {"0C": 1500.0, "0D": 60, "1F": 120}
+
+    async def request_pids(self, pids):
+        self.frames.append(list(pids))
+        await asyncio.sleep(self.latency)
+        return {pid: self.values[pid] for pid in pids if pid in self.values}
+
+
+class PIDSchedulerTests(IsolatedAsyncioTestCase):
+    async def test_due_pids_share_one_frame(self):
+        client = FakePIDClient()
+        scheduler = PIDScheduler.from_config(client)
+
+        values = await scheduler.step()
+        self.assertEqual(client.frames, [["0D", "0C", "1F"]])
+        self.assertEqual(values["0D"], 60)
+
+        data = scheduler.data()
+        self.assertEqual((data.rpm, data.speed, data.runtime), (1500, 60, 120))
+
+    async def test_slow_pids_are_polled_less_often(self):
+        client = FakePIDClient()
+        scheduler = PIDScheduler(client, [PIDSchedule("0D", 50, 2), PIDSchedule("1F", 1, 1)])
+
+        while len(client.frames) < 10:
+            if not await scheduler.step():
+                await asyncio.sleep(max(0.0, scheduler.next_wakeup() - time.monotonic()))
+
+        runtime_frames = [frame for frame in client.frames if "1F" in frame]
+        self.assertEqual(len(runtime_frames), 1)
+
+    async def test_slow_link_throttles_low_priority_first(self):
+        client = FakePIDClient(latency=0.05)
+        schedules = [PIDSchedule("0D", 10, 3), PIDSchedule("0C", 10, 2), PIDSchedule("1F", 1, 1)]
+        # One PID per frame: 0.8 / 50 ms leaves about 16 frames per second for 21 requested
+        scheduler = PIDScheduler(client, schedules, max_pids_per_request=1)
+        await scheduler.step()
+
+        by_pid = {entry["pid"]: entry for entry in scheduler.report()["pids"]}
+        self.assertEqual(by_pid["0D"]["effective_rate"], 10)
+        self.assertLess(by_pid["0C"]["effective_rate"], 10)
+        self.assertEqual(by_pid["1F"]["effective_rate"], scheduler.min_rate)
+        self.assertLessEqual(scheduler.frame_demand([s.effective_rate for s in schedules]), 0.8 / scheduler.rtt + 1e-6)
+
+    async def test_poller_publishes_scheduled_samples(self):
+        client = FakePIDClient()
+        poller = OBDPoller(client, scheduler=PIDScheduler.from_config(client))
+
+        snapshot = await poller.sample_once()
+        self.assertEqual(snapshot.data.speed, 60)
+        self.assertIsNone(await poller.sample_once())  # nothing due yet
+        self.assertEqual((len(client.frames), poller.failed_samples, poller.consecutive_failures), (1, 0, 0))
+
+    async def test_unanswered_frame_is_a_failed_sample(self):
+        client = FakePIDClient()
+        client.values = {}
+        poller = OBDPoller(client, scheduler=PIDScheduler.from_config(client))
+
+        self.assertIsNone(await poller.sample_once())
+        self.assertEqual((poller.failed_samples, poller.consecutive_failures), (1, 1))
@@ -0,0 +1,55 @@
+import json
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from unittest import TestCase
+
+from src.Commons.Serializable import Serializable, _codec
+from src.Settings import Device, Settings
+
+
+@dataclass
+class Leg(Serializable):
+    distance: float = 0.0
+    note: Optional[str] = None
+
+
+@dataclass
+class Route(Serializable):
+    name: str = ""
+    legs: List[Leg] = field(default_factory=list)
+    by_day: Dict[str, Leg] = field(default_factory=dict)
+    start: Optional[Leg] = None
+    tags: list = field(default_factory=list)
+
+
+class SerializableTests(TestCase):
+    def test_nested_round_trip(self):
+        route = Route("commute", [Leg(1.5), Leg(2.0, "bridge")], {"mon": Leg(3.0)}, Leg(0.5), ["a", Leg(4.0)])
+        data = json.loads(route.serialize())
+        self.assertEqual(data["legs"][1], {"distance": 2.0, "note": "bridge"})
+        self.assertEqual(data["tags"], ["a", {"distance": 4.0, "note": None}])
+
+        restored = Route.deserialize(route.serialize(compact=True))
+        self.assertEqual(restored.legs, route.legs)
+        self.assertEqual(restored.by_day, route.by_day)
+        self.assertEqual(restored.start, route.start)
+
+    def test_missing_and_null_fields_get_defaults(self):
+        route = Route.from_dict({"legs": [{"distance": 2}], "start": None})
+        self.assertEqual(route.name, "")
+        self.assertIsInstance(route.legs[0].distance, float)
+        self.assertIsNone(route.start)
+        self.assertEqual(route.by_day, {})
+
+    def test_private_attributes_are_excluded(self):
+        settings = Settings(Device("OBD-II Simulator", "AA:BB:CC:DD:EE:FF"))
+        settings.pass_outer(object())
+        self.assertEqual(json.loads(settings.serialize()), {"device": {"name": "OBD-II Simulator", "address": "AA:BB:CC:DD:EE:FF"}})
+
+    def test_compact_mode(self):
+        compact = Settings(Device("x", "y")).serialize(compact=True)
+        self.assertEqual(compact, '{"device":{"name":"x","address":"y"}}')
+
+    def test_codec_is_built_once_per_class(self):
+        self.assertIs(_codec(Route), _codec(Route))
+        self.assertIsNot(_codec(Route), _codec(Leg))
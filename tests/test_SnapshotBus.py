@@ -0,0 +1,128 @@
+import asyncio
+import multiprocessing
+from unittest import IsolatedAsyncioTestCase
+
+from src.OBD.OBDDataStructure import OBDDataStructure
+from src.OBD.OBDPoller import OBDSnapshot
+from src.OBD.SnapshotBus import SnapshotBus, VehicleStatus
+from src.OBD.VehicleRegistry import VehicleRegistry
+
+
+class FakeAdapter(object):
+    def __init__(self):
+        self.target_address = None
+        self.speed = 36
+
+    async def request_all_settings(self):
+        return OBDDataStructure(1500, self.speed, 60)
+
+    async def close(self):
+        pass
+
+
+def read_in_another_process(name, results):
+    bus = SnapshotBus.attach(name)
+    snapshot, status = bus.read(0)
+    results.put((tuple(snapshot.data), snapshot.sequence, status.trip_id, len(bus.history(0))))
+    bus.request_reset(0)
+    bus.close()
+
+
+class SnapshotBusTests(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.registry = VehicleRegistry()
+        self.vehicle = self.registry.add("truck1", FakeAdapter(), sample_rate=50, client_type="mock", history_size=64)
+        self.vehicle.connected = True
+        self.bus = SnapshotBus.create(self.registry)
+        self.readers = []
+
+    async def asyncTearDown(self):
+        for reader in self.readers:
+            await reader.stop()
+            reader.close()
+        await self.bus.stop()
+        await self.registry.stop_all()
+        self.bus.close()
+
+    def attach(self) -> SnapshotBus:
+        reader = SnapshotBus.attach(self.bus.name)
+        self.readers.append(reader)
+        return reader
+
+    async def test_records_round_trip(self):
+        reader = self.attach()
+        self.assertEqual(reader.read(0), (None, VehicleStatus()))
+
+        self.bus.publish(0, OBDSnapshot(OBDDataStructure(900, None, 12), 100.5, 3.25, 7))
+        self.bus.publish_status(0, VehicleStatus(True, True, 2, 1, 7, 3, "20250101-120000"))
+        snapshot, status = reader.read(0)
+        self.assertEqual(snapshot, OBDSnapshot(OBDDataStructure(900, None, 12), 100.5, 3.25, 7))
+        self.assertEqual(status, VehicleStatus(True, True, 2, 1, 7, 3, "20250101-120000"))
+        # Unchanged records are served from the reader's cache
+        self.assertIs(reader.read(0)[0], snapshot)
+
+    async def test_mirrored_vehicles_follow_the_owner(self):
+        self.bus.serve(self.registry)
+        mirrors = VehicleRegistry()
+        reader = self.attach()
+        mirrored = reader.mirror(mirrors)[0]
+        received = []
+        mirrored.poller.add_listener(received.append)
+        reader.follow([mirrored])
+
+        self.vehicle.poller.start()
+        await asyncio.sleep(0.3)
+        await self.vehicle.poller.stop()
+        await asyncio.sleep(0.05)
+
+        self.assertEqual(mirrored.vehicle_id, "truck1")
+        self.assertEqual(mirrored.poller.snapshot, self.vehicle.poller.snapshot)
+        self.assertEqual([snapshot.sequence for snapshot in received], list(range(received[0].sequence, self.vehicle.poller.snapshot.sequence + 1)))
+        # History is read from the owner's ring, in place
+        self.assertEqual(len(mirrored.history), len(self.vehicle.history))
+        self.assertEqual(mirrored.history.window()[1].tolist(), self.vehicle.history.window()[1].tolist())
+        # So are the trip statistics
+        self.assertGreater(mirrored.trip_stats.to_dict()["samples"], 0)
+        self.assertEqual(mirrored.trip_stats.to_dict(), self.vehicle.trip_stats.to_dict())
+        await asyncio.sleep(0.5)
+        self.assertTrue(mirrored.connected)
+        self.assertEqual(mirrored.to_dict()["samples"], self.vehicle.poller.samples)
+
+    async def test_workers_requests_reach_the_owner(self):
+        self.vehicle.poller.idle_rate = 0.1
+        self.vehicle.poller.lease_seconds = 5.0
+        self.bus.serve(self.registry)
+        mirrored = self.attach().mirror(VehicleRegistry())[0]
+        self.vehicle.poller.total_distance = 12.0
+        self.assertFalse(self.vehicle.poller.active)
+
+        mirrored.poller.touch()
+        mirrored.poller.reset_distance()
+        await asyncio.sleep(0.1)
+        self.assertTrue(self.vehicle.poller.active)
+        self.assertEqual(self.vehicle.poller.total_distance, 0.0)
+
+    async def test_another_process_reads_the_bus(self):
+        self.bus.serve(self.registry)
+        self.vehicle.trip_id = "20250101-120000"
+        self.vehicle.poller.start()
+        await asyncio.sleep(0.6)
+        await self.vehicle.poller.stop()
+        self.vehicle.poller.total_distance = 5.0
+        # The reset publishes a new sample
+        published, recorded = self.vehicle.poller.snapshot.sequence, len(self.vehicle.history)
+
+        context = multiprocessing.get_context("spawn")
+        results = context.Queue()
+        process = context.Process(target=read_in_another_process, args=(self.bus.name, results))
+        process.start()
+        data, sequence, trip_id, history = await asyncio.get_running_loop().run_in_executor(None, results.get, True, 30)
+        await asyncio.get_running_loop().run_in_executor(None, process.join, 30)
+        self.assertEqual(process.exitcode, 0)
+
+        self.assertEqual(data, (1500, 36, 60))
+        self.assertEqual(sequence, published)
+        self.assertEqual(trip_id, "20250101-120000")
+        self.assertEqual(history, recorded)
+        await asyncio.sleep(0.1)
+        self.assertEqual(self.vehicle.poller.total_distance, 0.0)
@@ -0,0 +1,52 @@
+import queue
+from unittest import TestCase
+
+from src.OBD.TelemetryBroadcaster import TelemetryBroadcaster
+
+
+class TelemetryBroadcasterTests(TestCase):
+    def test_payload_fans_out_to_all_subscribers(self):
+        broadcaster = TelemetryBroadcaster()
+        subscribers = [broadcaster.subscribe() for _ in range(3)]
+
+        self.assertEqual(broadcaster.publish(b"sample"), 3)
+        for subscriber in subscribers:
+            self.assertEqual(subscriber.get(timeout=0), b"sample")
+
+    def test_slow_subscriber_is_dropped(self):
+        broadcaster = TelemetryBroadcaster(max_pending=2)
+        slow = broadcaster.subscribe()
+        fast = broadcaster.subscribe()
+
+        for i in range(3):
+            broadcaster.publish(b"%d" % i)
+            fast.get(timeout=0)
+
+        self.assertTrue(slow.closed)
+        self.assertIsNone(slow.get(timeout=0))
+        self.assertEqual(broadcaster.subscriber_count, 1)
+
+    def test_get_times_out_without_data(self):
+        subscriber = TelemetryBroadcaster().subscribe()
+        with self.assertRaises(queue.Empty):
+            subscriber.get(timeout=0.01)
+
+    def test_close_racing_a_push_still_ends_the_stream(self):
+        subscriber = TelemetryBroadcaster(max_pending=1).subscribe()
+
+        class RacingQueue(queue.Queue):
+            """A push lands right after close() drained the queue, once"""
+            raced = False
+
+            def get_nowait(self):
+                try:
+                    return super().get_nowait()
+                except queue.Empty:
+                    if not self.raced:
+                        self.raced = True
+                        self.put_nowait(b"late")
+                    raise
+
+        subscriber._queue = RacingQueue(maxsize=1)
+        subscriber.close()
+        self.assertIsNone(subscriber.get(timeout=0))
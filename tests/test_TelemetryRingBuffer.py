@@ -0,0 +1,76 @@
+import json
+from unittest import TestCase
+
+import numpy as np
+
+from src.OBD.TelemetryRingBuffer import TelemetryRingBuffer
+
+
+class TelemetryRingBufferTests(TestCase):
+    def fill(self, history: TelemetryRingBuffer, samples: int) -> None:
+        for i in range(samples):
+            history.append(float(i), (i, i % 10, i, 0.0))
+
+    def test_window_is_a_contiguous_view_after_wrapping(self):
+        history = TelemetryRingBuffer(capacity=8)
+        self.fill(history, 13)
+
+        timestamps, values = history.window()
+        self.assertEqual(len(history), 8)
+        self.assertEqual(timestamps.tolist(), [float(i) for i in range(5, 13)])
+        self.assertTrue(np.shares_memory(values, history._values))
+
+        timestamps, values = history.window(seconds=3, now=12.0)
+        self.assertEqual(timestamps.tolist(), [9.0, 10.0, 11.0, 12.0])
+        self.assertEqual(values[0].tolist(), [9, 10, 11, 12])
+
+    def test_downsample_reports_min_max_mean_per_bucket(self):
+        history = TelemetryRingBuffer(capacity=100)
+        self.fill(history, 40)
+
+        summary = history.downsample(seconds=20, points=2, now=40.0)
+        self.assertEqual(summary["count"], [10, 10])
+        self.assertEqual(summary["rpm"]["min"], [20, 30])
+        self.assertEqual(summary["rpm"]["max"], [29, 39])
+        self.assertEqual(summary["rpm"]["mean"], [24.5, 34.5])
+        self.assertEqual(summary["speed"]["max"], [9, 9])
+
+    def test_empty_buckets_are_skipped(self):
+        history = TelemetryRingBuffer(capacity=10)
+        history.append(1.0, (1, 1, 1, 0))
+        history.append(9.0, (9, 9, 9, 0))
+
+        summary = history.downsample(seconds=10, points=10, now=10.0)
+        self.assertEqual(summary["t"], [1.0, 9.0])
+        self.assertEqual(summary["rpm"]["mean"], [1.0, 9.0])
+        self.assertEqual(history.downsample(seconds=1, points=5, now=100.0)["t"], [])
+
+    def test_missing_values_are_skipped(self):
+        history = TelemetryRingBuffer(capacity=10)
+        history.append(1.0, (1000, 40, None, 0.0))
+        history.append(2.0, (2000, None, None, 0.0))
+        history.append(3.0, (3000, 60, None, 0.0))
+
+        summary = history.downsample(seconds=10, points=1, now=10.0)
+        self.assertEqual(summary["count"], [3])
+        self.assertEqual(summary["rpm"]["mean"], [2000.0])
+        self.assertEqual(summary["speed"], {"min": [40.0], "max": [60.0], "mean": [50.0]})
+        self.assertEqual(summary["runtime"], {"min": [None], "max": [None], "mean": [None]})
+        json.dumps(summary, allow_nan=False)
+
+    def test_rings_share_a_buffer(self):
+        buffer = bytearray(TelemetryRingBuffer.buffer_size(8))
+        writer = TelemetryRingBuffer(capacity=8, buffer=buffer)
+        reader = TelemetryRingBuffer(capacity=8, buffer=buffer)
+        self.fill(writer, 11)
+
+        timestamps, values = reader.window()
+        self.assertEqual(len(reader), 8)
+        self.assertEqual(timestamps.tolist(), [float(i) for i in range(3, 11)])
+        self.assertEqual(reader.downsample(seconds=4, points=1, now=11.0)["rpm"]["max"], [10])
+
+        writer.move_to(bytearray(TelemetryRingBuffer.buffer_size(8)))
+        writer.append(11.0, (11, 1, 11, 0.0))
+        self.assertEqual(len(writer), 8)
+        self.assertEqual(writer.window()[0][-1], 11.0)
+        self.assertEqual(reader.window()[0][-1], 10.0)
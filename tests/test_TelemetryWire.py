@@ -0,0 +1,80 @@
+import json
+from unittest import TestCase
+
+import numpy as np
+
+from src.OBD.OBDDataStructure import OBDDataStructure
+from src.OBD.OBDPoller import OBDSnapshot
+from src.OBD.TelemetryRingBuffer import TelemetryRingBuffer
+from src.OBD.TelemetryWire import (COLUMNS_BINARY, JSON, KEEPALIVE, SAMPLE, SAMPLE_BINARY, decode_columns, decode_sample,
+                                   encode_columns, encode_obd_response, encode_sample, negotiate)
+
+
+class NegotiationTests(TestCase):
+    def test_default_without_a_preference(self):
+        self.assertEqual(negotiate(None, (JSON, SAMPLE_BINARY)), JSON)
+        self.assertEqual(negotiate("*/*", (JSON, SAMPLE_BINARY)), JSON)
+        self.assertEqual(negotiate("text/html", (JSON, SAMPLE_BINARY)), JSON)
+
+    def test_preferred_type_wins(self):
+        self.assertEqual(negotiate("application/x-obd-sample", (JSON, SAMPLE_BINARY)), SAMPLE_BINARY)
+        self.assertEqual(negotiate("application/json;q=0.5, application/x-obd-sample", (JSON, SAMPLE_BINARY)), SAMPLE_BINARY)
+        self.assertEqual(negotiate("application/x-obd-sample;q=0.2, application/json", (JSON, SAMPLE_BINARY)), JSON)
+        self.assertEqual(negotiate("*/*, application/x-obd-sample", (JSON, SAMPLE_BINARY)), SAMPLE_BINARY)
+
+
+class WireFormatTests(TestCase):
+    def test_sample_round_trip(self):
+        snapshot = OBDSnapshot(OBDDataStructure(1726, 50, 140), 1729252800.25, 12.5, 7)
+        payload = encode_sample(snapshot, {"speed_exceeded": True, "time_exceeded": True})
+        self.assertEqual(len(payload), SAMPLE.size)
+
+        sample = decode_sample(payload)
+        self.assertEqual((sample["rpm"], sample["speed"], sample["runtime"], sample["sequence"]), (1726, 50, 140, 7))
+        self.assertEqual((sample["timestamp"], sample["accumulated_distance"]), (1729252800.25, 12.5))
+        self.assertIsNone(sample["fatigue_level"])
+        self.assertEqual(sample["worried_triggers"], {"speed_exceeded": True, "distance_exceeded": False,
+                                                      "time_exceeded": True, "fatigue_exceeded": False})
+        self.assertIsNone(decode_sample(KEEPALIVE))
+
+    def test_obd_response_encodings_agree(self):
+        snapshot = OBDSnapshot(OBDDataStructure(1726, 50, 140), 1729252800.25, 12.5, 7)
+        thresholds = (40, 100, 3600, 2)
+        body = json.loads(encode_obd_response(snapshot, JSON, thresholds))
+        self.assertEqual(body["worried_triggers"], {"speed_exceeded": True, "distance_exceeded": False,
+                                                    "time_exceeded": False, "fatigue_exceeded": False})
+        sample = decode_sample(encode_obd_response(snapshot, SAMPLE_BINARY, thresholds))
+        self.assertEqual(sample["worried_triggers"], body["worried_triggers"])
+        self.assertNotIn("worried_triggers", json.loads(encode_obd_response(snapshot, JSON, None)))
+
+    def test_obd_response_with_a_missing_pid(self):
+        # A car that doesn't support PID 1F (runtime)
+        snapshot = OBDSnapshot(OBDDataStructure(1000, None, None), 1729252800.25, 12.5, 7)
+        thresholds = (40, 100, 3600, 2)
+        body = json.loads(encode_obd_response(snapshot, JSON, thresholds))
+        self.assertIsNone(body["runtime"])
+        self.assertIsNone(body["speed"])
+        self.assertFalse(body["worried_triggers"]["time_exceeded"])
+        self.assertFalse(body["worried_triggers"]["speed_exceeded"])
+        self.assertEqual(decode_sample(encode_obd_response(snapshot, SAMPLE_BINARY, thresholds))["runtime"], -1)
+
+    def test_missing_values_are_sent_as_minus_one(self):
+        sample = decode_sample(encode_sample(OBDSnapshot(OBDDataStructure(speed=None), 1.0, 0.0, 1)))
+        self.assertEqual((sample["rpm"], sample["speed"], sample["runtime"]), (-1, -1, -1))
+
+    def test_history_columns_round_trip(self):
+        history = TelemetryRingBuffer(100)
+        for i in range(60):
+            history.append(1000.0 + i, (800 + i, i, i, i / 10))
+        columns = history.downsample_columns(60, 6, now=1060.0)
+
+        decoded = decode_columns(encode_columns(columns))
+        self.assertEqual(list(decoded), list(columns))
+        for name, values in columns.items():
+            np.testing.assert_array_equal(decoded[name], values)
+        self.assertEqual(history.downsample(60, 6, now=1060.0)["rpm"]["max"], decoded["rpm.max"].tolist())
+
+    def test_columns_must_have_the_same_length(self):
+        with self.assertRaises(ValueError):
+            encode_columns({"a": np.arange(3), "b": np.arange(4)})
+        self.assertEqual(decode_columns(encode_columns({"a": np.arange(3, dtype=np.int16)}))["a"].dtype, np.dtype("<i8"))
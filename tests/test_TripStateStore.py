@@ -0,0 +1,88 @@
+import os
+import tempfile
+import time
+from unittest import TestCase, mock
+
+from src.OBD.OBDDataStructure import OBDDataStructure
+from src.OBD.OBDPoller import OBDSnapshot
+from src.Trip.TripStateStore import TripStateStore
+
+
+def snapshot(distance: float, runtime: int) -> OBDSnapshot:
+    return OBDSnapshot(OBDDataStructure(900, 50, runtime), 1000.0 + runtime, distance, runtime)
+
+
+class TripStateStoreTests(TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.state_dir = self._tmp.name
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_crash_resumes_from_snapshot_and_journal(self):
+        store = TripStateStore(self.state_dir)
+        trip_id = store.load().trip_id
+        for i in range(1, 11):
+            store.observe(snapshot(i * 0.5, i))
+        store.flush()
+        # No close(): the process dies with everything still in the journal
+
+        resumed = TripStateStore(self.state_dir).load()
+        self.assertEqual(resumed.trip_id, trip_id)
+        self.assertAlmostEqual(resumed.distance, 5.0)
+        self.assertEqual(resumed.trip_runtime, 10)
+
+    def test_torn_journal_record_is_ignored(self):
+        store = TripStateStore(self.state_dir)
+        store.load()
+        store.observe(snapshot(1.0, 1))
+        store.observe(snapshot(2.0, 2))
+        store.flush()
+        journal = store.journal_path(store.state.generation)
+        with open(journal, "ab") as file:
+            file.write(b"\x01\x02\x03")
+
+        self.assertAlmostEqual(TripStateStore(self.state_dir).load().distance, 2.0)
+
+    def test_engine_restart_keeps_runtime_and_reset_starts_new_trip(self):
+        store = TripStateStore(self.state_dir)
+        store.load()
+        store.observe(snapshot(1.0, 600))
+        store.observe(snapshot(1.5, 30))   # engine restarted
+        self.assertEqual(store.state.trip_runtime, 630)
+
+        previous = store.state.trip_id
+        self.assertTrue(store.observe(snapshot(0.0, 31)))   # distance was reset
+        self.assertNotEqual(store.state.trip_id, previous)
+        self.assertEqual(store.state.distance, 0.0)
+        store.close()
+
+        resumed = TripStateStore(self.state_dir).load()
+        self.assertEqual(resumed.trip_id, store.state.trip_id)
+        self.assertEqual(len([name for name in os.listdir(self.state_dir) if name.endswith(".journal")]), 1)
+
+    def test_resets_within_one_second_start_distinct_trips(self):
+        store = TripStateStore(self.state_dir)
+        store.load()
+        first = store.start_trip(1000.2).trip_id
+        second = store.start_trip(1000.5).trip_id
+        third = store.start_trip(1000.9).trip_id
+        store.close()
+
+        self.assertEqual(second, f"{first}-2")
+        self.assertEqual(third, f"{first}-3")
+
+    def test_writes_do_not_block_the_caller(self):
+        store = TripStateStore(self.state_dir)
+        store.load()
+        with mock.patch("src.Trip.TripStateStore.os.fsync", side_effect=lambda fd: time.sleep(0.3)):
+            start = time.perf_counter()
+            store.observe(snapshot(1.0, 1))
+            self.assertTrue(store.observe(snapshot(0.0, 2)))   # checkpoints the new trip
+            self.assertLess(time.perf_counter() - start, 0.1)
+            store.close()
+
+        resumed = TripStateStore(self.state_dir).load()
+        self.assertEqual(resumed.trip_id, store.state.trip_id)
+        self.assertEqual(resumed.distance, 0.0)
@@ -0,0 +1,113 @@
+import os
+import tempfile
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+from src.OBD.OBDDataStructure import OBDDataStructure
+from src.OBD.OBDPoller import OBDSnapshot
+from src.OBD.VehicleRegistry import VehicleRegistry
+from src.Trip.TripStatistics import TripStatistics
+
+
+def drive(stats: TripStatistics, speeds, rpm: int = 2000, start: float = 0.0, step: float = 1.0) -> float:
+    timestamp = start
+    for speed in speeds:
+        stats.update(timestamp, speed, rpm)
+        timestamp += step
+    return timestamp
+
+
+class TripStatisticsTests(TestCase):
+    def test_trapezoidal_distance_and_speeds(self):
+        stats = TripStatistics()
+        # Accelerates from 0 to 72 km/h over 10 s, then holds it for 10 s
+        drive(stats, [7.2 * i for i in range(11)] + [72.0] * 10)
+        summary = stats.to_dict()
+        self.assertAlmostEqual(summary["distance"], (0.1 + 0.2), places=4)
+        self.assertEqual(summary["duration"], 20.0)
+        self.assertEqual(summary["moving_time"], 20.0)
+        self.assertEqual(summary["max_speed"], 72.0)
+        self.assertAlmostEqual(summary["mean_speed"], 54.0, places=2)
+        self.assertEqual(summary["samples"], 21)
+
+    def test_idle_stopped_and_gaps(self):
+        stats = TripStatistics()
+        timestamp = drive(stats, [0, 0, 0], rpm=800)
+        timestamp = drive(stats, [0, 0], rpm=0, start=timestamp)
+        # The link was lost for a minute
+        drive(stats, [30, 30], start=timestamp + 60)
+        summary = stats.to_dict()
+        # The engine is switched off half way through the fourth second
+        self.assertEqual(summary["idle_time"], 3.0)
+        self.assertEqual(summary["stopped_time"], 1.0)
+        self.assertEqual(summary["gap_time"], 61.0)
+        self.assertEqual(summary["moving_time"], 1.0)
+
+    def test_time_above_threshold_interpolates_crossings(self):
+        stats = TripStatistics(speed_threshold=50)
+        drive(stats, [40, 60, 60, 40])
+        self.assertEqual(stats.to_dict()["time_above_speed_threshold"], 2.0)
+
+    def test_rpm_bands_and_percentiles(self):
+        stats = TripStatistics(rpm_bands=(0, 1000, 3000))
+        timestamp = drive(stats, [20] * 31, rpm=900)
+        drive(stats, [100] * 11, rpm=3500, start=timestamp)
+        summary = stats.to_dict()
+        self.assertEqual([band["seconds"] for band in summary["rpm_bands"]], [30.0, 1.0, 10.0])
+        self.assertEqual(summary["rpm_bands"][-1], {"min": 3000, "max": None, "seconds": 10.0})
+        self.assertTrue(20.0 <= summary["speed_percentiles"]["p50"] < 21.0)
+        self.assertTrue(100.0 <= summary["speed_percentiles"]["p99"] <= 101.0)
+        self.assertTrue(3500.0 <= summary["rpm_percentiles"]["p90"] < 3550.0)
+
+    def test_merge_adds_up(self):
+        first, second = TripStatistics(speed_threshold=50), TripStatistics(speed_threshold=50)
+        drive(first, [60] * 11)
+        drive(second, [30] * 21, start=100.0)
+        merged = TripStatistics.merge([first, second]).to_dict()
+        self.assertAlmostEqual(merged["distance"], 60 * 10 / 3600 + 30 * 20 / 3600, places=4)
+        self.assertEqual(merged["duration"], 30.0)
+        self.assertEqual(merged["max_speed"], 60.0)
+        self.assertEqual(merged["started_at"], 0.0)
+        self.assertEqual(merged["updated_at"], 120.0)
+        self.assertEqual(merged["time_above_speed_threshold"], 10.0)
+        self.assertTrue(30.0 <= merged["speed_percentiles"]["p50"] < 31.0)
+        self.assertEqual(TripStatistics.merge([]).to_dict()["samples"], 0)
+
+    def test_distance_reset_starts_over(self):
+        stats = TripStatistics(speed_threshold=80)
+        stats.observe(OBDSnapshot(OBDDataStructure(2000, 50, 10), 0.0, 1.0, 1))
+        stats.observe(OBDSnapshot(OBDDataStructure(2000, 50, 11), 1.0, 1.1, 2))
+        stats.observe(OBDSnapshot(OBDDataStructure(2000, 50, 11), 1.0, 0.0, 3))
+        summary = stats.to_dict()
+        self.assertEqual(summary["samples"], 1)
+        self.assertEqual(summary["started_at"], 1.0)
+        self.assertEqual(summary["speed_threshold"], 80.0)
+
+    def test_state_in_a_shared_buffer(self):
+        buffer = bytearray(TripStatistics.buffer_size())
+        writer = TripStatistics()
+        writer.move_to(buffer)
+        reader = TripStatistics(buffer=buffer)
+        drive(writer, [36] * 11)
+        self.assertEqual(reader.to_dict(), writer.to_dict())
+        self.assertAlmostEqual(reader.to_dict()["distance"], 0.1, places=4)
+
+
+class TripStatisticsResumeTests(IsolatedAsyncioTestCase):
+    async def test_resumed_trip_is_replayed_from_its_log(self):
+        class Adapter(object):
+            target_address = None
+
+        with tempfile.TemporaryDirectory() as trips_dir:
+            registry = VehicleRegistry()
+            vehicle = registry.add("truck1", Adapter(), trips_dir=trips_dir)
+            vehicle.recorder.start()
+            for i in range(11):
+                vehicle.poller._publish(OBDDataStructure(1500, 36, i), 1000.0 + i)
+            await registry.stop_all()
+            logged = vehicle.trip_stats.to_dict()
+            self.assertTrue(os.listdir(os.path.join(trips_dir, "truck1", vehicle.trip_id)))
+
+            resumed = VehicleRegistry().add("truck1", Adapter(), trips_dir=trips_dir)
+            self.assertEqual(resumed.trip_id, vehicle.trip_id)
+            self.assertEqual(resumed.trip_stats.to_dict(), logged)
+            resumed.trip_state.close()
@@ -0,0 +1,49 @@
+import tempfile
+from unittest import IsolatedAsyncioTestCase
+
+from src.OBD.VehicleCapabilities import VehicleCapabilities
+
+VIN_RESPONSE = "014\n0: 49 02 01 31 44 34\n1: 47 50 30 30 52 35 35\n2: 42 31 32 33 34 35 36"
+
+
+class FakeECU(object):
+    def __init__(self, responses: dict):
+        self.responses = responses
+        self.sent = []
+
+    async def send_command(self, command: str):
+        self.sent.append(command)
+        return self.responses.get(command)
+
+
+class VehicleCapabilitiesTests(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.ecu = FakeECU({
+            "0902": VIN_RESPONSE,
+            "0100": "41 00 BE 1F A8 13",
+            "0120": "41 20 80 00 00 00",
+        })
+
+    async def test_discovery_walks_bitmasks(self):
+        capabilities = await VehicleCapabilities.discover(self.ecu.send_command, self.cache_dir)
+
+        self.assertEqual(capabilities.vin, "1D4GP00R55B123456")
+        self.assertEqual(self.ecu.sent, ["0902", "0100", "0120"])
+        self.assertTrue(capabilities.supports("0c"))
+        self.assertTrue(capabilities.supports("21"))
+        self.assertFalse(capabilities.supports("0A"))
+        self.assertEqual(capabilities.filter(["0C", "0A", "1F"]), ["0C", "1F"])
+
+    async def test_known_vin_skips_discovery(self):
+        await VehicleCapabilities.discover(self.ecu.send_command, self.cache_dir)
+        self.ecu.sent.clear()
+
+        capabilities = await VehicleCapabilities.discover(self.ecu.send_command, self.cache_dir)
+        self.assertEqual(self.ecu.sent, ["0902"])
+        self.assertTrue(capabilities.supports("0D"))
+
+    async def test_unknown_support_is_not_cached(self):
+        ecu = FakeECU({"0902": VIN_RESPONSE})
+        self.assertIsNone(await VehicleCapabilities.discover(ecu.send_command, self.cache_dir))
+        self.assertIsNone(VehicleCapabilities.load("1D4GP00R55B123456", self.cache_dir))
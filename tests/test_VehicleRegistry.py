@@ -0,0 +1,157 @@
+import asyncio
+import tempfile
+import time
+from unittest import IsolatedAsyncioTestCase
+
+from src.OBD.OBDDataStructure import OBDDataStructure
+from src.OBD.VehicleRegistry import ReconnectBackoff, VehicleRegistry
+
+
+class FakeAdapter(object):
+    """Adapter with a fixed round trip on every call"""
+    def __init__(self, latency: float = 0.05, reachable: bool = True):
+        self.target_address = None
+        self.latency = latency
+        self.reachable = reachable
+        self.closed = False
+
+    async def find_device(self):
+        await asyncio.sleep(self.latency)
+        return self.reachable
+
+    async def connect(self):
+        await asyncio.sleep(self.latency)
+        return True
+
+    async def init_communication(self):
+        await asyncio.sleep(self.latency)
+        return True
+
+    async def request_all_settings(self):
+        await asyncio.sleep(self.latency)
+        return OBDDataStructure(900, 50, 10)
+
+    async def close(self):
+        self.closed = True
+
+
+class VehicleRegistryTests(IsolatedAsyncioTestCase):
+    async def test_vehicles_connect_concurrently(self):
+        registry = VehicleRegistry()
+        for i in range(10):
+            registry.add(f"v{i}", FakeAdapter(latency=0.05))
+
+        start = time.perf_counter()
+        results = await registry.connect_all()
+        elapsed = time.perf_counter() - start
+
+        self.assertTrue(all(results.values()))
+        # Serial would be 10 vehicles * 3 steps * 50 ms
+        self.assertLess(elapsed, 0.5)
+
+    async def test_failed_vehicle_is_not_started(self):
+        registry = VehicleRegistry()
+        registry.add("ok", FakeAdapter(latency=0))
+        registry.add("missing", FakeAdapter(latency=0, reachable=False))
+
+        results = await registry.connect_all()
+        self.assertEqual(results, {"ok": True, "missing": False})
+
+        registry.start_all()
+        self.assertTrue(registry.get("ok").poller.running)
+        self.assertFalse(registry.get("missing").poller.running)
+        await registry.stop_all()
+
+    async def test_each_vehicle_has_its_own_trip_state(self):
+        registry = VehicleRegistry()
+        first = registry.add("first", FakeAdapter(latency=0))
+        second = registry.add("second", FakeAdapter(latency=0))
+        self.assertIs(registry.default(), first)
+
+        await first.poller.sample_once()
+        first.poller.last_sample_time -= 36.0
+        await first.poller.sample_once()
+        await second.poller.sample_once()
+
+        self.assertGreater(first.poller.total_distance, 0)
+        self.assertEqual(second.poller.total_distance, 0)
+
+    async def test_stop_all_closes_clients(self):
+        registry = VehicleRegistry()
+        vehicle = registry.add("v", FakeAdapter(latency=0))
+        await registry.connect_all()
+        registry.start_all()
+        await registry.stop_all()
+
+        self.assertTrue(vehicle.client.closed)
+        self.assertFalse(vehicle.poller.running)
+
+    async def test_trip_log_keeps_the_full_sample_rate(self):
+        with tempfile.TemporaryDirectory() as trips_dir:
+            registry = VehicleRegistry()
+            vehicle = registry.add("v", FakeAdapter(latency=0), idle_rate=0.2, lease_seconds=0, trips_dir=trips_dir)
+            self.assertFalse(vehicle.poller.active)
+            await registry.connect_all()
+            registry.start_all()
+            # The recorder holds a lease while it runs, like a stream subscriber
+            self.assertEqual(vehicle.poller.consumers, 1)
+            self.assertTrue(vehicle.poller.active)
+            await registry.stop_all()
+            self.assertEqual(vehicle.poller.consumers, 0)
+
+    async def _wait_for(self, condition, timeout: float = 2.0) -> None:
+        deadline = time.monotonic() + timeout
+        while not condition():
+            self.assertLess(time.monotonic(), deadline)
+            await asyncio.sleep(0.005)
+
+    async def test_failed_vehicle_is_retried_with_backoff(self):
+        registry = VehicleRegistry(backoff_initial=0.01)
+        vehicle = registry.add("late", FakeAdapter(latency=0, reachable=False))
+        await registry.connect_all()
+        registry.start_all()
+        try:
+            await asyncio.sleep(0.05)
+            self.assertFalse(vehicle.poller.running)
+            vehicle.client.reachable = True
+            await self._wait_for(lambda: vehicle.poller.running)
+            self.assertTrue(vehicle.connected)
+        finally:
+            await registry.stop_all()
+        self.assertIsNone(vehicle.supervisor)
+
+    async def test_lost_link_is_reconnected(self):
+        registry = VehicleRegistry(backoff_initial=0.01)
+        vehicle = registry.add("v", FakeAdapter(latency=0))
+        await registry.connect_all()
+        registry.start_all()
+        try:
+            vehicle.client.on_connection_lost()
+            await self._wait_for(lambda: vehicle.reconnects == 1 and vehicle.poller.running)
+            self.assertTrue(vehicle.client.closed)
+            self.assertTrue(vehicle.connected)
+        finally:
+            await registry.stop_all()
+
+    async def test_stalled_link_is_reconnected(self):
+        registry = VehicleRegistry(backoff_initial=0.01, max_failed_samples=3)
+        vehicle = registry.add("v", FakeAdapter(latency=0))
+        await registry.connect_all()
+        registry.start_all()
+        try:
+            vehicle.poller.consecutive_failures = 3
+            await self._wait_for(lambda: vehicle.reconnects == 1 and vehicle.poller.running)
+        finally:
+            await registry.stop_all()
+
+    def test_backoff_grows_to_its_cap(self):
+        backoff = ReconnectBackoff(initial=1.0, maximum=8.0, jitter=0.0)
+        self.assertEqual([backoff.next_delay() for _ in range(5)], [1.0, 2.0, 4.0, 8.0, 8.0])
+        backoff.reset()
+        self.assertEqual(backoff.next_delay(), 1.0)
+
+    def test_duplicate_id_is_rejected(self):
+        registry = VehicleRegistry()
+        registry.add("v", FakeAdapter())
+        with self.assertRaises(ValueError):
+            registry.add("v", FakeAdapter())